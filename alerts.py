@@ -0,0 +1,383 @@
+import asyncio
+import json
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import REGISTRY
+
+ALERTS_SENT = REGISTRY.counter("sentinel_alerts_sent_total", "Alerts delivered", ("channel",))
+ALERTS_FAILED = REGISTRY.counter("sentinel_alerts_failed_total", "Alerts given up on", ("channel",))
+ALERTS_RETRIED = REGISTRY.counter("sentinel_alerts_retried_total", "Failed sends scheduled for another attempt", ("channel",))
+ALERTS_DEDUPLICATED = REGISTRY.counter("sentinel_alerts_deduplicated_total", "Alerts dropped as already queued", ("channel",))
+ALERT_SEND_SECONDS = REGISTRY.histogram("sentinel_alert_send_seconds", "Time spent in the channel's API call", ("channel",))
+ALERTS_PENDING = REGISTRY.gauge("sentinel_alerts_pending", "Alerts waiting in the delivery queue")
+ALERTS_COALESCED = REGISTRY.counter("sentinel_alerts_coalesced_total", "Alerts merged into another alert's message", ("channel",))
+ALERTS_RATE_LIMITED = REGISTRY.counter("sentinel_alerts_rate_limited_total", "Sends held back by a rate limit", ("channel",))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    recipient TEXT NOT NULL DEFAULT '',
+    dedup_key TEXT,
+    payload TEXT NOT NULL,
+    attachment BLOB,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    next_attempt REAL NOT NULL
+);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_alert_queue_next ON alert_queue (next_attempt);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_alert_queue_recipient_dedup ON alert_queue (channel, recipient, dedup_key);
+"""
+
+class PermanentAlertError(Exception):
+    """Raised by a channel when retrying cannot help (bad chat id, blocked number...)."""
+
+class TokenBucket:
+    """Allows bursts of up to burst sends, refilled at rate sends per second."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now=None):
+        """Seconds until a send is allowed, 0 if it is now."""
+        self.refill(time.monotonic() if now is None else now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class ChannelStats:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0 # Gave up after the last attempt or a permanent error
+        self.retries = 0
+        self.deduplicated = 0
+        self.coalesced = 0 # Alerts that went out as part of another alert's message
+        self.rate_limited = 0 # Sends postponed by a rate limit
+        self.last_latency = 0.0 # Seconds from submit to delivery
+        self.avg_latency = 0.0
+        self.avg_send_time = 0.0 # Seconds spent in the channel's API call
+
+    def record(self, latency, send_time):
+        first = self.sent == 0
+        self.sent += 1
+        self.last_latency = latency
+        self.avg_latency = latency if first else self.avg_latency * 0.8 + latency * 0.2
+        self.avg_send_time = send_time if first else self.avg_send_time * 0.8 + send_time * 0.2
+
+    def as_dict(self):
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "deduplicated": self.deduplicated,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "latency_ms": round(self.last_latency * 1000, 1),
+            "avg_latency_ms": round(self.avg_latency * 1000, 1),
+            "avg_send_ms": round(self.avg_send_time * 1000, 1),
+        }
+
+class AlertDispatcher:
+    """Delivers alerts off the detection path, with a persistent retry queue.
+
+    submit() is safe from any thread and never waits on the disk: it checks the dedup key
+    in memory and hands the alert to a writer thread that appends it to a small SQLite queue.
+    Attachments (alert photos) stay in memory, keyed by queue id; an alert that outlives
+    a restart goes out without them.
+    The dispatcher runs as a task on the asyncio loop that owns the Telegram client;
+    coroutine channels are awaited there and blocking SDKs (Twilio) run on a thread
+    pool, so a slow API never delays frame processing or the local alarm. Failed sends
+    are retried with exponential backoff and survive a restart. At most one alert per
+    channel, recipient and dedup key (e.g. per incident) is queued at any time.
+
+    Alerts for the same channel and recipient that are due together go out as one
+    message when the channel can merge them, and a channel can hold new alerts for a
+    short coalescing window so that detections on several cameras arrive as one message.
+    Token buckets per channel and per recipient postpone sends that would exceed their
+    rate; postponed alerts keep queueing up and are merged into the next send.
+    """
+
+    def __init__(self, path="alerts.db", max_attempts=6, base_delay=2.0, max_delay=300.0, io_workers=4,
+                 drain_timeout=10.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.channels = {} # name -> (send, blocking, merge, coalesce seconds)
+        self.stats = {}
+        self.channel_limits = {} # channel -> TokenBucket
+        self.recipient_limits = {} # recipient -> TokenBucket
+        self.recipient_sent = {} # recipient -> alerts delivered
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        if "recipient" not in [row[1] for row in self.conn.execute("PRAGMA table_info(alert_queue)")]:
+            # Queue from before recipients: its alerts go to each channel's default recipient
+            self.conn.execute("ALTER TABLE alert_queue ADD COLUMN recipient TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("DROP INDEX IF EXISTS idx_alert_queue_dedup")
+        self.conn.executescript(INDEXES)
+        self.conn.commit()
+        # Kept in memory so submit() needs no query: dedup keys of queued alerts and the queue length
+        self.keys = {(channel, recipient, key) for channel, recipient, key in self.conn.execute(
+            "SELECT channel, recipient, dedup_key FROM alert_queue WHERE dedup_key IS NOT NULL")}
+        self.queued = self.conn.execute("SELECT COUNT(*) FROM alert_queue").fetchone()[0]
+        self.submit_lock = threading.Lock() # Guards keys, queued and writer_open
+        self.inserts = queue.Queue()
+        self.attachments = {} # Queue id -> attachment bytes, never written to the database
+        self.writer_open = True
+        self.writer = threading.Thread(target=self._writer_loop, name="alert-writer", daemon=True)
+        self.writer.start()
+        self.executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="alert-io")
+        self.in_flight = set()
+        self.deliveries = set() # Running _deliver tasks
+        self.drain_timeout = drain_timeout # Seconds stop waits for sends in flight
+        self.loop = None
+        self.wakeup = None
+        self.running = True # Until stop(), also when that comes before run() started
+        ALERTS_PENDING.set_function(self.pending)
+
+    def add_channel(self, name, send, blocking=False, merge=None, coalesce=0.0):
+        """Registers send(payload, attachment). Coroutines run on the loop, blocking=True ones on the pool.
+        merge([(payload, attachment), ...]) -> (payload, attachment) combines alerts to one recipient
+        into one message; coalesce (seconds) holds new alerts that long to collect others to merge."""
+        self.channels[name] = (send, blocking, merge, coalesce if merge else 0.0)
+        stats = self.stats.setdefault(name, ChannelStats())
+        ALERTS_SENT.labels(name).set_function(lambda: stats.sent)
+        ALERTS_FAILED.labels(name).set_function(lambda: stats.failed)
+        ALERTS_RETRIED.labels(name).set_function(lambda: stats.retries)
+        ALERTS_DEDUPLICATED.labels(name).set_function(lambda: stats.deduplicated)
+        ALERTS_COALESCED.labels(name).set_function(lambda: stats.coalesced)
+        ALERTS_RATE_LIMITED.labels(name).set_function(lambda: stats.rate_limited)
+
+    def limit_channel(self, channels, per_minute, burst=1):
+        """Caps sends over all recipients, e.g. an API account's rate limit. Several channels
+        (names in a list) can share one limit."""
+        bucket = TokenBucket(per_minute / 60.0, burst)
+        for channel in ([channels] if isinstance(channels, str) else channels):
+            self.channel_limits[channel] = bucket
+
+    def limit_recipient(self, recipient, per_minute, burst=1):
+        """Caps sends to one recipient over all channels."""
+        self.recipient_limits[recipient] = TokenBucket(per_minute / 60.0, burst)
+
+    def submit(self, channel, payload, attachment=None, dedup_key=None, recipient=""):
+        """Queues an alert. Returns False if one with the same dedup key is still pending for the recipient."""
+        now = time.time()
+        coalesce = self.channels[channel][3] if channel in self.channels else 0.0
+        row = (channel, recipient, dedup_key, json.dumps(payload), attachment, now, now + coalesce)
+        with self.submit_lock:
+            if dedup_key is not None:
+                if (channel, recipient, dedup_key) in self.keys:
+                    self.stats.setdefault(channel, ChannelStats()).deduplicated += 1
+                    return False
+                self.keys.add((channel, recipient, dedup_key))
+            self.queued += 1
+            if self.writer_open:
+                self.inserts.put(row)
+                return True
+        self._insert([row]) # After shutdown: written directly so it is there on the next start
+        return True
+
+    def _insert(self, rows):
+        with self.lock:
+            for channel, recipient, dedup_key, payload, attachment, created, next_attempt in rows:
+                cursor = self.conn.execute(
+                    "INSERT INTO alert_queue (channel, recipient, dedup_key, payload, created, next_attempt) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (channel, recipient, dedup_key, payload, created, next_attempt))
+                if attachment is not None:
+                    self.attachments[cursor.lastrowid] = attachment
+            self.conn.commit()
+        self._wake()
+
+    def _writer_loop(self):
+        while True:
+            rows = [self.inserts.get()]
+            # Whatever else was submitted meanwhile goes into the same commit
+            while True:
+                try:
+                    rows.append(self.inserts.get_nowait())
+                except queue.Empty:
+                    break
+            closing = None in rows
+            rows = [row for row in rows if row is not None]
+            try:
+                if rows:
+                    self._insert(rows)
+            except Exception as e:
+                print(f"Failed to queue {len(rows)} alert(s): {e}")
+            if closing:
+                break
+
+    def _close_writer(self):
+        """Stops the writer once everything submitted so far is written."""
+        with self.submit_lock:
+            if not self.writer_open:
+                return
+            self.writer_open = False
+            self.inserts.put(None)
+
+    def _wake(self):
+        if self.loop is not None and self.wakeup is not None:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def pending(self):
+        with self.submit_lock:
+            return self.queued
+
+    async def run(self):
+        """Dispatch loop, run as a task on the asyncio loop. Alerts left over from a previous run go first.
+        After stop() it waits up to drain_timeout for sends in flight; unfinished ones stay queued."""
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        while self.running:
+            self.wakeup.clear()
+            now, clock = time.time(), time.monotonic()
+            with self.lock:
+                # Metadata only, payloads and attachments are loaded for the rows that are sent
+                rows = self.conn.execute(
+                    "SELECT id, channel, recipient, attempts, created, next_attempt, dedup_key "
+                    "FROM alert_queue ORDER BY next_attempt, id").fetchall()
+            next_due = None
+            # (channel, recipient) -> queued rows, merged into one send where the channel allows it.
+            # A group goes out when its oldest row is due, taking along the ones still in their window.
+            groups = {}
+            for row in rows:
+                if row[0] in self.in_flight:
+                    continue
+                channel = self.channels.get(row[1])
+                key = (row[1], row[2]) if channel is not None and channel[2] is not None else row[0]
+                groups.setdefault(key, []).append(row)
+            for batch in groups.values():
+                due = batch[0][5] # Rows are in next_attempt order
+                if due > now:
+                    next_due = due if next_due is None else min(next_due, due)
+                    continue
+                channel, recipient = batch[0][1], batch[0][2]
+                wait = self._rate_wait(channel, recipient, clock)
+                if wait > 0:
+                    self._postpone(batch, now + wait)
+                    next_due = now + wait if next_due is None else min(next_due, now + wait)
+                    continue
+                self.in_flight.update(row[0] for row in batch)
+                task = asyncio.create_task(self._deliver(channel, recipient, batch))
+                self.deliveries.add(task)
+                task.add_done_callback(self.deliveries.discard)
+            timeout = max(0.05, next_due - now) if next_due is not None else 5.0
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self.deliveries:
+            _, unfinished = await asyncio.wait(list(self.deliveries), timeout=self.drain_timeout)
+            if unfinished:
+                print(f"Warning: {len(unfinished)} alert send(s) still running at shutdown, left queued for the next start.")
+        self._close_writer()
+        await self.loop.run_in_executor(self.executor, self.writer.join, self.drain_timeout)
+        self.executor.shutdown(wait=False)
+
+    def _rate_wait(self, channel, recipient, now):
+        """Takes a token from the channel's and the recipient's bucket, or returns how long to wait for both.
+        now is one monotonic reading per pass, so alerts postponed together keep their queue order."""
+        buckets = [bucket for bucket in (self.channel_limits.get(channel), self.recipient_limits.get(recipient))
+                   if bucket is not None]
+        wait = max([bucket.wait_time(now) for bucket in buckets], default=0.0)
+        if wait == 0:
+            for bucket in buckets:
+                bucket.take()
+        return wait
+
+    def _postpone(self, batch, next_attempt):
+        """Holds alerts back for a rate limit, without counting an attempt."""
+        self.stats.setdefault(batch[0][1], ChannelStats()).rate_limited += len(batch)
+        with self.lock:
+            self.conn.executemany("UPDATE alert_queue SET next_attempt = ? WHERE id = ?",
+                                  [(next_attempt, row[0]) for row in batch])
+            self.conn.commit()
+
+    async def _deliver(self, channel, recipient, batch):
+        stats = self.stats.setdefault(channel, ChannelStats())
+        ids = [row[0] for row in batch]
+        attempts = max(row[3] for row in batch)
+        try:
+            if channel not in self.channels:
+                raise PermanentAlertError(f"No channel named {channel}")
+            send, blocking, merge, _ = self.channels[channel]
+            items = self._load(ids)
+            payload, attachment = merge(items) if len(items) > 1 else items[0]
+            started = time.perf_counter()
+            if blocking:
+                await self.loop.run_in_executor(self.executor, send, payload, attachment)
+            else:
+                await send(payload, attachment)
+            send_time = time.perf_counter() - started
+            stats.record(time.time() - min(row[4] for row in batch), send_time)
+            stats.coalesced += len(batch) - 1
+            self.recipient_sent[recipient] = self.recipient_sent.get(recipient, 0) + 1
+            ALERT_SEND_SECONDS.labels(channel).observe(send_time)
+            self._remove(batch)
+        except Exception as e:
+            attempts += 1
+            if isinstance(e, PermanentAlertError) or attempts >= self.max_attempts:
+                print(f"Alert via {channel} failed permanently after {attempts} attempt(s): {e}")
+                stats.failed += len(batch)
+                self._remove(batch)
+            else:
+                # Exponential backoff with jitter so many queued alerts don't retry in lockstep
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                delay = max(delay, getattr(e, "retry_after", None) or 0) # The API said when to come back
+                print(f"Alert via {channel} failed (attempt {attempts}), retrying in {delay:.0f}s: {e}")
+                stats.retries += 1
+                with self.lock:
+                    self.conn.executemany("UPDATE alert_queue SET attempts = ?, next_attempt = ? WHERE id = ?",
+                                          [(attempts, time.time() + delay, alert_id) for alert_id in ids])
+                    self.conn.commit()
+        finally:
+            self.in_flight.difference_update(ids)
+            self.wakeup.set()
+
+    def _load(self, ids):
+        """(payload, attachment) of the queued alerts, in the order of ids. Only alerts queued by older
+        versions have their attachment in the database."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, payload, attachment FROM alert_queue WHERE id IN ({', '.join('?' * len(ids))})",
+                ids).fetchall()
+            items = {row[0]: (json.loads(row[1]), self.attachments.get(row[0], row[2])) for row in rows}
+        return [items[alert_id] for alert_id in ids]
+
+    def _remove(self, batch):
+        with self.lock:
+            self.conn.executemany("DELETE FROM alert_queue WHERE id = ?", [(row[0],) for row in batch])
+            self.conn.commit()
+            for row in batch:
+                self.attachments.pop(row[0], None)
+        with self.submit_lock:
+            self.keys.difference_update((row[1], row[2], row[6]) for row in batch)
+            self.queued -= len(batch)
+
+    def stop(self):
+        """Ends run(), which then finishes the sends in flight (see drain_timeout)."""
+        self.running = False
+        self._wake()
+
+    def summary(self):
+        return {
+            "pending": self.pending(),
+            "channels": {name: stats.as_dict() for name, stats in self.stats.items()},
+            "recipients": dict(self.recipient_sent),
+        }
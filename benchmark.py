@@ -0,0 +1,276 @@
+"""CPU benchmark of the detection pipeline, no camera needed.
+
+    python benchmark.py --output results.json
+    python benchmark.py --clips footage/ --resolutions vga,1080p --compare baseline.json
+
+    python benchmark.py --scale 0.5 --motion-gate --resolutions 1080p
+
+Frames come from a seeded synthetic flame generator and, optionally, from recorded
+clips, each scaled to every resolution. Every frame runs through the shipped code:
+DetectionEngine.process_frame with the configured detector backend, motion gate and
+verifier, then the dashboard's JPEG encode. Stages are timed by the engine's own stage
+timers (shared state read, motion, segmentation, contours, verification, HUD), so a
+change to any of them shows up here. A second, traced pass reports the Python/numpy
+memory a frame allocates. Results are JSON; --compare exits non-zero when the total or
+a stage got slower than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import cv2
+import numpy as np
+from engine import STREAM_STAGES, CameraStream, DetectionEngine
+from motion import MotionGate
+from state import StateCore
+from streaming import encode_jpeg
+from verifier import BatchClassifier, VerifiedDetector
+from vision import DETECTOR_BACKENDS, make_detector
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mkv", ".mov", ".m4v", ".mpg", ".mpeg", ".wmv", ".webm"}
+
+def synthetic_frames(size, count, seed=0):
+    """Yields frames of a dim noisy room with a few flickering, drifting flames."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    background = np.zeros((height, width, 3), np.uint8)
+    background[:] = np.linspace(30, 90, width, dtype=np.uint8)[None, :, None]
+    noise = rng.integers(0, 12, (height, width, 3), dtype=np.uint8)
+    cv2.add(background, noise, dst=background)
+    flames = [(rng.uniform(0.1, 0.9), rng.uniform(0.3, 0.9), rng.uniform(0.02, 0.06), rng.uniform(0, 6.28))
+              for _ in range(3)]
+    for i in range(count):
+        frame = background.copy()
+        for fx, fy, radius, phase in flames:
+            # Flames flicker in size and sway sideways
+            r = max(2, int(min(width, height) * radius * (1 + 0.3 * np.sin(i * 0.9 + phase))))
+            cx = int(width * fx + r * 0.5 * np.sin(i * 0.3 + phase))
+            cy = int(height * fy)
+            cv2.ellipse(frame, (cx, cy), (r, int(r * 1.8)), 0, 0, 360, (0, 80, 230), -1) # Red outer flame
+            cv2.ellipse(frame, (cx, cy + r // 3), (int(r * 0.6), r), 0, 0, 360, (40, 170, 255), -1) # Orange body
+            cv2.circle(frame, (cx, cy + r // 2), max(1, r // 3), (170, 240, 255), -1) # Yellow core
+        yield frame
+
+def clip_frames(path, size, count):
+    """Yields up to count frames of a recorded clip scaled to size, looping short clips."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    try:
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+    finally:
+        cap.release()
+    for i in range(count if frames else 0):
+        yield frames[i % len(frames)]
+
+def find_clips(paths):
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            clips.extend(os.path.join(path, e) for e in sorted(os.listdir(path))
+                         if os.path.splitext(e)[1].lower() in VIDEO_EXTENSIONS)
+        elif os.path.isfile(path):
+            clips.append(path)
+    return clips
+
+class StageTimes:
+    """Stands in for a stream's stage histograms and keeps every observation."""
+
+    def __init__(self):
+        self.values = []
+
+    def observe(self, value):
+        self.values.append(value)
+
+# Stages the engine times itself, in pipeline order, plus the dashboard's JPEG encode
+STAGES = ("state", "motion", "segment", "contours", "verify", "annotate", "jpeg")
+
+def make_pipeline(options):
+    """A detection engine and one camera stream of it, set up as the live system sets them up."""
+    state = StateCore(armed=True, telegram_cooldown=60, call_cooldown=300, alarm_interval=0.6)
+    engine = DetectionEngine([], on_fire=lambda stream, frame: None, is_armed=lambda: state.snapshot.armed,
+                             require_flicker=options.require_flicker, reconnect=False)
+    detector = make_detector(options.detector, options.scale)
+    if options.verifier is not None:
+        detector = VerifiedDetector(detector, options.verifier, timer=StageTimes())
+    stream = CameraStream("benchmark", "BENCH", detector,
+                          MotionGate() if options.motion_gate or options.require_flicker else None)
+    stream.health.frozen_after = stream.health.black_after = 0
+    return engine, stream
+
+def run_frame(engine, stream, frame):
+    """One frame through DetectionEngine.process_frame and the JPEG encode. Returns whether it had fire boxes."""
+    engine.process_frame(stream, frame, time.perf_counter())
+    started = time.perf_counter()
+    encode_jpeg(stream.snapshot())
+    stream.timers["jpeg"].observe(time.perf_counter() - started)
+    return bool(stream.track_ids) # One track id per fire box
+
+def reset_timers(stream):
+    stream.timers = {stage: StageTimes() for stage in STREAM_STAGES + ("verify", "jpeg")}
+    if isinstance(stream.segmenter, VerifiedDetector):
+        stream.segmenter.timer = stream.timers["verify"]
+    return stream.timers
+
+def frame_allocations(engine, stream, frames):
+    """Average bytes a frame allocates (traced peak above the starting point), detection and encode together."""
+    total = 0
+    tracemalloc.start()
+    try:
+        for frame in frames:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            run_frame(engine, stream, frame)
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return int(total / max(1, len(frames)))
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+def summarize(values):
+    return {"mean": round(sum(values) / len(values) * 1000, 3),
+            "p50": round(percentile(values, 50) * 1000, 3),
+            "p99": round(percentile(values, 99) * 1000, 3)}
+
+def benchmark(frames, warmup, options):
+    """Times the live pipeline over the frames, returns the result dict."""
+    engine, stream = make_pipeline(options)
+    reset_timers(stream)
+    for frame in frames[:warmup]:
+        run_frame(engine, stream, frame)
+    frames = frames[warmup:]
+    timers = reset_timers(stream)
+    totals = []
+    detections = 0
+    for frame in frames:
+        started = time.perf_counter()
+        detections += run_frame(engine, stream, frame)
+        totals.append(time.perf_counter() - started)
+    mean_total = sum(totals) / len(totals)
+    return {
+        "frames": len(frames),
+        "frames_with_fire": detections,
+        "fps": round(1.0 / mean_total, 1) if mean_total else None,
+        "latency_ms": summarize(totals),
+        # Stages that didn't run (no motion gate, no verifier, nothing to verify) are left out
+        "stages_ms": {stage: summarize(timers[stage].values) for stage in STAGES if timers[stage].values},
+        "alloc_bytes_per_frame": frame_allocations(engine, stream, frames[:min(len(frames), 10)]),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(results, baseline, tolerance):
+    """Lists (case, stage, baseline ms, current ms) for every p50 that regressed beyond the tolerance."""
+    regressions = []
+    for name, case in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        pairs = [("total", base["latency_ms"]["p50"], case["latency_ms"]["p50"])]
+        pairs += [(stage, base["stages_ms"][stage]["p50"], case["stages_ms"][stage]["p50"])
+                  for stage in STAGES if stage in base.get("stages_ms", {}) and stage in case["stages_ms"]]
+        for stage, before, after in pairs:
+            if before and after > before * (1 + tolerance):
+                regressions.append((name, stage, before, after))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Sentinel detection pipeline on CPU.")
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS), help=f"Comma separated, of: {', '.join(RESOLUTIONS)}")
+    parser.add_argument("--frames", type=int, default=60, help="Measured frames per case")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--clips", nargs="*", default=[], help="Recorded clips (files or folders) used as extra fixtures")
+    parser.add_argument("--threads", type=int, default=None, help="OpenCV threads (default: OpenCV's choice)")
+    parser.add_argument("--detector", choices=sorted(DETECTOR_BACKENDS), default="hsv", help="Detector backend")
+    parser.add_argument("--scale", type=float, default=1.0, help="Detection scale, as SENTINEL_DETECTION_SCALE")
+    parser.add_argument("--motion-gate", action="store_true", help="Skip unchanged regions, as SENTINEL_MOTION_GATE")
+    parser.add_argument("--require-flicker", action="store_true", help="As SENTINEL_REQUIRE_FLICKER")
+    parser.add_argument("--verifier-model", help="Verify candidates with this classifier model, as SENTINEL_VERIFIER_MODEL")
+    parser.add_argument("--output", help="Write the results as JSON to this file (default: stdout)")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed p50 slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+    args.verifier = None
+    if args.verifier_model:
+        args.verifier = BatchClassifier(args.verifier_model)
+        args.verifier.start()
+    fixtures = [("synthetic", lambda size: synthetic_frames(size, args.frames + args.warmup))]
+    for clip in find_clips(args.clips):
+        fixtures.append((os.path.splitext(os.path.basename(clip))[0],
+                         lambda size, clip=clip: clip_frames(clip, size, args.frames + args.warmup)))
+
+    results = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "pipeline": {"detector": args.detector, "scale": args.scale, "motion_gate": args.motion_gate,
+                     "require_flicker": args.require_flicker, "verifier_model": args.verifier_model},
+        "cases": {},
+    }
+    for resolution in args.resolutions.split(","):
+        resolution = resolution.strip()
+        if resolution not in RESOLUTIONS:
+            print(f"Unknown resolution {resolution}, use one of: {', '.join(RESOLUTIONS)}", file=sys.stderr)
+            return 2
+        for fixture, make_frames in fixtures:
+            frames = list(make_frames(RESOLUTIONS[resolution]))
+            if len(frames) <= args.warmup:
+                print(f"Skipping {fixture}: not enough frames", file=sys.stderr)
+                continue
+            case = benchmark(frames, args.warmup, args)
+            case.update(fixture=fixture, resolution=resolution, size=list(RESOLUTIONS[resolution]))
+            results["cases"][f"{fixture}/{resolution}"] = case
+            print(f"{fixture}/{resolution}: {case['fps']} fps, p50 {case['latency_ms']['p50']} ms, "
+                  f"p99 {case['latency_ms']['p99']} ms", file=sys.stderr)
+
+    if args.verifier is not None:
+        args.verifier.stop()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, stage, before, after in regressions:
+            print(f"REGRESSION {name} {stage}: p50 {before} ms -> {after} ms", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
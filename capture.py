@@ -0,0 +1,138 @@
+import threading
+import time
+import cv2
+
+class FrameRing:
+    """Small preallocated ring of frame slots that always hands out the newest frame.
+
+    The capture thread decodes straight into a free slot; frames the detector never
+    got to are overwritten and counted as dropped instead of queueing up behind it.
+    Each capture writes under a generation; retire() ends the current one so a capture
+    thread still blocked in a read after a reconnect can't publish into the ring.
+    """
+
+    def __init__(self, slots=3):
+        # Three slots is the minimum that lets the writer avoid both the slot being read and the newest one
+        self.slots = max(3, slots)
+        self.frames = [None] * self.slots
+        self.timestamps = [0.0] * self.slots
+        self.latest = -1 # Index of the newest committed frame
+        self.reading = -1 # Index currently held by the detector
+        self.seq = 0 # Sequence number of the newest frame
+        self.read_seq = 0 # Sequence number of the last frame handed to the detector
+        self.captured = 0
+        self.dropped = 0
+        self.generation = 0 # Bumped by retire(), commits from older generations are discarded
+        self.lock = threading.Lock()
+
+    def write_slot(self, generation=None):
+        """Returns (index, buffer) of a slot that is safe to decode into, None for a retired generation."""
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return None
+            for offset in range(1, self.slots + 1):
+                idx = (self.latest + offset) % self.slots
+                if idx != self.latest and idx != self.reading:
+                    return idx, self.frames[idx]
+
+    def commit(self, idx, frame, timestamp, generation=None):
+        """Publishes a decoded slot as the newest frame. Returns True if the previous one was never read,
+        None if generation is no longer current and the frame was discarded."""
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return None
+            self.frames[idx] = frame
+            self.timestamps[idx] = timestamp
+            overwritten = self.seq > self.read_seq
+            if overwritten:
+                self.dropped += 1
+            self.latest = idx
+            self.seq += 1
+            self.captured += 1
+            return overwritten
+
+    def retire(self):
+        """Ends the current generation. The free slots get fresh buffers on their next write, so a
+        retired capture still decoding into one can't overwrite a frame of the next capture."""
+        with self.lock:
+            self.generation += 1
+            for idx in range(self.slots):
+                if idx != self.latest and idx != self.reading:
+                    self.frames[idx] = None
+
+    def acquire(self):
+        """Claims the newest unread frame. Returns (frame, capture_timestamp) or None."""
+        with self.lock:
+            if self.seq == self.read_seq or self.latest < 0:
+                return None
+            self.reading = self.latest
+            self.read_seq = self.seq
+            return self.frames[self.reading], self.timestamps[self.reading]
+
+    def release(self):
+        """Hands the slot claimed by acquire() back to the capture thread."""
+        with self.lock:
+            self.reading = -1
+
+    @property
+    def pending(self):
+        return self.seq > self.read_seq
+
+    @property
+    def last_captured_at(self):
+        """perf_counter() time of the newest frame, None before the first."""
+        latest = self.latest
+        return self.timestamps[latest] if latest >= 0 else None
+
+class CaptureThread(threading.Thread):
+    """Reads frames from a cv2.VideoCapture into a FrameRing as fast as the source delivers them.
+
+    The thread owns the capture and releases it when it exits, so a read blocked on a dead
+    network camera never has the capture released underneath it.
+    """
+
+    def __init__(self, cap, ring, on_frame=None, realtime=False, name=None, read_timer=None):
+        super().__init__(name=name, daemon=True)
+        self.cap = cap
+        self.ring = ring
+        self.on_frame = on_frame # Called after every committed frame
+        self.read_timer = read_timer # Optional histogram, observes how long each read/decode takes
+        self.running = True
+        self.ended = False
+        self.generation = ring.generation # Writes are dropped once the ring moves past it
+        # Files decode much faster than real time, pace them to their native frame rate
+        fps = cap.get(cv2.CAP_PROP_FPS) if realtime else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0
+
+    def run(self):
+        next_frame_time = time.perf_counter()
+        while self.running:
+            slot = self.ring.write_slot(self.generation)
+            if slot is None:
+                break
+            idx, buffer = slot
+            started = time.perf_counter()
+            ret, frame = self.cap.read(buffer) if buffer is not None else self.cap.read()
+            if not ret or not self.running: # Stopped during the read: a reopened capture may own the ring now
+                break
+            captured_at = time.perf_counter()
+            if self.read_timer is not None:
+                self.read_timer.observe(captured_at - started)
+            if self.ring.commit(idx, frame, captured_at, self.generation) is None:
+                break # Retired between the check above and the commit
+            if self.on_frame:
+                self.on_frame()
+            if self.frame_interval:
+                next_frame_time += self.frame_interval
+                delay = next_frame_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame_time = time.perf_counter()
+        self.ended = True
+        self.cap.release()
+        if self.on_frame:
+            self.on_frame() # Wake the consumer so it notices the end of the stream
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,254 @@
+"""Per-camera detection settings and alert timings, reloaded while the system runs.
+
+The file (SENTINEL_CONFIG, default sentinel_config.json) is JSON:
+
+    {
+      "defaults": {"min_area": 100, "persistence": 7},
+      "cameras": {"CAM-2": {"hsv_ranges": [[[0, 110, 200], [35, 255, 255]]], "kernel_size": 7,
+                            "rois": [[0, 200, 640, 280]]}},
+      "alerts": {"telegram_cooldown": 60, "call_cooldown": 300, "alarm_interval": 0.6}
+    }
+
+Camera settings resolve as built-in/environment defaults < "defaults" < "cameras"[name].
+Edits to the file are picked up on the next check, /config changes are written back to it.
+"""
+import copy
+import json
+import os
+import threading
+
+def hsv_ranges(value):
+    ranges = []
+    for lower, upper in value:
+        lower, upper = [int(v) for v in lower], [int(v) for v in upper]
+        if len(lower) != 3 or len(upper) != 3:
+            raise ValueError("HSV bounds need 3 values")
+        for bound in (lower, upper):
+            if not (0 <= bound[0] <= 179 and 0 <= bound[1] <= 255 and 0 <= bound[2] <= 255):
+                raise ValueError(f"HSV bound {bound} out of range (h 0-179, s/v 0-255)")
+        if any(lo > hi for lo, hi in zip(lower, upper)):
+            raise ValueError(f"HSV lower bound {lower} above upper bound {upper}")
+        ranges.append((tuple(lower), tuple(upper)))
+    if not ranges:
+        raise ValueError("At least one HSV range is needed")
+    return ranges
+
+def rois(value):
+    result = []
+    for roi in value:
+        x, y, w, h = (int(v) for v in roi)
+        if x < 0 or y < 0 or w <= 0 or h <= 0:
+            raise ValueError(f"Invalid region {roi}")
+        result.append((x, y, w, h))
+    return result
+
+def bounded(kind, low, high):
+    def check(value):
+        if isinstance(value, bool):
+            raise ValueError("Expected a number")
+        value = kind(value)
+        if not low <= value <= high:
+            raise ValueError(f"Must be between {low} and {high}")
+        return value
+    return check
+
+# Key -> validator, which returns the normalized value or raises ValueError
+CAMERA_SETTINGS = {
+    "hsv_ranges": hsv_ranges,
+    "kernel_size": bounded(int, 1, 31),
+    "min_area": bounded(float, 0, 1e7),
+    "persistence": bounded(int, 1, 100),
+    "detection_scale": bounded(float, 0.05, 1.0),
+    "rois": rois,
+    "verifier_threshold": bounded(float, 0.0, 1.0),
+    "incident_gap": bounded(float, 1, 86400),
+}
+ALERT_SETTINGS = {
+    "telegram_cooldown": bounded(float, 0, 86400),
+    "call_cooldown": bounded(float, 0, 86400),
+    "alarm_interval": bounded(float, 0.1, 60),
+}
+
+def validate(section, settings, validators):
+    if not isinstance(settings, dict):
+        raise ValueError(f"{section}: expected an object")
+    result = {}
+    for key, value in settings.items():
+        if key not in validators:
+            raise ValueError(f"{section}: unknown setting {key}, use one of: {', '.join(validators)}")
+        try:
+            result[key] = validators[key](value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{section}.{key}: {e}")
+    return result
+
+def validate_config(data):
+    """Checks a whole config document, returns it normalized. Raises ValueError with the offending key."""
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    unknown = set(data) - {"defaults", "cameras", "alerts"}
+    if unknown:
+        raise ValueError(f"Unknown section(s): {', '.join(sorted(unknown))}")
+    cameras = data.get("cameras", {})
+    if not isinstance(cameras, dict):
+        raise ValueError("cameras: expected an object of camera name -> settings")
+    return {
+        "defaults": validate("defaults", data.get("defaults", {}), CAMERA_SETTINGS),
+        "cameras": {name: validate(name, settings, CAMERA_SETTINGS) for name, settings in cameras.items()},
+        "alerts": validate("alerts", data.get("alerts", {}), ALERT_SETTINGS),
+    }
+
+def unknown_cameras(document, cameras):
+    """Camera names a /config document sets overrides for that aren't among the running cameras.
+    A null entry only removes overrides, so it may name a camera that is gone."""
+    named = document.get("cameras") if isinstance(document, dict) else None
+    if not isinstance(named, dict):
+        return []
+    return sorted(name for name, settings in named.items() if settings is not None and name not in cameras)
+
+def jsonable(value):
+    return json.loads(json.dumps(value))
+
+class ConfigStore:
+    """The overrides from the config file on top of the built-in defaults.
+
+    Readers get resolved copies; update() and load() validate the complete new document
+    before anything is written or swapped in, so a bad edit leaves the file and the running
+    settings untouched. check(settings), when given, is run on every camera's resolved
+    settings as part of that and raises when a camera could not run with them.
+    Both return the changes as (scope, key, old, new) for the caller to apply and record.
+    """
+
+    def __init__(self, path, camera_defaults, alert_defaults, check=None):
+        self.path = path
+        self.check = check
+        self.camera_defaults = validate("built-in", camera_defaults, CAMERA_SETTINGS)
+        self.alert_defaults = validate("built-in", alert_defaults, ALERT_SETTINGS)
+        self.data = {"defaults": {}, "cameras": {}, "alerts": {}}
+        self.mtime = None
+        self.lock = threading.Lock() # Guards data
+        self.change_lock = threading.Lock() # One load or update at a time, so their change lists are exact
+
+    def camera(self, name):
+        """Resolved settings of one camera."""
+        with self.lock:
+            return self._resolve(self.data, name)
+
+    def _resolve(self, data, name):
+        settings = dict(self.camera_defaults)
+        settings.update(data["defaults"])
+        settings.update(data["cameras"].get(name, {}))
+        return settings
+
+    def _validate(self, data, cameras):
+        """validate_config() plus the check of every camera's resolved settings."""
+        data = validate_config(data)
+        if self.check:
+            for name in sorted(set(cameras) | set(data["cameras"])) + [None]:
+                try:
+                    self.check(self._resolve(data, name))
+                except Exception as e:
+                    raise ValueError(f"{name or 'defaults'}: {e}")
+        return data
+
+    def alerts(self):
+        with self.lock:
+            settings = dict(self.alert_defaults)
+            settings.update(self.data["alerts"])
+            return settings
+
+    def snapshot(self, cameras=()):
+        """The file's overrides plus the resolved settings of the given cameras, JSON ready."""
+        with self.lock:
+            overrides = copy.deepcopy(self.data)
+        return jsonable({"path": self.path, "overrides": overrides, "alerts": self.alerts(),
+                         "cameras": {name: self.camera(name) for name in cameras}})
+
+    def _resolved(self, cameras):
+        return {name: self.camera(name) for name in cameras}, self.alerts()
+
+    def _swap(self, data, cameras):
+        """Replaces the overrides, returns what changed for the given cameras and the alerts."""
+        before_cameras, before_alerts = self._resolved(cameras)
+        with self.lock:
+            self.data = data
+        after_cameras, after_alerts = self._resolved(cameras)
+        changes = [("alerts", key, before_alerts[key], value)
+                   for key, value in after_alerts.items() if before_alerts[key] != value]
+        for name in cameras:
+            changes.extend((name, key, before_cameras[name][key], value)
+                           for key, value in after_cameras[name].items() if before_cameras[name][key] != value)
+        return changes
+
+    def load(self, cameras=()):
+        """Reads the file if it exists. Returns the changes; raises ValueError on an invalid file."""
+        with self.change_lock:
+            if not os.path.exists(self.path):
+                return []
+            mtime = os.path.getmtime(self.path)
+            try:
+                with open(self.path, "r") as f:
+                    data = self._validate(json.load(f), cameras)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{self.path}: {e}")
+            finally:
+                self.mtime = mtime # A broken file is reported once, not on every check
+            return self._swap(data, cameras)
+
+    def reload_if_changed(self, cameras=()):
+        """Reloads after the file was edited. Returns the changes, None when the file is unchanged."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        if mtime == self.mtime:
+            return None
+        return self.load(cameras)
+
+    def update(self, patch, cameras=()):
+        """Merges {"defaults": {...}, "cameras": {name: {...}}, "alerts": {...}} into the overrides
+        (a null value removes an override), validates, writes the file and returns the changes."""
+        if not isinstance(patch, dict):
+            raise ValueError("Expected a JSON object")
+        with self.change_lock:
+            with self.lock:
+                data = copy.deepcopy(self.data)
+            for section in ("defaults", "alerts"):
+                merge(data[section], patch.get(section) or {}, section)
+            cameras_patch = patch.get("cameras") or {}
+            if not isinstance(cameras_patch, dict):
+                raise ValueError("cameras: expected an object of camera name -> settings")
+            for name, settings in cameras_patch.items():
+                merged = data["cameras"].setdefault(name, {})
+                merge(merged, settings or {}, name)
+                if not merged:
+                    del data["cameras"][name]
+            return self._commit(data, cameras)
+
+    def replace(self, document, cameras=()):
+        """Replaces all overrides with a complete document, writes the file and returns the changes."""
+        with self.change_lock:
+            return self._commit(document, cameras)
+
+    def _commit(self, data, cameras):
+        data = self._validate(jsonable(data), cameras)
+        self.write(data)
+        return self._swap(data, cameras)
+
+    def write(self, data):
+        """Replaces the file atomically, so a crash never leaves half a config behind."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(jsonable(data), f, indent=2)
+            f.write("\n")
+        os.replace(tmp, self.path)
+        self.mtime = os.path.getmtime(self.path)
+
+def merge(target, changes, section):
+    if not isinstance(changes, dict):
+        raise ValueError(f"{section}: expected an object")
+    for key, value in changes.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = value
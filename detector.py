@@ -1,19 +1,30 @@
+from __future__ import annotations # Telegram types in handler signatures are only imported once Telegram is enabled
+import time
+STARTED_AT = time.perf_counter()
 import cv2
 import numpy as np
 import os
-import pygame
-import time
+import signal
+import sys
 import asyncio
 import certifi
-import json
 import threading
 from datetime import datetime
-from flask import Flask, Response, jsonify, render_template_string, request, session, redirect, url_for
+from flask import Flask, Response, jsonify, render_template_string, request, send_from_directory, session, redirect, url_for
 from flask_cors import CORS
 from functools import wraps
-from telegram import Bot, Update
-from telegram.ext import Application, CommandHandler, ContextTypes
-from twilio.rest import Client
+from alerts import AlertDispatcher, PermanentAlertError
+from config import ConfigStore, unknown_cameras
+from engine import DetectionEngine, detector_for, parse_sources, parse_rois
+from events import EventBus
+from incidents import IncidentStore, parse_time
+from metrics import REGISTRY, STAGE_SECONDS
+from recorder import ClipRecorder
+from router import AlertRouter, merge_photo_alerts, merge_voice_alerts, split_photos
+from state import StateCore
+from streaming import MjpegBroadcaster, adaptive_subscribe, encode_jpeg
+from verifier import BatchClassifier
+from vision import DETECTOR_BACKENDS, FIRE_HSV_RANGES, KERNEL_SIZE, MIN_FIRE_AREA
 
 # Fix SSL Certificate Error (FileNotFoundError)
 # If the environment variable is set to a non-existent file, we unset it or fix it
@@ -21,55 +32,284 @@ if "SSL_CERT_FILE" in os.environ:
     # Use certifi's bundle as a reliable fallback
     os.environ["SSL_CERT_FILE"] = certifi.where()
 
-# Initialize Alarm System
-pygame.mixer.init(frequency=44100, size=-16, channels=1)
+# Service Mode
+# Nothing heavy happens at import: audio, Telegram, Twilio and the web server are only
+# imported and started by detect_fire(), after the cameras, and only when enabled.
+HEADLESS = os.getenv("SENTINEL_HEADLESS", "auto") # 1 = no local windows, auto = headless when there is no display
+if HEADLESS == "auto":
+    HEADLESS = sys.platform.startswith("linux") and not (os.getenv("DISPLAY") or os.getenv("WAYLAND_DISPLAY"))
+else:
+    HEADLESS = HEADLESS == "1"
+AUDIO_ENABLED = os.getenv("SENTINEL_AUDIO", "1") == "1"
+WEB_ENABLED = os.getenv("SENTINEL_WEB", "1") == "1"
+CAMERA_OPEN_TIMEOUT = float(os.getenv("SENTINEL_CAMERA_OPEN_TIMEOUT", "10")) # Seconds to wait for a network camera
 
 # Telegram Configuration
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "YOUR_TELEGRAM_CHAT_ID")
+# Enabled when a token is configured (SENTINEL_TELEGRAM=0/1 overrides)
+TELEGRAM_ENABLED = os.getenv("SENTINEL_TELEGRAM", "1" if "TELEGRAM_BOT_TOKEN" in os.environ else "0") == "1"
 # Note: we will initialize the application inside the main async loop
 tg_app = None 
-bot = Bot(token=BOT_TOKEN)
 
 # Twilio Configuration
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "YOUR_TWILIO_SID")   
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "YOUR_TWILIO_TOKEN")
 TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "+YOUR_TWILIO_NUMBER")
 TO_PHONE_NUMBER = os.getenv("TO_PHONE_NUMBER", "+TARGET_PHONE_NUMBER")
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-
-# Alert Cooldown Logic
-last_telegram_time = 0
-TELEGRAM_COOLDOWN = 60 # Send alert at most once every 60 seconds
-last_call_time = 0
-CALL_COOLDOWN = 300 # Phone call cooldown (5 minutes) to avoid spam
-is_sending_alert = False # Prevention for concurrent uploads
-
-# Global State for Web Dashboard
-latest_frame = None
-system_armed = True
-incident_logs = []
-LOG_FILE = "logs.json"
-
-# Load existing logs if available
-if os.path.exists(LOG_FILE):
+TWILIO_ENABLED = os.getenv("SENTINEL_TWILIO", "1" if "TWILIO_ACCOUNT_SID" in os.environ else "0") == "1"
+
+# Alert Routing: recipients, escalation tiers and on-call rotations (see router.py); without a file
+# every camera alerts TELEGRAM_CHAT_ID and TO_PHONE_NUMBER
+ALERT_ROUTES = os.getenv("SENTINEL_ALERT_ROUTES", "")
+ALERT_COALESCE = float(os.getenv("SENTINEL_ALERT_COALESCE", "1.0")) # Seconds to collect simultaneous alerts into one message
+# API endpoints, e.g. a local stand-in server for testing
+TELEGRAM_API = os.getenv("SENTINEL_TELEGRAM_API", "https://api.telegram.org")
+TWILIO_API = os.getenv("SENTINEL_TWILIO_API", "https://api.twilio.com")
+CHANNEL_NAMES = {"telegram": ["telegram", "telegram_album", "telegram_video"], "voice": ["voice"]} # Dispatcher channels per kind
+alert_router = None
+http_pool = None # Shared keep-alive connections for every alert send
+telegram_client = None
+twilio_client = None
+
+# Alert Cooldown Logic: alerts go out when an incident opens, then repeat at most once per cooldown while it stays open
+TELEGRAM_COOLDOWN = 60 # Seconds between Telegram updates about the same incident
+# Burst mode: send an album of pre-fire, trigger and post-fire frames instead of a single photo
+TELEGRAM_BURST = os.getenv("SENTINEL_TELEGRAM_BURST", "0") == "1"
+TELEGRAM_BURST_DELAY = 1.0 # Seconds after the trigger the post-fire frame is taken
+CALL_COOLDOWN = 300 # Seconds between calls about the same incident (5 minutes) to avoid spam
+ALARM_INTERVAL = 0.6 # Seconds between alarm beeps
+alert_lock = threading.Lock() # Camera workers share one alert dispatcher
+
+# Alert Delivery (persistent retry queue, drained off the detection path), opened by init_core()
+ALERT_DB = os.getenv("SENTINEL_ALERT_DB", "alerts.db")
+alert_dispatcher = None
+
+# Camera Configuration
+# Comma separated device indexes, RTSP/HTTP URIs or video files, e.g. "0,rtsp://10.0.0.5/stream"
+CAMERA_SOURCES = parse_sources(os.getenv("SENTINEL_CAMERAS", "0"))
+# Camera supervision: cameras that drop, stop delivering (stale) or freeze are reopened with backoff,
+# a camera unhealthy for SENTINEL_CAMERA_OUTAGE_AFTER seconds raises a camera-offline incident
+CAMERA_RECONNECT = os.getenv("SENTINEL_CAMERA_RECONNECT", "1") == "1"
+CAMERA_STALE_AFTER = float(os.getenv("SENTINEL_CAMERA_STALE", "10")) # Seconds without a frame
+CAMERA_FROZEN_AFTER = float(os.getenv("SENTINEL_CAMERA_FROZEN", "60")) # Seconds of an unchanged picture, 0 disables
+CAMERA_BLACK_AFTER = float(os.getenv("SENTINEL_CAMERA_BLACK", "30")) # Seconds of a black picture, 0 disables
+CAMERA_OUTAGE_AFTER = float(os.getenv("SENTINEL_CAMERA_OUTAGE_AFTER", "15"))
+# Two-stage detection: screen at reduced resolution (e.g. 0.25) and/or only inside "x,y,w,h;..." regions,
+# then confirm candidates at full resolution. The default 1.0 with no regions scans every full frame.
+DETECTION_SCALE = float(os.getenv("SENTINEL_DETECTION_SCALE", "1.0"))
+DETECTION_ROIS = parse_rois(os.getenv("SENTINEL_ROIS", ""))
+# Motion gating: only segment regions that changed; flicker check: ignore fire-coloured regions that don't flicker
+MOTION_GATE = os.getenv("SENTINEL_MOTION_GATE", "0") == "1"
+REQUIRE_FLICKER = os.getenv("SENTINEL_REQUIRE_FLICKER", "0") == "1"
+# Fire that returns within this many seconds continues the camera's open incident instead of starting a new one
+INCIDENT_GAP = float(os.getenv("SENTINEL_INCIDENT_GAP", "30"))
+# Detector backend, plus an optional CNN verifier run on the candidate boxes only (ONNX or any OpenCV DNN format)
+DETECTOR_BACKEND = os.getenv("SENTINEL_DETECTOR", "hsv")
+if DETECTOR_BACKEND not in DETECTOR_BACKENDS:
+    print(f"Error: Unknown detector backend {DETECTOR_BACKEND}, using hsv.")
+    DETECTOR_BACKEND = "hsv"
+VERIFIER_MODEL = os.getenv("SENTINEL_VERIFIER_MODEL", "") # e.g. fire_classifier.onnx, empty disables the second stage
+VERIFIER_RUNTIME = os.getenv("SENTINEL_VERIFIER_RUNTIME", "auto") # auto, opencv or onnxruntime
+VERIFIER_SIZE = int(os.getenv("SENTINEL_VERIFIER_SIZE", "64")) # Square input size of the model
+VERIFIER_SCALE = float(os.getenv("SENTINEL_VERIFIER_SCALE", str(1 / 255.0))) # Pixel scale factor
+VERIFIER_MEAN = tuple(float(v) for v in os.getenv("SENTINEL_VERIFIER_MEAN", "0,0,0").split(",")) # Subtracted before scaling
+VERIFIER_RGB = os.getenv("SENTINEL_VERIFIER_RGB", "1") == "1"
+VERIFIER_FIRE_CLASS = int(os.getenv("SENTINEL_VERIFIER_FIRE_CLASS", "0"))
+VERIFIER_THRESHOLD = float(os.getenv("SENTINEL_VERIFIER_THRESHOLD", "0.5"))
+VERIFIER_TIMEOUT = float(os.getenv("SENTINEL_VERIFIER_TIMEOUT", "2")) # Seconds a camera waits for the classifier
+verifier = None
+engine = None # Multi-camera detection engine, created in detect_fire()
+
+# Live Configuration: per-camera detection settings and alert timings, changed without a restart
+# through the file or /config (see config.py). The settings above are the defaults.
+CONFIG_FILE = os.getenv("SENTINEL_CONFIG", "sentinel_config.json")
+API_TOKEN = os.getenv("SENTINEL_API_TOKEN", "") # Lets scripts use "Authorization: Bearer <token>" on /config
+config_store = None
+
+# Video Stream Configuration (each frame is encoded once and shared by every viewer)
+STREAM_QUALITY = int(os.getenv("SENTINEL_STREAM_QUALITY", "95")) # JPEG quality 0-100
+STREAM_WIDTH = int(os.getenv("SENTINEL_STREAM_WIDTH", "0")) # Downscale width, 0 = native
+# Variants selectable with /video_feed?variant=, ordered smallest to largest: (width, JPEG quality)
+STREAM_VARIANTS = {
+    "thumb": (320, 60),
+    "medium": (640, 75),
+    "full": (STREAM_WIDTH, STREAM_QUALITY),
+}
+broadcasters = {} # (camera name, variant) -> MjpegBroadcaster, started on first viewer
+broadcasters_lock = threading.Lock()
+
+def get_broadcaster(stream, variant):
+    """Returns the shared broadcaster of a camera variant, starting it on first use."""
+    key = (stream.name, variant)
+    with broadcasters_lock:
+        broadcaster = broadcasters.get(key)
+        if broadcaster is None:
+            width, quality = STREAM_VARIANTS[variant]
+            broadcaster = broadcasters[key] = MjpegBroadcaster(stream, quality=quality, width=width, variant=variant)
+            broadcaster.start()
+        return broadcaster
+
+def latest_jpeg(stream, max_age=1.0):
+    """Newest JPEG of a camera, reusing the dashboard's encode when it is fresh enough."""
+    broadcaster = broadcasters.get((stream.name, "full"))
+    if broadcaster is not None:
+        jpeg, encoded_at = broadcaster.latest_jpeg()
+        if jpeg is not None and time.time() - encoded_at <= max_age:
+            return jpeg
+    frame = stream.snapshot()
+    return encode_jpeg(frame) if frame is not None else None
+
+# Incident Clips (seconds before/after the trigger, kept as compressed frames in memory)
+CLIP_DIR = os.getenv("SENTINEL_CLIP_DIR", "clips")
+CLIP_PRE_SECONDS = float(os.getenv("SENTINEL_CLIP_PRE", "10")) # 0 disables clip recording
+CLIP_POST_SECONDS = float(os.getenv("SENTINEL_CLIP_POST", "10"))
+CLIP_FPS = int(os.getenv("SENTINEL_CLIP_FPS", "10"))
+CLIP_QUALITY = int(os.getenv("SENTINEL_CLIP_QUALITY", "70"))
+CLIP_WIDTH = int(os.getenv("SENTINEL_CLIP_WIDTH", "640"))
+CLIP_MAX_MB = int(os.getenv("SENTINEL_CLIP_MAX_MB", "64")) # Buffer budget per camera
+TELEGRAM_CLIPS = os.getenv("SENTINEL_TELEGRAM_CLIPS", "0") == "1"
+recorders = {} # camera name -> ClipRecorder
+
+def clip_recorded(stream, path, incident_key):
+    """Links a finished clip from the incident log and optionally queues it for the camera's Telegram recipients."""
+    name = os.path.basename(path)
+    save_log(f"FIRE INCIDENT: Clip recorded ({stream.name})", "clip", camera=stream.name, clip=name, incident=incident_key)
+    if TELEGRAM_CLIPS and TELEGRAM_ENABLED:
+        for recipient in alert_router.targets(stream.name, 0):
+            if recipient.channel == "telegram":
+                alert_dispatcher.submit("telegram_video", {"chat_id": recipient.address, "path": path,
+                                                           "caption": f"🎞️ Fire incident clip ({stream.name}), {incident_key}"},
+                                        dedup_key=incident_key, recipient=recipient.name)
+
+# Shared state: arm state and alert timings, read lock-free, changed only through set_armed()/apply_config()
+system_state = StateCore(armed=True, telegram_cooldown=TELEGRAM_COOLDOWN, call_cooldown=CALL_COOLDOWN,
+                         alarm_interval=ALARM_INTERVAL)
+LOG_FILE = "logs.json" # Legacy log, imported into the incident store once
+
+# Incident Store (append-only SQLite, written by a background thread), opened by init_core()
+INCIDENT_DB = os.getenv("SENTINEL_INCIDENT_DB", "incidents.db")
+incident_store = None
+
+# Push channel for the dashboard (arm state, new incidents, detection state)
+event_bus = EventBus()
+
+# Metrics (Prometheus text format on /metrics)
+METRICS_TOKEN = os.getenv("SENTINEL_METRICS_TOKEN", "") # Lets a scraper use "Authorization: Bearer <token>" instead of a login
+ALERTS_SUPPRESSED = REGISTRY.counter("sentinel_alerts_suppressed_total", "Fire frames whose alert was held back by the cooldown", ("channel",))
+REGISTRY.gauge("sentinel_event_clients", "Dashboard clients on /events").set_function(lambda: event_bus.client_count)
+REGISTRY.gauge("sentinel_armed", "1 while the system is armed").set_function(lambda: int(system_state.snapshot.armed))
+REGISTRY.gauge("sentinel_state_version", "Changes made to the shared state").set_function(lambda: system_state.snapshot.version)
+
+def state_changed(old, new):
+    # Called in version order, so dashboards never see an older arm state last
+    if new.armed != old.armed:
+        event_bus.publish("armed", {"armed": new.armed})
+
+system_state.subscribe(state_changed)
+
+def init_core():
+    """Opens the incident store and the alert queue. Local SQLite only, no network."""
+    global incident_store, alert_dispatcher
+    incident_store = IncidentStore(INCIDENT_DB,
+                                   sync=os.getenv("SENTINEL_LOG_SYNC", "NORMAL"),
+                                   max_age_days=int(os.getenv("SENTINEL_LOG_RETENTION_DAYS", "365")),
+                                   max_rows=int(os.getenv("SENTINEL_LOG_MAX_ROWS", "1000000")))
+    REGISTRY.gauge("sentinel_incident_queue_depth", "Log entries waiting for the incident writer").set_function(
+        incident_store.queue.qsize)
+    alert_dispatcher = AlertDispatcher(ALERT_DB)
+    init_routes()
+
+def init_routes():
+    """Loads the alert routing and sets up its rate limits. A broken file falls back to the single chat and phone."""
+    global alert_router
+    fallback = AlertRouter.single(CHAT_ID if TELEGRAM_ENABLED else None, TO_PHONE_NUMBER if TWILIO_ENABLED else None)
+    alert_router = fallback
+    if ALERT_ROUTES:
+        try:
+            alert_router = AlertRouter.load(ALERT_ROUTES)
+        except (OSError, ValueError) as e:
+            print(f"Error: Ignoring alert routes {ALERT_ROUTES}: {e}")
+    for recipient in alert_router.recipients.values():
+        alert_dispatcher.limit_recipient(recipient.name, recipient.per_minute, recipient.burst)
+    for channel, (per_minute, burst) in alert_router.channel_limits.items():
+        alert_dispatcher.limit_channel(CHANNEL_NAMES[channel], per_minute, burst)
+    if alert_router is not fallback:
+        print(f"--- Alert Routes: {len(alert_router.recipients)} recipient(s), {len(alert_router.routes)} route(s) ---")
+
+def init_config():
+    """Loads the config file on top of the defaults. A broken file is reported and ignored."""
+    global config_store
+    config_store = ConfigStore(CONFIG_FILE,
+                               {"hsv_ranges": FIRE_HSV_RANGES, "kernel_size": KERNEL_SIZE, "min_area": MIN_FIRE_AREA,
+                                "persistence": PERSISTENCE_THRESHOLD, "detection_scale": DETECTION_SCALE,
+                                "rois": DETECTION_ROIS, "verifier_threshold": VERIFIER_THRESHOLD,
+                                "incident_gap": INCIDENT_GAP},
+                               {"telegram_cooldown": TELEGRAM_COOLDOWN, "call_cooldown": CALL_COOLDOWN,
+                                "alarm_interval": ALARM_INTERVAL},
+                               check=lambda settings: detector_for(DETECTOR_BACKEND, settings))
     try:
-        with open(LOG_FILE, "r") as f:
-            incident_logs = json.load(f)
-    except:
-        incident_logs = []
-
-def save_log(event):
-    global incident_logs
-    log_entry = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "event": event
-    }
-    incident_logs.insert(0, log_entry) # Add to start
-    # Keep last 50 logs
-    incident_logs = incident_logs[:50]
-    with open(LOG_FILE, "w") as f:
-        json.dump(incident_logs, f, indent=4)
+        config_store.load()
+    except ValueError as e:
+        print(f"Error: Ignoring config file: {e}")
+
+def apply_config(changes, source=None):
+    """Hands changed settings to the cameras and alert timings. With a source, records every change."""
+    system_state.update(**config_store.alerts())
+    for name in {scope for scope, _, _, _ in changes if scope != "alerts"}:
+        stream = engine.get_stream(name) if engine else None
+        if stream is not None:
+            try:
+                engine.configure(stream, config_store.camera(name))
+            except Exception as e:
+                # The camera keeps the detector it has
+                save_log(f"Config: {name} settings not applied: {e}", "config")
+    if source:
+        for scope, key, old, new in changes:
+            save_log(f"Config: {scope} {key} {old} -> {new} ({source})", "config",
+                     scope=scope, key=key, old=old, new=new, source=source)
+
+def check_config_file():
+    """Applies edits of the config file, called periodically from the main loop."""
+    try:
+        changes = config_store.reload_if_changed([stream.name for stream in engine.streams])
+    except (OSError, ValueError) as e:
+        save_log(f"Config: File rejected, settings unchanged: {e}", "config")
+        return
+    if changes:
+        apply_config(changes, "file")
+
+def metrics_summary():
+    """Compact per-camera view of the metrics for the dashboard."""
+    summary = REGISTRY.summary()
+    stages = summary.get("sentinel_stage_seconds", {})
+    cameras = []
+    for stream in (engine.streams if engine else []):
+        prefix = f"camera={stream.name},stage="
+        stage_p50 = {key[len(prefix):]: value["p50_ms"] for key, value in stages.items()
+                     if key.startswith(prefix) and value["p50_ms"] is not None}
+        total = stages.get(prefix + "total", {})
+        cameras.append({"camera": stream.name, "fps": round(stream.fps, 1),
+                        "p50_ms": total.get("p50_ms"), "p99_ms": total.get("p99_ms"),
+                        "dropped": stream.ring.dropped, "stages_p50_ms": stage_p50})
+    alerts = {}
+    for metric, field in (("sentinel_alerts_sent_total", "sent"), ("sentinel_alerts_failed_total", "failed"),
+                          ("sentinel_alerts_suppressed_total", "suppressed")):
+        for key, value in summary.get(metric, {}).items():
+            alerts.setdefault(key.split("=", 1)[1], {})[field] = int(value)
+    return {"cameras": cameras, "alerts": alerts}
+
+def save_log(event, event_type="system", **details):
+    """Records an incident. Never blocks on disk, safe from any thread."""
+    entry = incident_store.append(event, event_type, **details)
+    event_bus.publish("incident", entry)
+    return entry
+
+def set_armed(armed, source):
+    """Arms or disarms the system, armed=None toggles it. Returns the new arm state."""
+    state = system_state.modify(lambda current: {"armed": not current.armed if armed is None else armed})
+    save_log(f"Security: System {'ARMED' if state.armed else 'DISARMED'} {source}", "security")
+    return state.armed
 
 # Flask Application
 app = Flask(__name__)
@@ -93,7 +333,7 @@ def login():
             error = 'ACCESS DENIED: INVALID CREDENTIALS'
         else:
             session['logged_in'] = True
-            save_log("Security: Remote user logged in")
+            save_log("Security: Remote user logged in", "security")
             return redirect(url_for('index'))
             
     return render_template_string('''
@@ -181,7 +421,7 @@ def login():
 @app.route('/logout')
 def logout():
     session.pop('logged_in', None)
-    save_log("Security: Remote user logged out")
+    save_log("Security: Remote user logged out", "security")
     return redirect(url_for('login'))
 
 @app.route('/')
@@ -230,6 +470,10 @@ def index():
                 box-shadow: 0 0 30px rgba(0, 242, 255, 0.3);
                 background: #000;
             }
+            .feed-container.alarm {
+                border-color: #ff0000;
+                box-shadow: 0 0 30px rgba(255, 0, 0, 0.6);
+            }
             .feed-container img {
                 display: block;
                 max-width: 100%;
@@ -302,29 +546,44 @@ def index():
     <body>
         <div class="header">
             <h1>SENTINEL COMMAND CENTER</h1>
+            <a href="/grid" style="color: #00f2ff;">CAMERA GRID</a>
         </div>
         <div class="main-container">
-            <div class="feed-container">
-                <img src="/video_feed" alt="Video Feed">
+            {% for camera in cameras %}
+            <div class="feed-container" data-camera="{{ camera }}">
+                <img src="{{ feed_base }}/video_feed?camera={{ camera }}&variant={{ variant }}" alt="{{ camera }} Feed">
             </div>
+            {% endfor %}
             <div class="controls-panel">
                 <div class="status-indicator">
                     <div id="statusDot" class="dot"></div>
                     <span id="statusText">SYSTEM STATUS</span>
                 </div>
                 <button class="btn" onclick="toggleArm()">Toggle Arm System</button>
+                <div class="logs-panel" id="metricsPanel">
+                    <h3>PERFORMANCE</h3>
+                    <div id="metricsList"></div>
+                </div>
+                <div class="logs-panel" id="configPanel">
+                    <h3>CONFIGURATION</h3>
+                    <textarea id="configEditor" spellcheck="false" rows="10"
+                              style="width: 100%; box-sizing: border-box; background: #000; color: #00f2ff; border: 1px solid rgba(0, 242, 255, 0.4); font-family: monospace;"></textarea>
+                    <button class="btn" onclick="applyConfig()">Apply Config</button>
+                    <div id="configStatus" class="log-entry"></div>
+                </div>
                 <div class="logs-panel" id="logsContainer">
-                    <!-- Logs will be injected here -->
+                    <h3>INCIDENT LOGS</h3>
+                    <div id="logsList"></div>
                 </div>
             </div>
         </div>
         <script>
-            async function updateStatus() {
-                const response = await fetch('/status');
-                const data = await response.json();
+            const MAX_LOGS = 50;
+
+            function renderArmed(armed) {
                 const dot = document.getElementById('statusDot');
                 const text = document.getElementById('statusText');
-                if (data.armed) {
+                if (armed) {
                     dot.classList.add('online');
                     text.innerText = "SYSTEM ARMED";
                     text.style.color = "#00ff00";
@@ -333,165 +592,440 @@ def index():
                     text.innerText = "SYSTEM DISARMED";
                     text.style.color = "#ff0000";
                 }
-                
-                const logResponse = await fetch('/logs');
-                const logs = await logResponse.json();
-                const container = document.getElementById('logsContainer');
-                container.innerHTML = '<h3>INCIDENT LOGS</h3>';
-                logs.forEach(log => {
-                    container.innerHTML += `<div class="log-entry">
-                        <span class="log-time">${log.timestamp}</span>
-                        <span class="log-msg">${log.event}</span>
-                    </div>`;
+            }
+
+            function logElement(log) {
+                const entry = document.createElement('div');
+                entry.className = 'log-entry';
+                const time = document.createElement('span');
+                time.className = 'log-time';
+                time.textContent = log.timestamp;
+                const msg = document.createElement('span');
+                msg.className = 'log-msg';
+                msg.textContent = log.event;
+                entry.append(time, ' ', msg);
+                if (log.details && log.details.clip) {
+                    const clip = document.createElement('a');
+                    clip.href = '/clips/' + encodeURIComponent(log.details.clip);
+                    clip.target = '_blank';
+                    clip.textContent = ' [clip]';
+                    entry.append(clip);
+                }
+                return entry;
+            }
+
+            function prependLog(log) {
+                const list = document.getElementById('logsList');
+                list.prepend(logElement(log));
+                while (list.children.length > MAX_LOGS) list.lastChild.remove();
+            }
+
+            function renderDetection(camera, fireDetected) {
+                const feed = document.querySelector(`.feed-container[data-camera="${camera}"]`);
+                if (feed) feed.classList.toggle('alarm', fireDetected);
+            }
+
+            // Full state load, only on page load and when the event stream asks for a resync
+            async function loadState() {
+                const data = await (await fetch('/status')).json();
+                renderArmed(data.armed);
+                (data.cameras || []).forEach(cam => renderDetection(cam.name, cam.fire_detected));
+                const logs = await (await fetch('/logs')).json();
+                document.getElementById('logsList').replaceChildren(...logs.map(logElement));
+            }
+
+            async function loadMetrics() {
+                const data = await (await fetch('/metrics/summary')).json();
+                const rows = data.cameras.map(cam => {
+                    const row = document.createElement('div');
+                    row.className = 'log-entry';
+                    const slowest = Object.entries(cam.stages_p50_ms).filter(([stage]) => stage !== 'total')
+                        .sort((a, b) => b[1] - a[1])[0];
+                    row.textContent = `${cam.camera}: ${cam.fps} fps, p50 ${cam.p50_ms ?? '-'} ms, p99 ${cam.p99_ms ?? '-'} ms, `
+                        + `dropped ${cam.dropped}` + (slowest ? `, slowest ${slowest[0]} ${slowest[1]} ms` : '');
+                    return row;
+                });
+                Object.entries(data.alerts).forEach(([channel, counts]) => {
+                    const row = document.createElement('div');
+                    row.className = 'log-entry';
+                    row.textContent = `${channel}: sent ${counts.sent ?? 0}, failed ${counts.failed ?? 0}, suppressed ${counts.suppressed ?? 0}`;
+                    rows.push(row);
                 });
+                document.getElementById('metricsList').replaceChildren(...rows);
             }
-            
+
+            async function loadConfig() {
+                const data = await (await fetch('/config')).json();
+                document.getElementById('configEditor').value = JSON.stringify(data.overrides, null, 2);
+            }
+
+            async function applyConfig() {
+                const status = document.getElementById('configStatus');
+                let overrides;
+                try {
+                    overrides = JSON.parse(document.getElementById('configEditor').value);
+                } catch (e) {
+                    status.textContent = `Invalid JSON: ${e.message}`;
+                    return;
+                }
+                const response = await fetch('/config', { method: 'PUT', headers: { 'Content-Type': 'application/json' },
+                                                          body: JSON.stringify(overrides) });
+                const data = await response.json();
+                status.textContent = response.ok ? 'Applied' : `Rejected: ${data.error}`;
+                if (response.ok) {
+                    document.getElementById('configEditor').value = JSON.stringify(data.overrides, null, 2);
+                }
+            }
+
             async function toggleArm() {
-                await fetch('/toggle', { method: 'POST' });
-                updateStatus();
+                const data = await (await fetch('/toggle', { method: 'POST' })).json();
+                renderArmed(data.armed);
             }
-            
-            setInterval(updateStatus, 1000);
-            updateStatus();
+
+            const events = new EventSource('/events');
+            events.addEventListener('armed', e => renderArmed(JSON.parse(e.data).armed));
+            events.addEventListener('incident', e => prependLog(JSON.parse(e.data)));
+            events.addEventListener('detection', e => {
+                const data = JSON.parse(e.data);
+                renderDetection(data.camera, data.fire_detected);
+            });
+            events.addEventListener('resync', loadState);
+
+            loadState();
+            loadMetrics();
+            loadConfig();
+            setInterval(loadMetrics, 5000);
         </script>
     </body>
     </html>
-    ''')
+    ''', cameras=[stream.name for stream in engine.streams
+                  if request.args.get('camera') in (None, stream.name)] if engine else [],
+       variant=request.args.get('variant', 'auto'), feed_base=feed_base())
+
+@app.route('/grid')
+@login_required
+def grid():
+    # Wall display: every camera as a shared thumbnail stream
+    return render_template_string('''
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>SENTINEL | CAMERA GRID</title>
+        <style>
+            @import url('https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;700&display=swap');
+            body { 
+                background: #050a0f; 
+                color: #00f2ff; 
+                font-family: 'Outfit', sans-serif; 
+                margin: 0; 
+                padding: 20px;
+            }
+            .grid {
+                display: grid;
+                grid-template-columns: repeat(auto-fill, minmax(320px, 1fr));
+                gap: 15px;
+            }
+            .tile {
+                border: 2px solid #00f2ff;
+                border-radius: 10px;
+                overflow: hidden;
+                background: #000;
+                box-shadow: 0 0 15px rgba(0, 242, 255, 0.2);
+            }
+            .tile img { display: block; width: 100%; height: auto; }
+            .tile a { color: #00f2ff; text-decoration: none; }
+            .label { padding: 8px 12px; font-weight: 700; letter-spacing: 2px; font-size: 0.9rem; }
+        </style>
+    </head>
+    <body>
+        <div class="grid">
+            {% for camera in cameras %}
+            <div class="tile">
+                <a href="/?camera={{ camera }}">
+                    <img src="{{ feed_base }}/video_feed?camera={{ camera }}&variant=thumb" alt="{{ camera }} Feed">
+                    <div class="label">{{ camera }}</div>
+                </a>
+            </div>
+            {% endfor %}
+        </div>
+    </body>
+    </html>
+    ''', cameras=[stream.name for stream in engine.streams] if engine else [], feed_base=feed_base())
 
 @app.route('/video_feed')
 @login_required
 def video_feed():
-    def gen():
-        while True:
-            if latest_frame is not None:
-                ret, buffer = cv2.imencode('.jpg', latest_frame)
-                frame = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            time.sleep(0.04) # Limit to ~25fps
-    return Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    stream = engine.get_stream(request.args.get('camera')) if engine else None
+    if stream is None:
+        return "Video feed unavailable", 503
+    variant = request.args.get('variant', 'full')
+    if variant == 'auto':
+        # Adaptive: start at full quality, step down while the viewer's connection stalls
+        feed = adaptive_subscribe(lambda name: get_broadcaster(stream, name), list(STREAM_VARIANTS), request.remote_addr)
+    elif variant in STREAM_VARIANTS:
+        feed = get_broadcaster(stream, variant).subscribe(request.remote_addr)
+    else:
+        return f"Unknown variant, use one of: auto, {', '.join(STREAM_VARIANTS)}", 400
+    return Response(feed, mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/stream_stats')
+@login_required
+def get_stream_stats():
+    return jsonify([broadcaster.stats() for broadcaster in broadcasters.values()])
 
 @app.route('/status')
 @login_required
 def get_status():
-    return jsonify({"armed": system_armed})
+    cameras = [stream.stats() for stream in engine.streams] if engine else []
+    return jsonify({"armed": system_state.snapshot.armed, "cameras": cameras, "alerts": alert_dispatcher.summary(),
+                    "alert_routes": alert_router.describe(),
+                    "recorders": [recorder.stats() for recorder in recorders.values()],
+                    "verifier": verifier.stats() if verifier else None, "state": system_state.stats()})
 
 @app.route('/toggle', methods=['POST'])
 @login_required
 def toggle_arm():
-    global system_armed
-    system_armed = not system_armed
-    save_log(f"System {'ARMED' if system_armed else 'DISARMED'} remotely")
-    return jsonify({"armed": system_armed})
+    return jsonify({"armed": set_armed(None, "remotely")})
+
+@app.route('/events')
+@login_required
+def events():
+    last_event_id = request.headers.get('Last-Event-ID')
+    return Response(event_bus.subscribe(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/logs')
 @login_required
 def get_logs():
-    return jsonify(incident_logs)
+    # Paging/filtering: /logs?since=<epoch or date>&until=&type=alert&limit=50&before_id=<id>&incident=<id>
+    try:
+        entries = incident_store.query(since=parse_time(request.args.get('since')),
+                                       until=parse_time(request.args.get('until')),
+                                       event_type=request.args.get('type'),
+                                       limit=request.args.get('limit', 50),
+                                       before_id=request.args.get('before_id', type=int),
+                                       incident=request.args.get('incident'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(entries)
+
+@app.route('/metrics')
+def get_metrics():
+    authorized = session.get('logged_in') or (
+        METRICS_TOKEN and request.headers.get('Authorization', '') == f"Bearer {METRICS_TOKEN}")
+    if not authorized:
+        return "Unauthorized", 401
+    return Response(REGISTRY.exposition(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/summary')
+@login_required
+def get_metrics_summary():
+    return jsonify(metrics_summary())
+
+@app.route('/config', methods=['GET', 'POST', 'PUT'])
+def config_api():
+    # GET: current overrides and resolved settings, POST: merge changes (null removes), PUT: replace all overrides
+    if not (session.get('logged_in') or (API_TOKEN and request.headers.get('Authorization', '') == f"Bearer {API_TOKEN}")):
+        return "Unauthorized", 401
+    cameras = [stream.name for stream in engine.streams] if engine else []
+    if request.method != 'GET':
+        document = request.get_json(silent=True)
+        if not isinstance(document, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
+        unknown = unknown_cameras(document, cameras)
+        if unknown:
+            return jsonify({"error": f"Unknown camera(s): {', '.join(unknown)}"}), 400
+        try:
+            if request.method == 'POST':
+                changes = config_store.update(document, cameras)
+            else:
+                changes = config_store.replace(document, cameras)
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+        except OSError as e:
+            return jsonify({"error": f"Could not write {CONFIG_FILE}: {e}"}), 500
+        apply_config(changes, "dashboard" if session.get('logged_in') else "api")
+    return jsonify(config_store.snapshot(cameras))
+
+@app.route('/clips/<path:filename>')
+@login_required
+def get_clip(filename):
+    return send_from_directory(os.path.abspath(CLIP_DIR), filename)
+
+# Web Server: "production" serves streams from an event loop and other requests from a
+# fixed thread pool, "dev" is Flask's built-in server (one thread per connection)
+WEB_SERVER = os.getenv("SENTINEL_WEB_SERVER", "production")
+WEB_HOST = os.getenv("SENTINEL_WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("SENTINEL_WEB_PORT", "5000"))
+WEB_THREADS = int(os.getenv("SENTINEL_WEB_THREADS", "8")) # Pool for pages, polls and API calls
+MAX_VIEWERS = int(os.getenv("SENTINEL_MAX_VIEWERS", "50")) # Concurrent /video_feed connections
+web_server = None
+
+# Stream Process: encode and serve the dashboard's video from a second process on STREAM_PORT,
+# fed through a shared-memory frame bus, so streaming doesn't compete with detection for a core
+STREAM_PROCESS = os.getenv("SENTINEL_STREAM_PROCESS", "0") == "1"
+STREAM_PORT = int(os.getenv("SENTINEL_STREAM_PORT", "5001"))
+FRAME_BUS_SLOTS = int(os.getenv("SENTINEL_FRAME_BUS_SLOTS", "4")) # Frames a slow reader has before its view is overwritten
+stream_process = None
 
 def run_flask():
-    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+    app.run(host=WEB_HOST, port=WEB_PORT, debug=False, threaded=True)
 
-# Start Flask in a background thread
-web_thread = threading.Thread(target=run_flask, daemon=True)
-web_thread.start()
+def start_web_server():
+    global web_server
+    if WEB_SERVER == "production":
+        try:
+            from webserver import WebServer, session_checker
+        except ImportError as e:
+            print(f"Warning: Production web server unavailable ({e}), falling back to the development server.")
+        else:
+            web_server = WebServer(app, WEB_HOST, WEB_PORT, threads=WEB_THREADS, max_viewers=MAX_VIEWERS,
+                                   is_authorized=session_checker(app), get_stream=lambda name: engine.get_stream(name) if engine else None,
+                                   get_broadcaster=get_broadcaster, variants=STREAM_VARIANTS, event_bus=event_bus)
+            web_server.start()
+            return
+    threading.Thread(target=run_flask, daemon=True).start()
+
+def start_stream_process():
+    """Starts the stream process on the frame buses of every camera (see streamserver.py)."""
+    global stream_process
+    import multiprocessing
+    from streamserver import serve_streams
+    from framebus import FrameBusSync
+    context = multiprocessing.get_context("spawn")
+    for stream in engine.streams:
+        stream.bus_sync = FrameBusSync(FRAME_BUS_SLOTS, context)
+        stream.bus_name = f"sentinel_{os.getpid()}_{stream.name}"
+    stream_process = context.Process(
+        target=serve_streams, name="sentinel-streams", daemon=True,
+        args=([(stream.name, stream.bus_name, stream.bus_sync) for stream in engine.streams], STREAM_VARIANTS, app.secret_key,
+              WEB_HOST, STREAM_PORT, MAX_VIEWERS, os.getpid()))
+    stream_process.start()
+    print(f"--- Stream Process: video on port {STREAM_PORT} (pid {stream_process.pid}) ---")
 
-# Initial log
-save_log("Sentinel System Online - Command Center Ready")
+def feed_base():
+    """Prefix of the dashboard's /video_feed URLs: same host, the stream process's port when it runs."""
+    if stream_process is None:
+        return ""
+    host = request.host
+    if host.rfind(":") > host.rfind("]"): # Strip the port, keep IPv6 brackets
+        host = host[:host.rfind(":")]
+    return f"//{host}:{STREAM_PORT}"
 
 # --- Telegram Command Handlers ---
 async def tg_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    global latest_frame
-    if str(update.effective_chat.id) != CHAT_ID: return
+    if not command_allowed(update): return
     
     await update.message.reply_text("🔎 CAPTURING SENTINEL VISION...")
-    if latest_frame is not None:
-        temp_path = "tg_status_request.jpg"
-        cv2.imwrite(temp_path, latest_frame)
-        with open(temp_path, "rb") as photo:
-            await context.bot.send_photo(chat_id=CHAT_ID, photo=photo, 
-                                       caption=f"🛡️ STATUS: {'ARMED' if system_armed else 'DISARMED'}\n🕒 {datetime.now().strftime('%H:%M:%S')}")
-        if os.path.exists(temp_path): os.remove(temp_path)
-    else:
+    sent = False
+    loop = asyncio.get_running_loop()
+    for stream in (engine.streams if engine else []):
+        # Encoding (when the stream's JPEG can't be reused) stays off the event loop
+        photo = await loop.run_in_executor(None, latest_jpeg, stream)
+        if photo is None:
+            continue
+        await context.bot.send_photo(chat_id=update.effective_chat.id, photo=photo, 
+                                   caption=f"🛡️ {stream.name} STATUS: {'ARMED' if system_state.snapshot.armed else 'DISARMED'}\n🕒 {datetime.now().strftime('%H:%M:%S')}")
+        sent = True
+    if not sent:
         await update.message.reply_text("❌ ERROR: VISION FEED UNAVAILABLE")
 
 async def tg_mute(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    global system_armed
-    if str(update.effective_chat.id) != CHAT_ID: return
-    system_armed = False
-    save_log("Security: System DISARMED via Telegram")
+    if not command_allowed(update): return
+    set_armed(False, "via Telegram")
     await update.message.reply_text("🔇 ALARM MUTED. SYSTEM DISARMED.")
 
 async def tg_arm(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    global system_armed
-    if str(update.effective_chat.id) != CHAT_ID: return
-    system_armed = True
-    save_log("Security: System ARMED via Telegram")
+    if not command_allowed(update): return
+    set_armed(True, "via Telegram")
     await update.message.reply_text("🔋 SYSTEM ARMED. SENTINEL ONLINE.")
 
 async def tg_disarm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await tg_mute(update, context)
 
-async def trigger_voice_call():
+def command_allowed(update):
+    """Bot commands are taken from the configured chat and every Telegram alert recipient."""
+    chat = str(update.effective_chat.id)
+    return chat == CHAT_ID or chat in alert_router.chats()
+
+def voice_twiml(cameras):
+    where = f" by camera {' and '.join(cameras)}" if cameras else ""
+    return (f'<Response><Say voice="alice">Emergency! Fire detected{where} at your location by the Sentinel system. '
+            'Please check your system immediately!</Say></Response>')
+
+async def place_voice_call(payload, attachment=None):
     """Initiates an emergency voice call via Twilio."""
-    global last_call_time
+    to = payload.get("to", TO_PHONE_NUMBER)
     try:
-        print(f"--- Initiating Emergency Voice Call to {TO_PHONE_NUMBER} ---")
-        # Update timestamp before calling to prevent race conditions
-        last_call_time = time.time()
-        
-        call = twilio_client.calls.create(
-            twiml='<Response><Say voice="alice">Emergency! Fire detected at your location by the Sentinel system. Please check your system immediately!</Say></Response>',
-            to=TO_PHONE_NUMBER,
-            from_=TWILIO_FROM_NUMBER
-        )
-        print(f"Voice call initiated. SID: {call.sid}")
-    except Exception as e:
+        print(f"--- Initiating Emergency Voice Call to {to} ---")
+        sid = await twilio_client.call(to, voice_twiml(payload.get("cameras", [])))
+        print(f"Voice call initiated. SID: {sid}")
+    except PermanentAlertError as e:
         if "21215" in str(e) or "international permissions" in str(e).lower():
-            print(f"CRITICAL ERROR: Twilio Geo-Permission blocked the call to {TO_PHONE_NUMBER}.")
+            print(f"CRITICAL ERROR: Twilio Geo-Permission blocked the call to {to}.")
             print("👉 Please enable Nigeria (+234) permissions here: https://console.twilio.com/us1/develop/voice/settings/geo-permissions")
-        else:
-            print(f"Failed to initiate voice call: {e}")
-        last_call_time = 0 # Reset on failure to allow retry
+        raise
 
-async def send_telegram_photo(image):
-    """Sends a photo to the Telegram bot."""
-    global last_telegram_time, is_sending_alert
-    
-    if is_sending_alert:
-        return
-        
-    is_sending_alert = True
+async def send_telegram_alert(payload, attachment):
+    """Sends one or more photos (JPEG bytes back to back, split by payload["sizes"]) with the caption."""
+    chat_id = payload.get("chat_id", CHAT_ID)
+    photos = split_photos(payload, attachment)
     try:
-        # Update timestamp immediately to block other tasks
-        last_telegram_time = time.time()
-        
-        # Save frame temporarily
-        temp_path = "fire_alert.jpg"
-        cv2.imwrite(temp_path, image)
-        
-        print(f"--- Sending Telegram Alert to {CHAT_ID} ---")
-        # Send via Bot
-        with open(temp_path, "rb") as photo:
-            await bot.send_photo(chat_id=CHAT_ID, photo=photo, caption="🔥 ALERT: FIRE DETECTED by Sentinel!")
-        
+        print(f"--- Sending Telegram Alert ({len(photos)} photo(s)) to {chat_id} ---")
+        await telegram_client.send_photos(chat_id, photos, payload["caption"])
         print("Telegram alert sent successfully.")
-        
-        # Cleanup
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-    except Exception as e:
-        # Reset cooldown on failure so it can retry sooner if it's a transient error
-        if "Chat not found" in str(e):
-            print(f"CRITICAL ERROR: Telegram Chat ID {CHAT_ID} not found. Did you message the bot first?")
-        else:
-            print(f"Failed to send Telegram alert: {e}")
-        last_telegram_time = 0 
-    finally:
-        is_sending_alert = False
+    except PermanentAlertError as e:
+        if "chat not found" in str(e).lower():
+            print(f"CRITICAL ERROR: Telegram Chat ID {chat_id} not found. Did you message the bot first?")
+        raise
+
+async def send_telegram_video(payload, attachment):
+    """Sends a recorded incident clip, read from disk at send time."""
+    chat_id = payload.get("chat_id", CHAT_ID)
+    if not os.path.exists(payload["path"]):
+        raise PermanentAlertError(f"Clip {payload['path']} no longer exists")
+    with open(payload["path"], "rb") as video:
+        data = video.read()
+    try:
+        print(f"--- Sending Telegram Incident Clip to {chat_id} ---")
+        await telegram_client.send_video(chat_id, data, os.path.basename(payload["path"]), payload["caption"])
+        print("Telegram clip sent successfully.")
+    except PermanentAlertError as e:
+        if "chat not found" in str(e).lower():
+            print(f"CRITICAL ERROR: Telegram Chat ID {chat_id} not found. Did you message the bot first?")
+        raise
+
+def submit_telegram(stream, recipients, caption, photos, incident_key, primary=0):
+    """Queues a photo alert (one or more JPEGs) for each Telegram recipient."""
+    sent = [recipient.name for recipient in recipients
+            if alert_dispatcher.submit("telegram", {"chat_id": recipient.address, "caption": caption,
+                                                    "sizes": [len(photo) for photo in photos], "primary": primary},
+                                       attachment=b"".join(photos), dedup_key=incident_key, recipient=recipient.name)]
+    if sent:
+        save_log(f"FIRE INCIDENT: Telegram alert dispatched ({stream.name}) to {', '.join(sent)}", "alert",
+                 camera=stream.name, incident=incident_key, recipients=sent)
+
+def submit_telegram_snapshot(stream, recipients, caption, incident_key):
+    """Queues the camera's newest frame as a photo alert, reusing the dashboard's JPEG when it is fresh."""
+    jpeg = latest_jpeg(stream)
+    submit_telegram(stream, recipients, caption, [jpeg] if jpeg else [], incident_key)
+
+def submit_telegram_burst(stream, trigger_time, trigger_frame, incident_key, caption, recipients):
+    """Encodes pre-fire, trigger and post-fire frames in memory and queues them as one album."""
+    frames = stream.frames_before(trigger_time - TELEGRAM_BURST_DELAY / 2) + [trigger_frame]
+    primary = len(frames) - 1 # The trigger frame, kept when merged albums have to drop photos
+    post_frame = stream.snapshot()
+    if post_frame is not None and post_frame is not trigger_frame:
+        frames.append(post_frame)
+    photos = [photo for photo in (encode_jpeg(frame) for frame in frames) if photo is not None]
+    submit_telegram(stream, recipients, f"{caption} Before / trigger / after", photos, incident_key,
+                    min(primary, len(photos) - 1))
 
 def generate_beep(duration=1.0, frequency=1000, volume=0.5):
     """Generates a simple beep sound using numpy."""
+    import pygame
     sample_rate = 44100
     n_samples = int(duration * sample_rate)
     # Generate a sine wave
@@ -506,173 +1040,280 @@ def generate_beep(duration=1.0, frequency=1000, volume=0.5):
         
     return pygame.sndarray.make_sound(wave)
 
-# Prepare the fallback alarm sound
-try:
-    alarm_sound = generate_beep(duration=0.5, frequency=1500, volume=0.7)
-except Exception as e:
-    print(f"Warning: Could not generate synth alarm: {e}")
-    alarm_sound = None
+alarm_sound = None # Synth alarm, prepared by init_audio()
+
+def init_audio():
+    """Initializes the mixer and the alarm sound. Without an audio device the alarm is skipped."""
+    global alarm_sound
+    try:
+        import pygame
+        pygame.mixer.init(frequency=44100, size=-16, channels=1)
+        alarm_sound = generate_beep(duration=0.5, frequency=1500, volume=0.7)
+    except Exception as e:
+        print(f"Warning: Could not generate synth alarm: {e}")
+        alarm_sound = None
+
+def init_notifiers():
+    """Telegram and Twilio clients for alerts, over one pooled HTTP session. Registers their channels."""
+    global http_pool, telegram_client, twilio_client
+    from notifiers import HttpPool, TelegramClient, TwilioClient
+    http_pool = HttpPool()
+    if TELEGRAM_ENABLED:
+        telegram_client = TelegramClient(http_pool, BOT_TOKEN, TELEGRAM_API)
+        alert_dispatcher.add_channel("telegram", send_telegram_alert, merge=merge_photo_alerts, coalesce=ALERT_COALESCE)
+        alert_dispatcher.add_channel("telegram_album", send_telegram_alert) # Albums queued by older versions
+        alert_dispatcher.add_channel("telegram_video", send_telegram_video)
+    if TWILIO_ENABLED:
+        twilio_client = TwilioClient(http_pool, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM_NUMBER, TWILIO_API)
+        alert_dispatcher.add_channel("voice", place_voice_call, merge=merge_voice_alerts, coalesce=ALERT_COALESCE)
+
+async def start_telegram():
+    """Builds the bot and starts command polling. Runs as a task so a slow API never delays detection."""
+    global tg_app
+    from telegram.ext import Application, CommandHandler
+    print("--- Initializing Telegram 2-Way Protocol ---")
+    try:
+        tg_app = Application.builder().token(BOT_TOKEN).base_url(f"{TELEGRAM_API}/bot").build()
+        tg_app.add_handler(CommandHandler("status", tg_status))
+        tg_app.add_handler(CommandHandler("mute", tg_mute))
+        tg_app.add_handler(CommandHandler("arm", tg_arm))
+        tg_app.add_handler(CommandHandler("disarm", tg_disarm))
+
+        # Start polling in background
+        await tg_app.initialize()
+        await tg_app.start()
+        await tg_app.updater.start_polling()
+        print("--- Telegram Listener: ACTIVE ---")
+    except Exception as e:
+        # Alerts don't depend on the listener, queued ones are retried by the dispatcher
+        print(f"Warning: Telegram listener unavailable: {e}")
 
-alarm_playing = False
 last_alarm_time = 0
-fire_persistence_counter = 0
 PERSISTENCE_THRESHOLD = 7 # Number of consecutive frames needed to trigger alarm
 
-def draw_hud(img, fire_detected):
-    height, width, _ = img.shape
-    
-    # Corner Brackets
-    length = 50
-    thickness = 2
-    color = (0, 255, 255) # Cyan HUD color
-    
-    # Top Left
-    cv2.line(img, (20, 20), (20 + length, 20), color, thickness)
-    cv2.line(img, (20, 20), (20, 20 + length), color, thickness)
-    # Top Right
-    cv2.line(img, (width - 20, 20), (width - 20 - length, 20), color, thickness)
-    cv2.line(img, (width - 20, 20), (width - 20, 20 + length), color, thickness)
-    # Bottom Left
-    cv2.line(img, (20, height - 20), (20 + length, height - 20), color, thickness)
-    cv2.line(img, (20, height - 20), (20, height - 20 - length), color, thickness)
-    # Bottom Right
-    cv2.line(img, (width - 20, height - 20), (width - 20 - length, height - 20), color, thickness)
-    cv2.line(img, (width - 20, height - 20), (width - 20, height - 20 - length), color, thickness)
-
-    # Status Text
-    status_text = "SCANNING SYSTEM READY"
-    status_color = (0, 255, 255)
-    
-    if fire_detected:
-        status_text = "CRITICAL: FIRE DETECTED"
-        status_color = (0, 0, 255) # Red for danger
-        # Flashing Overlay effect
-        overlay = img.copy()
-        cv2.rectangle(overlay, (0, 0), (width, height), (0, 0, 255), -1)
-        cv2.addWeighted(overlay, 0.2, img, 0.8, 0, img)
+def describe_incident(incident):
+    """Short human readable state of an incident for alert captions."""
+    text = f"Incident {incident.id}: {incident.regions} region(s)"
+    if incident.growth >= 0.05:
+        text += f", growing {incident.growth * 100:.0f}%/s"
+    return text
 
-    cv2.putText(img, f"STATUS: {status_text}", (40, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.8, status_color, 2)
-    cv2.putText(img, "PROTOCOL: THERMAL/COLOUR FILTRATION", (40, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+def incident_changed(stream, incident):
+    """Records incidents opening and closing; alerts, clips and their log entries carry the incident id."""
+    if incident.ended is None:
+        save_log(f"FIRE INCIDENT: {incident.id} opened ({stream.name})", "incident", camera=stream.name,
+                 incident=incident.id)
+    else:
+        summary = incident.to_dict()
+        save_log(f"FIRE INCIDENT: {incident.id} closed after {summary['duration']}s ({stream.name})", "incident",
+                 camera=stream.name, incident=incident.id, summary=summary)
 
-async def detect_fire():
-    global last_alarm_time, alarm_playing, fire_persistence_counter, last_telegram_time, last_call_time, latest_frame, tg_app
-    
-    # Initialize Telegram Application for 2-way comms
-    print("--- Initializing Telegram 2-Way Protocol ---")
-    tg_app = Application.builder().token(BOT_TOKEN).build()
-    tg_app.add_handler(CommandHandler("status", tg_status))
-    tg_app.add_handler(CommandHandler("mute", tg_mute))
-    tg_app.add_handler(CommandHandler("arm", tg_arm))
-    tg_app.add_handler(CommandHandler("disarm", tg_disarm))
-    
-    # Start polling in background
-    await tg_app.initialize()
-    await tg_app.start()
-    await tg_app.updater.start_polling()
-    print("--- Telegram Listener: ACTIVE ---")
+def camera_outage(stream, outage):
+    """Raises and clears camera-offline incidents: logged, pushed to the dashboard and sent to the
+    camera's Telegram recipients. The other cameras keep detecting while this one is reconnected."""
+    site = alert_router.site(stream.name)
+    where = f"{site}/{stream.name}" if site else stream.name
+    summary = outage.to_dict()
+    if outage.ended is None:
+        event = f"CAMERA OFFLINE: {stream.name} {outage.status} ({outage.reason})"
+        text = f"⚠️ CAMERA OFFLINE: {where} is {outage.status} ({outage.reason}). No fire detection on this camera until it recovers."
+    else:
+        event = f"CAMERA ONLINE: {stream.name} back after {summary['duration']:.0f}s"
+        text = f"✅ CAMERA ONLINE: {where} is back after {summary['duration']:.0f}s ({outage.reconnects} reconnect(s))."
+    save_log(event, "camera", camera=stream.name, incident=outage.id, summary=summary)
+    event_bus.publish("camera", {"camera": stream.name, "health": stream.health.to_dict()})
+    for recipient in alert_router.targets(stream.name, 0):
+        if recipient.channel == "telegram":
+            alert_dispatcher.submit("telegram", {"chat_id": recipient.address, "caption": text, "sizes": []},
+                                    dedup_key=f"{outage.id}-{'closed' if outage.ended else 'opened'}",
+                                    recipient=recipient.name)
 
-    cap = cv2.VideoCapture(0)
-    
-    if not cap.isOpened():
-        print("Error: Could not open webcam.")
+def handle_fire(stream, frame):
+    """Shared alert dispatcher, called from camera worker threads while fire is confirmed. Alerts belong
+    to the camera's open incident: its routes' recipients are told when it opens (escalation tiers
+    once it has been open long enough), then again at most once per cooldown."""
+    global last_alarm_time
+    incident = stream.incident
+    if incident is None:
         return
+    current_time = time.time()
+    state = system_state.snapshot # One consistent set of timings for this frame
+    with alert_lock:
+        # Audible Alarm
+        if current_time - last_alarm_time > state.alarm_interval:
+            if alarm_sound:
+                alarm_sound.play()
+            last_alarm_time = current_time
 
-    print("--- Sentinel Active: Armed for Web Control & Streaming ---")
+        # Reserve the recipients here, the next frames of the incident don't dispatch to them again
+        due, held = alert_router.due(stream.name, incident,
+                                     {"telegram": state.telegram_cooldown, "voice": state.call_cooldown}, current_time)
+    for channel in held:
+        ALERTS_SUPPRESSED.labels(channel).inc()
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        height, width, _ = frame.shape
+    # One queued alert per channel, recipient and incident, however long the API keeps failing
+    incident_key = incident.id
 
-        # Convert to HSV color space
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    # Incident clip, written by the camera's recorder once the post-event seconds are in
+    recorder = recorders.get(stream.name)
+    if recorder is not None and recorder.trigger(incident_key):
+        save_log(f"FIRE INCIDENT: Recording clip ({stream.name})", "alert", camera=stream.name, incident=incident_key)
 
-        # Balanced Fire Detection Logic
-        # Primary Range: Vibrant Orange/Yellow
-        lower_fire = np.array([0, 110, 200], dtype="uint8")
-        upper_fire = np.array([35, 255, 255], dtype="uint8")
-        mask_fire = cv2.inRange(hsv, lower_fire, upper_fire)
-        
-        # Secondary Range: Deep Red Fire
-        lower_red = np.array([160, 110, 200], dtype="uint8")
-        upper_red = np.array([179, 255, 255], dtype="uint8")
-        mask_red = cv2.inRange(hsv, lower_red, upper_red)
-        
-        # Combine both ranges
-        mask = cv2.bitwise_or(mask_fire, mask_red)
-        
-        # Apply morphological operations
-        kernel = np.ones((5, 5), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-        mask = cv2.dilate(mask, kernel, iterations=1)
-        
-        # Find contours
-        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        
-        instant_fire_detected = False
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area > 100: 
-                instant_fire_detected = True
-                x, y, w, h = cv2.boundingRect(cnt)
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
-                cv2.putText(frame, "THERMAL SIGNATURE", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-
-        # Persistence Logic
-        if instant_fire_detected and system_armed:
-            fire_persistence_counter = min(PERSISTENCE_THRESHOLD * 2, fire_persistence_counter + 2)
+    site = alert_router.site(stream.name)
+    where = f"{site}/{stream.name}" if site else stream.name
+    for follow_up in (False, True):
+        if follow_up:
+            caption = f"🔥 UPDATE: Fire still burning ({where}). {describe_incident(incident)}."
         else:
-            fire_persistence_counter = max(0, fire_persistence_counter - 1)
-
-        fire_detected = fire_persistence_counter >= PERSISTENCE_THRESHOLD
-
-        # Trigger Alarm and Alerts
-        if fire_detected and system_armed:
-            # Audible Alarm
-            current_time = time.time()
-            if current_time - last_alarm_time > 0.6:
-                if alarm_sound:
-                    alarm_sound.play()
-                last_alarm_time = current_time
-            
-            # Telegram Alert (Asynchronous)
-            if current_time - last_telegram_time >= TELEGRAM_COOLDOWN:
-                save_log("FIRE INCIDENT: Telegram alert dispatched")
-                asyncio.create_task(send_telegram_photo(frame.copy()))
-
-            # Twilio Voice Call (Asynchronous)
-            if current_time - last_call_time >= CALL_COOLDOWN:
-                save_log("CRITICAL: Emergency voice call initiated")
-                asyncio.create_task(trigger_voice_call())
-
-        # Update HUD overlays
-        draw_hud(frame, fire_detected)
-        
-        # Status Label for HUD (Bottom Right, Sleeker)
-        hud_status = "ARMED" if system_armed else "DISARMED"
-        hud_color = (0, 255, 0) if system_armed else (0, 0, 255)
-        cv2.putText(frame, f"WEB INTERFACE: {hud_status}", (width - 220, height - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, hud_color, 1)
+            caption = f"🔥 ALERT: FIRE DETECTED by Sentinel ({where})! {describe_incident(incident)}."
+        telegram = [recipient for recipient, update in due if update == follow_up and recipient.channel == "telegram"]
 
-        # Update latest frame for web stream
-        latest_frame = frame.copy()
+        # Telegram Alert (Asynchronous)
+        if telegram and TELEGRAM_BURST:
+            # Wait for the post-fire frame on a timer thread, the camera worker moves on immediately
+            threading.Timer(TELEGRAM_BURST_DELAY, submit_telegram_burst,
+                            args=(stream, current_time, frame.copy(), incident_key, caption, telegram)).start()
+        elif telegram:
+            # The dashboard stream has usually encoded this camera already, the worker doesn't encode
+            threading.Thread(target=submit_telegram_snapshot, args=(stream, telegram, caption, incident_key),
+                             name=f"alert-photo-{stream.name}", daemon=True).start()
 
-        cv2.imshow('Antigravity Fire Sentinel - V1.1 (Standard)', frame)
+    # Twilio Voice Call (Asynchronous)
+    called = [recipient.name for recipient, _ in due if recipient.channel == "voice"
+              and alert_dispatcher.submit("voice", {"to": recipient.address, "cameras": [stream.name]},
+                                          dedup_key=incident_key, recipient=recipient.name)]
+    if called:
+        save_log(f"CRITICAL: Emergency voice call initiated ({stream.name}) to {', '.join(called)}", "alert",
+                 camera=stream.name, incident=incident_key, recipients=called)
+
+def load_verifier():
+    global verifier
+    try:
+        verifier = BatchClassifier(VERIFIER_MODEL, runtime=VERIFIER_RUNTIME, input_size=VERIFIER_SIZE,
+                                   scale=VERIFIER_SCALE, mean=VERIFIER_MEAN, swap_rb=VERIFIER_RGB,
+                                   fire_class=VERIFIER_FIRE_CLASS, timeout=VERIFIER_TIMEOUT)
+    except Exception as e:
+        print(f"Error: Could not load verifier model {VERIFIER_MODEL} ({e}), using colour detection only.")
+        return
+    verifier.start()
+    print(f"--- Verifier: {VERIFIER_MODEL} on {verifier.runtime}, threshold {VERIFIER_THRESHOLD} ---")
+
+async def detect_fire():
+    global engine
+    init_core()
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_requested.set)
+        except (NotImplementedError, RuntimeError):
+            pass # Not supported on this platform, Ctrl+C / 'q' still work
+
+    init_config()
+    # Cameras first: nothing below may delay the first analysed frame (a verifier is part of detection)
+    if VERIFIER_MODEL:
+        load_verifier()
+    engine = DetectionEngine(CAMERA_SOURCES, on_fire=handle_fire, is_armed=lambda: system_state.snapshot.armed,
+                             persistence_threshold=PERSISTENCE_THRESHOLD,
+                             detection_scale=DETECTION_SCALE, rois=DETECTION_ROIS,
+                             motion_gate=MOTION_GATE, require_flicker=REQUIRE_FLICKER,
+                             backend=DETECTOR_BACKEND, verifier=verifier, verify_threshold=VERIFIER_THRESHOLD,
+                             incident_gap=INCIDENT_GAP, on_incident=incident_changed,
+                             reconnect=CAMERA_RECONNECT, stale_after=CAMERA_STALE_AFTER,
+                             frozen_after=CAMERA_FROZEN_AFTER, black_after=CAMERA_BLACK_AFTER,
+                             outage_after=CAMERA_OUTAGE_AFTER, on_outage=camera_outage,
+                             on_state_change=lambda stream: event_bus.publish(
+                                 "detection", {"camera": stream.name, "fire_detected": stream.fire_detected}))
+    # Per-camera settings from the config file, swapped in before each camera's first frame
+    apply_config([(stream.name, None, None, None) for stream in engine.streams])
+    
+    if not engine.start(open_timeout=CAMERA_OPEN_TIMEOUT):
+        print(f"Error: Could not open any camera.{' Retrying in the background.' if engine.alive else ''}")
+    else:
+        print(f"--- Sentinel Active: {len(engine.streams)} camera(s) on {engine.workers} workers ---")
+
+    # Buses are created on each camera's next frame, the stream process attaches when they appear
+    if STREAM_PROCESS and WEB_ENABLED:
+        start_stream_process()
+
+    # Everything else comes up while the cameras are already being analysed
+    if AUDIO_ENABLED:
+        threading.Thread(target=init_audio, name="audio-init", daemon=True).start()
+    if WEB_ENABLED:
+        start_web_server()
+    incident_store.import_json(LOG_FILE)
+    save_log("Sentinel System Online - Command Center Ready")
+
+    if CLIP_PRE_SECONDS > 0:
+        for stream in engine.streams:
+            recorders[stream.name] = ClipRecorder(stream, CLIP_DIR, CLIP_PRE_SECONDS, CLIP_POST_SECONDS,
+                                                  fps=CLIP_FPS, quality=CLIP_QUALITY, width=CLIP_WIDTH,
+                                                  max_bytes=CLIP_MAX_MB * 1024 * 1024, on_clip=clip_recorded)
+            recorders[stream.name].start()
+
+    telegram_task = None
+    if TELEGRAM_ENABLED:
+        telegram_task = asyncio.create_task(start_telegram())
+    if TELEGRAM_ENABLED or TWILIO_ENABLED:
+        init_notifiers()
+    alert_task = asyncio.create_task(alert_dispatcher.run())
+
+    first_frame = False
+    next_config_check = 0
+    while engine.alive and not stop_requested.is_set():
+        if time.monotonic() >= next_config_check:
+            next_config_check = time.monotonic() + 1.0
+            check_config_file()
+
+        if not first_frame and any(stream.frames_processed for stream in engine.streams):
+            first_frame = True
+            print(f"--- First frame analysed {time.perf_counter() - STARTED_AT:.2f}s after start ---")
+
+        if HEADLESS:
+            await asyncio.sleep(0.25)
+            continue
+
+        # Camera workers do the heavy lifting, the loop only drives the local display
+        for stream in engine.streams:
+            frame = stream.snapshot()
+            if frame is not None:
+                started = time.perf_counter()
+                cv2.imshow(f'Antigravity Fire Sentinel - V1.1 (Standard) - {stream.name}', frame)
+                STAGE_SECONDS.labels(stream.name, "display").observe(time.perf_counter() - started)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
         
-        await asyncio.sleep(0.01)
+        await asyncio.sleep(0.03)
+
+    if web_server:
+        web_server.stop()
+    if stream_process:
+        stream_process.terminate()
+        stream_process.join(timeout=2)
+    for broadcaster in broadcasters.values():
+        broadcaster.stop()
+    for recorder in recorders.values():
+        recorder.stop()
+    engine.stop()
+    if verifier:
+        verifier.stop()
+    alert_dispatcher.stop()
+    await alert_task
+    if http_pool:
+        await http_pool.close()
 
     # Shutdown bot polling
-    if tg_app:
+    if telegram_task:
+        await telegram_task
+    if tg_app and tg_app.running:
         await tg_app.updater.stop()
         await tg_app.stop()
         await tg_app.shutdown()
 
-    cap.release()
-    cv2.destroyAllWindows()
+    if not HEADLESS:
+        cv2.destroyAllWindows()
+    incident_store.close()
 
 if __name__ == "__main__":
     asyncio.run(detect_fire())
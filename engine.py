@@ -0,0 +1,495 @@
+import os
+import threading
+import time
+import cv2
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from capture import FrameRing, CaptureThread
+from framebus import FrameBus
+from metrics import REGISTRY, STAGE_SECONDS
+from motion import MotionGate, FLICKER_MIN_HZ
+from supervisor import CameraHealth, CaptureSupervisor
+from tracker import Incident, RegionTracker
+from verifier import VerifiedDetector
+from vision import HudOverlay, make_detector, draw_detections
+
+RECENT_FRAME_INTERVAL = 0.5 # Seconds between the frames kept for pre-fire snapshots
+STREAM_STAGES = ("capture", "queue", "state", "motion", "segment", "contours", "annotate", "alert", "total")
+
+CAMERA_FPS = REGISTRY.gauge("sentinel_camera_fps", "Frames processed per second", ("camera",))
+FRAMES_CAPTURED = REGISTRY.counter("sentinel_frames_captured_total", "Frames read from the camera", ("camera",))
+FRAMES_PROCESSED = REGISTRY.counter("sentinel_frames_processed_total", "Frames run through detection", ("camera",))
+FRAMES_DROPPED = REGISTRY.counter("sentinel_frames_dropped_total", "Frames overwritten before detection got to them", ("camera",))
+FRAMES_GATED = REGISTRY.counter("sentinel_frames_gated_total", "Frames skipped by the motion gate", ("camera",))
+QUEUE_DEPTH = REGISTRY.gauge("sentinel_capture_queue_depth", "Captured frames waiting for detection", ("camera",))
+FIRE_DETECTED = REGISTRY.gauge("sentinel_fire_detected", "1 while fire is confirmed on the camera", ("camera",))
+CAMERA_HEALTH = REGISTRY.gauge("sentinel_camera_health", "1 healthy, 0.5-0.9 after reconnects, 0.25 frozen or black, 0 offline", ("camera",))
+FRAME_AGE = REGISTRY.gauge("sentinel_camera_frame_age_seconds", "Seconds since the camera delivered a frame", ("camera",))
+RECONNECTS = REGISTRY.counter("sentinel_camera_reconnects_total", "Times the camera was reopened after dropping", ("camera",))
+CANDIDATES_REJECTED = REGISTRY.counter("sentinel_verifier_rejected_total", "Colour candidates the classifier rejected", ("camera",))
+FRAMES_UNVERIFIED = REGISTRY.counter("sentinel_verifier_unavailable_total",
+                                     "Frames whose candidates were kept unverified because the verifier was unavailable",
+                                     ("camera",))
+VERIFIER_FAILURES = REGISTRY.counter("sentinel_verifier_failed_batches_total", "Verifier forward passes that failed")
+
+def detector_for(backend, settings):
+    """Builds the colour detector for a camera's resolved settings."""
+    return make_detector(backend, settings["detection_scale"], settings["rois"], settings["hsv_ranges"],
+                         settings["min_area"], settings["kernel_size"])
+
+def parse_sources(spec):
+    """Parses a comma separated list of camera sources (device indexes, URIs or file paths)."""
+    sources = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        # Bare integers are local device indexes, everything else is handed to OpenCV as-is
+        sources.append(int(item) if item.isdigit() else item)
+    return sources
+
+def parse_rois(spec):
+    """Parses regions of interest given as "x,y,w,h;x,y,w,h" in full-resolution pixels."""
+    rois = []
+    for item in spec.split(";"):
+        if item.strip():
+            rois.append(tuple(int(v) for v in item.split(",")))
+    return rois
+
+def is_file_source(source):
+    return isinstance(source, str) and "://" not in source
+
+class CameraStream:
+    """Capture -> detect -> alert state for a single camera."""
+
+    def __init__(self, source, name, segmenter, motion=None):
+        self.source = source
+        self.name = name
+        self.cap = None
+        self.capture = None
+        self.ring = FrameRing()
+        self.segmenter = segmenter # Detector backend, owns this stream's reusable mask buffers
+        self.motion = motion # Optional MotionGate, skips segmentation of unchanged regions
+        self.last_boxes = []
+        self.active = False
+        self.busy = False # A frame of this stream is queued or running on the pool
+        self.reconnect = not is_file_source(source) # Cameras are reopened when they drop, files end
+        self.reopening = False # The supervisor is reopening the capture
+        self.health = CameraHealth()
+        self.fire_persistence_counter = 0
+        self.persistence_threshold = 7 # Frames needed to confirm fire
+        self.pending_config = None # (detector, settings) swapped in by the stream's worker before its next frame
+        self.fire_detected = False
+        self.incident_seq = 0 # Number of incidents opened
+        self.incident = None # Open Incident, alerts, logs and clips refer to its id
+        self.incident_gap = 30.0 # Seconds without confirmed fire before the incident closes
+        self.tracker = RegionTracker() # Links candidate boxes across frames
+        self.track_ids = [] # Track of each of the last frame's boxes
+        self.latest_frame = None
+        self.frame_seq = 0 # Bumped on every publish so viewers can wait for a new frame
+        self.recent_frames = deque(maxlen=4) # (timestamp, frame) sampled every RECENT_FRAME_INTERVAL, for pre-fire shots
+        self.bus_name = None # Also publish to this shared-memory FrameBus, for readers in other processes
+        self.bus_sync = None # FrameBusSync shared with those readers
+        self.bus = None # Created on the first frame, sized to it, recreated when a frame outgrows it
+        self.frames_processed = 0
+        # Capture-to-decision latency (seconds)
+        self.last_latency = 0.0
+        self.avg_latency = 0.0
+        self.max_latency = 0.0
+        self.fps = 0.0 # Smoothed processing rate
+        self.last_processed_at = None
+        self.timers = {stage: STAGE_SECONDS.labels(name, stage) for stage in STREAM_STAGES}
+        self.lock = threading.Lock() # Serializes access to latest_frame and the busy flag
+        self.frame_ready = threading.Condition(self.lock)
+
+    def open(self, on_frame, timeout=None):
+        """Opens the source and starts capturing. timeout (seconds) bounds connecting to network cameras
+        and, for stream URLs, each read, so a dead connection ends the capture instead of hanging it."""
+        params = []
+        if timeout and hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+            params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(timeout * 1000)]
+        if timeout and isinstance(self.source, str) and "://" in self.source and hasattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC"):
+            params += [cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(timeout * 1000)]
+        cap = cv2.VideoCapture(self.source, cv2.CAP_ANY, params) if params else cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return False
+        self.cap = cap
+        self.capture = CaptureThread(cap, self.ring, on_frame=on_frame,
+                                     realtime=is_file_source(self.source), name=f"capture-{self.name}",
+                                     read_timer=self.timers["capture"])
+        self.health.opened(time.perf_counter())
+        self.active = True
+        self.capture.start()
+        return True
+
+    def close_capture(self):
+        """Stops capturing. A capture thread stuck in a read releases the camera once the read returns,
+        and whatever it read then is discarded by the ring, so it can't land after a reopened capture's frames."""
+        self.active = False
+        if self.capture is not None:
+            self.capture.stop()
+            self.ring.retire()
+            self.capture.join(timeout=2)
+        self.capture = None
+        self.cap = None
+
+    def frame_age(self):
+        """Seconds since the camera delivered its last frame, None before the first."""
+        captured_at = self.ring.last_captured_at
+        return time.perf_counter() - captured_at if captured_at is not None else None
+
+    def release(self):
+        self.close_capture()
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
+
+    def record_latency(self, captured_at):
+        now = time.perf_counter()
+        latency = now - captured_at
+        self.last_latency = latency
+        self.avg_latency = latency if self.frames_processed == 0 else self.avg_latency * 0.9 + latency * 0.1
+        self.max_latency = max(self.max_latency, latency)
+        self.timers["total"].observe(latency)
+        if self.last_processed_at is not None and now > self.last_processed_at:
+            fps = 1.0 / (now - self.last_processed_at)
+            self.fps = fps if not self.fps else self.fps * 0.9 + fps * 0.1
+        self.last_processed_at = now
+
+    def register_metrics(self):
+        """Exposes the stream's counters as scrape-time gauges."""
+        CAMERA_FPS.labels(self.name).set_function(lambda: self.fps)
+        FRAMES_CAPTURED.labels(self.name).set_function(lambda: self.ring.captured)
+        FRAMES_PROCESSED.labels(self.name).set_function(lambda: self.frames_processed)
+        FRAMES_DROPPED.labels(self.name).set_function(lambda: self.ring.dropped)
+        FRAMES_GATED.labels(self.name).set_function(lambda: self.motion.frames_gated if self.motion else 0)
+        QUEUE_DEPTH.labels(self.name).set_function(lambda: int(self.ring.pending))
+        FIRE_DETECTED.labels(self.name).set_function(lambda: int(self.fire_detected))
+        CAMERA_HEALTH.labels(self.name).set_function(self.health.score)
+        FRAME_AGE.labels(self.name).set_function(lambda: self.frame_age() or 0.0)
+        RECONNECTS.labels(self.name).set_function(lambda: self.health.reconnects)
+        if isinstance(self.segmenter, VerifiedDetector):
+            CANDIDATES_REJECTED.labels(self.name).set_function(lambda: self.segmenter.rejected)
+            FRAMES_UNVERIFIED.labels(self.name).set_function(lambda: self.segmenter.unverified)
+
+    def stats(self):
+        frame_age = self.frame_age()
+        return {
+            "name": self.name,
+            "active": self.active,
+            "health": self.health.to_dict(),
+            "frame_age": round(frame_age, 2) if frame_age is not None else None,
+            "fire_detected": self.fire_detected,
+            "frames_captured": self.ring.captured,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.ring.dropped,
+            "latency_ms": round(self.last_latency * 1000, 1),
+            "avg_latency_ms": round(self.avg_latency * 1000, 1),
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+            "frames_static": self.motion.frames_gated if self.motion else 0,
+            "flicker_hz": self.flicker_hz(),
+            "fps": round(self.fps, 1),
+            "candidates_rejected": self.segmenter.rejected if isinstance(self.segmenter, VerifiedDetector) else 0,
+            "frames_unverified": self.segmenter.unverified if isinstance(self.segmenter, VerifiedDetector) else 0,
+            "incident": self.incident.to_dict() if self.incident else None,
+            "tracks": self.tracker.tracks(),
+        }
+
+    def flicker_hz(self):
+        hz = self.motion.flicker_hz if self.motion else None
+        return round(hz, 1) if hz is not None else None
+
+    def publish(self, frame):
+        now = time.time()
+        with self.lock:
+            self.latest_frame = frame
+            self.frame_seq += 1
+            # Published frames are never modified again, so keeping references costs no copies
+            if not self.recent_frames or now - self.recent_frames[-1][0] >= RECENT_FRAME_INTERVAL:
+                self.recent_frames.append((now, frame))
+            seq = self.frame_seq
+            self.frame_ready.notify_all()
+        if self.bus_name is not None:
+            self.publish_shared(frame, seq, now)
+
+    def publish_shared(self, frame, seq, timestamp):
+        """Copies a published frame into the frame bus (one writer: a stream has one frame in flight)."""
+        try:
+            if self.bus is not None and frame.nbytes > self.bus.slot_bytes:
+                # The camera came back at a higher resolution, readers attach to the new bus
+                self.bus.close()
+                self.bus = None
+            if self.bus is None:
+                self.bus = FrameBus(self.bus_name, self.bus_sync, create=True, shape=frame.shape)
+                self.timers["bus"] = STAGE_SECONDS.labels(self.name, "bus")
+                print(f"--- {self.name}: Frame bus {self.bus_name} ({self.bus.slots} x {self.bus.slot_bytes} bytes) ---")
+            started = time.perf_counter()
+            self.bus.write(frame, seq, timestamp)
+            self.timers["bus"].observe(time.perf_counter() - started)
+        except Exception as e:
+            print(f"Frame bus error on {self.name}: {e}")
+
+    def frames_before(self, timestamp, count=1):
+        """Returns up to count sampled frames published before timestamp, oldest first."""
+        with self.lock:
+            frames = [frame for ts, frame in self.recent_frames if ts < timestamp]
+        return frames[-count:]
+
+    def snapshot(self):
+        """Returns the most recent annotated frame (or None before the first frame)."""
+        with self.lock:
+            return self.latest_frame
+
+    def latest(self):
+        """Returns (frame, sequence number) of the most recent annotated frame."""
+        with self.lock:
+            return self.latest_frame, self.frame_seq
+
+    def wait_frame(self, after_seq, timeout=None):
+        """Blocks until a frame newer than after_seq is published. Returns (frame, sequence number)."""
+        with self.frame_ready:
+            self.frame_ready.wait_for(lambda: self.frame_seq != after_seq, timeout=timeout)
+            return self.latest_frame, self.frame_seq
+
+    def frame_intact(self, seq):
+        """Published frames are never modified; BusStream readers can see theirs overwritten."""
+        return True
+
+class DetectionEngine:
+    """Runs the detection pipeline for many cameras on a worker pool sized to the core count.
+
+    Each camera has a dedicated capture thread feeding a latest-frame ring. A stream is
+    scheduled on the pool when a new frame lands and it has nothing in flight, so its
+    persistence state is only ever touched by one worker and detection always sees the
+    newest frame, while the pool is shared fairly between all streams.
+    """
+
+    def __init__(self, sources, on_fire, is_armed, persistence_threshold=7, workers=None,
+                 detection_scale=1.0, rois=None, motion_gate=False, require_flicker=False, on_state_change=None,
+                 backend="hsv", verifier=None, verify_threshold=0.5, incident_gap=30.0, on_incident=None,
+                 reconnect=True, stale_after=10.0, frozen_after=60.0, black_after=30.0, outage_after=15.0,
+                 on_outage=None):
+        self.streams = [CameraStream(src, f"CAM-{i + 1}", make_detector(backend, detection_scale, rois),
+                                     MotionGate() if motion_gate or require_flicker else None)
+                        for i, src in enumerate(sources)]
+        self.backend = backend
+        self.verifier = verifier # Shared BatchClassifier, second stage on every camera's candidate boxes
+        if verifier is not None:
+            VERIFIER_FAILURES.labels().set_function(lambda: verifier.failed_batches)
+            for stream in self.streams:
+                stream.segmenter = VerifiedDetector(stream.segmenter, verifier, verify_threshold,
+                                                    timer=STAGE_SECONDS.labels(stream.name, "verify"))
+        self.require_flicker = require_flicker # Candidates that don't flicker never count towards persistence
+        self.on_fire = on_fire # Shared alert dispatcher: on_fire(stream, frame)
+        self.is_armed = is_armed
+        self.on_state_change = on_state_change # on_state_change(stream) when fire_detected flips
+        self.on_incident = on_incident # on_incident(stream, incident) when an incident opens or closes
+        self.hud = HudOverlay() # Pre-rendered HUD layers, shared by all cameras
+        self.supervisor = CaptureSupervisor(self, stale_after=stale_after, alert_after=outage_after,
+                                            on_outage=on_outage) if reconnect else None
+        self.open_timeout = None
+        self.persistence_threshold = persistence_threshold
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.running = False
+        for stream in self.streams:
+            stream.persistence_threshold = persistence_threshold
+            stream.incident_gap = incident_gap
+            stream.health.frozen_after = frozen_after
+            stream.health.black_after = black_after
+            stream.register_metrics()
+
+    def start(self, open_timeout=None):
+        """Opens every camera in parallel, so one slow or dead source doesn't hold up the others.
+        Cameras that fail to open are retried by the supervisor."""
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sentinel-cam")
+        self.running = True
+        self.open_timeout = open_timeout
+
+        def open_stream(stream):
+            if self.open_stream(stream):
+                print(f"--- {stream.name}: Online ({stream.source}) ---")
+            else:
+                print(f"Error: Could not open camera {stream.name} ({stream.source}).")
+
+        openers = [threading.Thread(target=open_stream, args=(stream,), name=f"open-{stream.name}", daemon=True)
+                   for stream in self.streams]
+        for opener in openers:
+            opener.start()
+        for opener in openers:
+            opener.join()
+        if self.supervisor is not None:
+            self.supervisor.start()
+        return any(stream.active for stream in self.streams)
+
+    def open_stream(self, stream):
+        return stream.open(on_frame=lambda: self._schedule(stream), timeout=self.open_timeout)
+
+    def stop(self):
+        self.running = False
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        for stream in self.streams:
+            stream.release()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+    @property
+    def alive(self):
+        """Running while a camera is capturing or can still be reconnected."""
+        supervised = self.supervisor is not None
+        return self.running and any(stream.active or (supervised and stream.reconnect) for stream in self.streams)
+
+    def get_stream(self, name=None):
+        if name is None:
+            return self.streams[0] if self.streams else None
+        for stream in self.streams:
+            if stream.name == name:
+                return stream
+        return None
+
+    def _schedule(self, stream):
+        """Queues a detection pass for the stream unless one is already in flight."""
+        with stream.lock:
+            if stream.busy or not self.running:
+                return
+            stream.busy = True
+        try:
+            self.executor.submit(self._step, stream)
+        except RuntimeError:
+            stream.busy = False # Pool is shutting down
+
+    def configure(self, stream, settings):
+        """Queues new detection settings for a stream. The detector (colour bands, kernels) is built
+        here, on the caller's thread; the stream's worker swaps it in between two frames."""
+        detector = detector_for(self.backend, settings)
+        with stream.lock:
+            stream.pending_config = (detector, settings)
+
+    def apply_config(self, stream):
+        with stream.lock:
+            (detector, settings), stream.pending_config = stream.pending_config, None
+        if isinstance(stream.segmenter, VerifiedDetector):
+            # Keep the verifier and its counters, replace what it verifies
+            stream.segmenter.detector = detector
+            stream.segmenter.threshold = settings["verifier_threshold"]
+        else:
+            stream.segmenter = detector
+        stream.persistence_threshold = settings["persistence"]
+        stream.incident_gap = settings["incident_gap"]
+        # Persistence state carries over, within the new bounds
+        stream.fire_persistence_counter = min(stream.fire_persistence_counter, stream.persistence_threshold * 2)
+
+    def _step(self, stream):
+        """Processes the newest frame of a stream, then reschedules it if another one arrived."""
+        if stream.pending_config is not None:
+            self.apply_config(stream)
+        item = stream.ring.acquire()
+        if item is not None:
+            slot, captured_at = item
+            try:
+                self.process_frame(stream, slot, captured_at)
+            except Exception as e:
+                print(f"Error processing {stream.name}: {e}")
+            finally:
+                stream.ring.release()
+        with stream.lock:
+            stream.busy = False
+        if stream.ring.pending:
+            self._schedule(stream)
+        elif not stream.reconnect and stream.capture is not None and stream.capture.ended and stream.active:
+            print(f"--- {stream.name}: Stream ended ---")
+            stream.active = False
+
+    def find_regions(self, stream, frame, captured_at):
+        if stream.motion is None:
+            return stream.segmenter.find_regions(frame)
+        # Only segment what changed, plus whatever was already burning
+        started = time.perf_counter()
+        tiles = stream.motion.changed_tiles(frame, sticky=stream.last_boxes, timestamp=captured_at)
+        stream.timers["motion"].observe(time.perf_counter() - started)
+        if tiles is None:
+            boxes = stream.segmenter.find_regions(frame)
+        elif tiles:
+            boxes = stream.segmenter.find_regions(frame, tiles)
+        else:
+            boxes = []
+        stream.motion.measure_flicker(boxes)
+        stream.last_boxes = boxes
+        return boxes
+
+    def flicker_ok(self, stream):
+        if not self.require_flicker or stream.motion is None:
+            return True
+        hz = stream.motion.flicker_hz
+        # Not enough history yet: let persistence build up, the meter vetoes once it has a reading
+        return hz is None or hz >= FLICKER_MIN_HZ
+
+    def detect(self, stream, frame, captured_at, armed=True):
+        """Detection stage shared with offline evaluation: segments the frame and updates the
+        stream's persistence state. Returns the fire boxes, stream.fire_detected holds the decision."""
+        boxes = self.find_regions(stream, frame, captured_at)
+        segment_time, contour_time = stream.segmenter.pop_timings()
+        stream.timers["segment"].observe(segment_time)
+        stream.timers["contours"].observe(contour_time)
+        track_ids = stream.track_ids = stream.tracker.update(boxes, captured_at)
+
+        # Persistence Logic
+        if boxes and armed and self.flicker_ok(stream):
+            stream.fire_persistence_counter = min(stream.persistence_threshold * 2, stream.fire_persistence_counter + 2)
+        else:
+            stream.fire_persistence_counter = max(0, stream.fire_persistence_counter - 1)
+
+        was_detected = stream.fire_detected
+        stream.fire_detected = stream.fire_persistence_counter >= stream.persistence_threshold
+        if stream.fire_detected != was_detected and self.on_state_change:
+            self.on_state_change(stream)
+        self.correlate(stream, track_ids, captured_at)
+        return boxes
+
+    def correlate(self, stream, track_ids, timestamp):
+        """Groups confirmed detections into incidents. Fire that comes back within incident_gap
+        seconds, on the same tracks or new ones, continues the open incident instead of starting one."""
+        incident = stream.incident
+        if stream.fire_detected:
+            if incident is None:
+                stream.incident_seq += 1
+                incident = stream.incident = Incident(stream.name, timestamp)
+                if self.on_incident:
+                    self.on_incident(stream, incident)
+            incident.update(timestamp, track_ids, stream.tracker.summary())
+        elif incident is not None and timestamp - incident.last_confirmed > stream.incident_gap:
+            stream.incident = None
+            incident.close()
+            if self.on_incident:
+                self.on_incident(stream, incident)
+
+    def process_frame(self, stream, slot, captured_at):
+        stream.timers["queue"].observe(time.perf_counter() - captured_at)
+        started = time.perf_counter()
+        armed = self.is_armed() # Shared state read, once per frame
+        stream.timers["state"].observe(time.perf_counter() - started)
+        stream.health.observe(slot, captured_at)
+        boxes = self.detect(stream, slot, captured_at, armed)
+        stream.record_latency(captured_at)
+
+        # The ring slot is recycled by the capture thread, annotate a private copy
+        started = time.perf_counter()
+        frame = slot.copy()
+        draw_detections(frame, boxes)
+
+        # Trigger Alarm and Alerts
+        if stream.fire_detected and armed:
+            alert_started = time.perf_counter()
+            self.on_fire(stream, frame)
+            alert_time = time.perf_counter() - alert_started
+            stream.timers["alert"].observe(alert_time)
+            started += alert_time
+
+        # Update HUD overlays
+        self.hud.apply(frame, stream.fire_detected, armed, stream.name if len(self.streams) > 1 else None)
+        stream.timers["annotate"].observe(time.perf_counter() - started)
+
+        stream.frames_processed += 1
+        stream.publish(frame)
@@ -0,0 +1,291 @@
+"""Offline replay and batch evaluation of the detection stage over video files and image folders.
+
+    python evaluate.py footage/ --labels labels/ --decisions decisions.jsonl --persistence 7 --min-area 100
+
+Every source runs through the same segmentation and persistence logic as the live
+engine, without display, alarm or network, one source per process. A source is
+labelled by a text file of fire frame ranges ("start-end" or a single frame per line,
+inclusive, 0-based, # comments) named after it: footage/a.mp4 -> a.labels. An empty
+label file marks footage without fire; sources without one are replayed but not scored.
+--verifier-model adds the CNN second stage, to compare precision with and without it.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from engine import CameraStream, DetectionEngine, parse_rois
+from motion import MotionGate
+from verifier import BatchClassifier, VerifiedDetector
+from vision import make_detector, DETECTOR_BACKENDS, FIRE_HSV_RANGES, MIN_FIRE_AREA
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mkv", ".mov", ".m4v", ".mpg", ".mpeg", ".wmv", ".webm"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+def parse_hsv_ranges(spec):
+    """Parses "h,s,v-h,s,v;h,s,v-h,s,v" into [((h, s, v), (h, s, v)), ...]."""
+    ranges = []
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        lower, upper = part.split("-")
+        ranges.append((tuple(int(v) for v in lower.split(",")), tuple(int(v) for v in upper.split(","))))
+    return ranges
+
+def parse_labels(path):
+    """Reads fire frame ranges as a sorted list of inclusive (start, end) tuples."""
+    ranges = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            start, _, end = line.partition("-")
+            ranges.append((int(start), int(end or start)))
+    return sorted(ranges)
+
+def find_sources(paths):
+    """Expands the given files and folders into video files and image folders."""
+    sources = []
+    for path in paths:
+        if os.path.isfile(path):
+            sources.append(path)
+            continue
+        if not os.path.isdir(path):
+            print(f"Warning: {path} not found, skipped.")
+            continue
+        entries = sorted(os.listdir(path))
+        if any(os.path.splitext(e)[1].lower() in IMAGE_EXTENSIONS for e in entries):
+            sources.append(path)
+        for entry in entries:
+            full = os.path.join(path, entry)
+            if os.path.isdir(full):
+                sources.extend(find_sources([full]))
+            elif os.path.splitext(entry)[1].lower() in VIDEO_EXTENSIONS:
+                sources.append(full)
+    return sources
+
+def label_path(source, labels_dir=None):
+    name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0] + ".labels"
+    directory = labels_dir or os.path.dirname(os.path.normpath(source))
+    return os.path.join(directory, name)
+
+def read_frames(source, image_fps):
+    """Yields (index, timestamp, frame) from a video file or a folder of images (sorted by name)."""
+    if os.path.isdir(source):
+        names = sorted(e for e in os.listdir(source) if os.path.splitext(e)[1].lower() in IMAGE_EXTENSIONS)
+        for index, name in enumerate(names):
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield index, index / image_fps, frame
+        return
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or image_fps
+    index = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, index / fps, frame
+            index += 1
+    finally:
+        cap.release()
+
+def score(decisions, ranges):
+    """Frame-level confusion counts for one series of decisions."""
+    counts = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+    labelled = set()
+    for start, end in ranges:
+        labelled.update(range(start, end + 1))
+    for index, positive in decisions:
+        if positive:
+            counts["tp" if index in labelled else "fp"] += 1
+        else:
+            counts["fn" if index in labelled else "tn"] += 1
+    return counts
+
+def time_to_detection(decisions, times, ranges):
+    """Seconds from the start of each labelled fire to the first positive decision inside it, None if missed."""
+    positives = [index for index, positive in decisions if positive]
+    delays = []
+    for start, end in ranges:
+        hit = next((index for index in positives if start <= index <= end), None)
+        delays.append(round(times[hit] - times[start], 3) if hit is not None and start in times else None)
+    return delays
+
+def evaluate_source(source, options):
+    """Replays one source through the detection stage. Runs in a worker process."""
+    cv2.setNumThreads(1) # Parallelism comes from the process pool
+    incidents = [] # Closed incidents, their confirmation times are video seconds
+
+    def incident_changed(stream, incident):
+        if incident.ended is not None:
+            incidents.append(incident)
+
+    engine = DetectionEngine([], on_fire=None, is_armed=lambda: True,
+                             persistence_threshold=options["persistence"], require_flicker=options["require_flicker"],
+                             on_incident=incident_changed)
+    detector = make_detector(options["detector"], options["scale"], options["rois"], options["hsv_ranges"],
+                             options["min_area"])
+    verifier = None
+    if options["verifier"]:
+        verifier = BatchClassifier(**options["verifier"])
+        verifier.start()
+        detector = VerifiedDetector(detector, verifier, options["verifier_threshold"])
+    stream = CameraStream(source, os.path.basename(os.path.normpath(source)), detector,
+                          MotionGate() if options["motion_gate"] or options["require_flicker"] else None)
+    stream.persistence_threshold = options["persistence"]
+    stream.incident_gap = options["incident_gap"]
+    decisions, raw, times, frames = [], [], {}, []
+    started = time.perf_counter()
+    for index, timestamp, frame in read_frames(source, options["image_fps"]):
+        boxes = engine.detect(stream, frame, timestamp)
+        decisions.append((index, stream.fire_detected))
+        raw.append((index, bool(boxes)))
+        times[index] = timestamp
+        if options["decisions"]:
+            frames.append({"source": source, "frame": index, "time": round(timestamp, 3),
+                           "fire": stream.fire_detected, "raw": bool(boxes), "boxes": [list(b) for b in boxes],
+                           "tracks": stream.track_ids})
+    elapsed = time.perf_counter() - started
+    if verifier:
+        verifier.stop()
+    if stream.incident is not None:
+        incidents.append(stream.incident) # Still open at the end of the footage
+
+    result = {"source": source, "frames": len(decisions), "seconds": round(elapsed, 2),
+              "fps": round(len(decisions) / elapsed, 1) if elapsed else None,
+              "incidents": stream.incident_seq, "decisions": frames,
+              "incident_spans": [{"start": round(incident.first_confirmed, 3), "end": round(incident.last_confirmed, 3),
+                                  "tracks": len(incident.track_ids), "peak_regions": incident.regions,
+                                  "peak_growth": incident.growth, "flicker_hz": incident.flicker_hz}
+                                 for incident in incidents]}
+    if verifier:
+        result["candidates_rejected"] = detector.rejected
+    labels = label_path(source, options["labels"])
+    if os.path.exists(labels):
+        ranges = parse_labels(labels)
+        result["labelled"] = True
+        result["counts"] = score(decisions, ranges)
+        result["raw_counts"] = score(raw, ranges)
+        result["time_to_detection"] = time_to_detection(decisions, times, ranges)
+    return result
+
+def summarize(counts):
+    tp, fp, fn = counts["tp"], counts["fp"], counts["fn"]
+    return {
+        "precision": round(tp / (tp + fp), 4) if tp + fp else None,
+        "recall": round(tp / (tp + fn), 4) if tp + fn else None,
+        **counts,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay footage through the Sentinel detection stage.")
+    parser.add_argument("paths", nargs="+", help="Video files and/or folders (of videos or images)")
+    parser.add_argument("--labels", help="Folder with <source>.labels files (default: next to each source)")
+    parser.add_argument("--decisions", help="Write per-frame decisions as JSON lines to this file")
+    parser.add_argument("--summary", help="Write the summary as JSON to this file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--persistence", type=int, default=7, help="Frames needed to confirm fire")
+    parser.add_argument("--min-area", type=int, default=MIN_FIRE_AREA)
+    parser.add_argument("--hsv", help='HSV ranges, "h,s,v-h,s,v;h,s,v-h,s,v" (default: the built-in fire ranges)')
+    parser.add_argument("--scale", type=float, default=1.0, help="Detection downscale, as SENTINEL_DETECTION_SCALE")
+    parser.add_argument("--rois", default="", help="Regions of interest, as SENTINEL_ROIS")
+    parser.add_argument("--motion-gate", action="store_true")
+    parser.add_argument("--require-flicker", action="store_true")
+    parser.add_argument("--incident-gap", type=float, default=30.0,
+                        help="Seconds of quiet that end an incident, as SENTINEL_INCIDENT_GAP")
+    parser.add_argument("--image-fps", type=float, default=25.0, help="Frame rate assumed for image folders")
+    parser.add_argument("--detector", default="hsv", choices=list(DETECTOR_BACKENDS), help="Detector backend")
+    parser.add_argument("--verifier-model", help="Classifier run on candidate boxes, as SENTINEL_VERIFIER_MODEL")
+    parser.add_argument("--verifier-runtime", default="auto", choices=["auto", "opencv", "onnxruntime"])
+    parser.add_argument("--verifier-threshold", type=float, default=0.5)
+    parser.add_argument("--verifier-size", type=int, default=64)
+    parser.add_argument("--verifier-scale", type=float, default=1 / 255.0)
+    parser.add_argument("--verifier-mean", default="0,0,0")
+    parser.add_argument("--verifier-bgr", action="store_true", help="Feed the model BGR instead of RGB")
+    parser.add_argument("--verifier-fire-class", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    options = {
+        "labels": args.labels,
+        "decisions": bool(args.decisions),
+        "persistence": args.persistence,
+        "min_area": args.min_area,
+        "hsv_ranges": parse_hsv_ranges(args.hsv) if args.hsv else FIRE_HSV_RANGES,
+        "scale": args.scale,
+        "rois": parse_rois(args.rois),
+        "motion_gate": args.motion_gate,
+        "require_flicker": args.require_flicker,
+        "image_fps": args.image_fps,
+        "incident_gap": args.incident_gap,
+        "detector": args.detector,
+        "verifier": {"model_path": args.verifier_model, "runtime": args.verifier_runtime, "input_size": args.verifier_size,
+                     "scale": args.verifier_scale, "mean": tuple(float(v) for v in args.verifier_mean.split(",")),
+                     "swap_rb": not args.verifier_bgr, "fire_class": args.verifier_fire_class} if args.verifier_model else None,
+        "verifier_threshold": args.verifier_threshold,
+    }
+    sources = find_sources(args.paths)
+    if not sources:
+        print("Error: No video files or image folders found.")
+        return 1
+    print(f"--- Evaluating {len(sources)} source(s) on {args.workers} workers ---")
+
+    totals = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+    raw_totals = dict(totals)
+    delays, results = [], []
+    decisions_file = open(args.decisions, "w") if args.decisions else None
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(evaluate_source, source, options): source for source in sources}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error evaluating {futures[future]}: {e}")
+                    continue
+                for decision in result.pop("decisions"):
+                    decisions_file.write(json.dumps(decision) + "\n")
+                if result.get("labelled"):
+                    for key in totals:
+                        totals[key] += result["counts"][key]
+                        raw_totals[key] += result["raw_counts"][key]
+                    delays.extend(result["time_to_detection"])
+                    result["metrics"] = summarize(result.pop("counts"))
+                    result["raw_metrics"] = summarize(result.pop("raw_counts"))
+                results.append(result)
+                print(f"{result['source']}: {result['frames']} frames at {result['fps']} fps, "
+                      f"{result['incidents']} incident(s)"
+                      + (f", precision {result['metrics']['precision']}, recall {result['metrics']['recall']}"
+                         if result.get("labelled") else ""))
+    finally:
+        if decisions_file:
+            decisions_file.close()
+
+    detected = [d for d in delays if d is not None]
+    summary = {
+        "sources": len(results),
+        "frames": sum(r["frames"] for r in results),
+        "seconds": round(time.perf_counter() - started, 2),
+        "metrics": summarize(totals),
+        "raw_metrics": summarize(raw_totals), # Before persistence
+        "fires": len(delays),
+        "fires_missed": len(delays) - len(detected),
+        "mean_time_to_detection": round(sum(detected) / len(detected), 3) if detected else None,
+        "max_time_to_detection": max(detected) if detected else None,
+        "results": sorted(results, key=lambda r: r["source"]),
+    }
+    print(f"--- {summary['frames']} frames in {summary['seconds']}s: precision {summary['metrics']['precision']}, "
+          f"recall {summary['metrics']['recall']}, {summary['fires_missed']}/{summary['fires']} fires missed, "
+          f"mean time to detection {summary['mean_time_to_detection']}s ---")
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
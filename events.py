@@ -0,0 +1,154 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+def wake_future(future):
+    """Resolves a waiter's future, scheduled on its loop with call_soon_threadsafe."""
+    if not future.done():
+        future.set_result(None)
+
+class EventSubscriber:
+    """Bounded per-client queue. A client that falls too far behind is told to resync."""
+
+    def __init__(self, max_pending):
+        self.pending = deque()
+        self.max_pending = max_pending
+        self.overflowed = False
+        self.cond = threading.Condition()
+        self.waiter = None # (loop, future) of a client served from an event loop
+
+    def put(self, event):
+        with self.cond:
+            if len(self.pending) >= self.max_pending:
+                self.pending.clear()
+                self.overflowed = True
+            self.pending.append(event)
+            self.cond.notify()
+            if self.waiter is not None:
+                loop, future = self.waiter
+                self.waiter = None
+                loop.call_soon_threadsafe(wake_future, future)
+
+    def _drain(self):
+        events = list(self.pending)
+        self.pending.clear()
+        overflowed, self.overflowed = self.overflowed, False
+        return events, overflowed
+
+    def take(self, timeout):
+        """Returns the queued events (possibly none after timeout) and whether some were lost."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.pending, timeout=timeout)
+            return self._drain()
+
+    async def take_async(self, timeout):
+        """take() without blocking the event loop."""
+        future = None
+        with self.cond:
+            if not self.pending:
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self.waiter = (loop, future)
+        if future is not None:
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+        with self.cond:
+            self.waiter = None
+            return self._drain()
+
+class EventBus:
+    """Pushes state changes to dashboard clients as server-sent events.
+
+    Publishers never block: every subscriber has its own bounded queue, and the last
+    few events are kept so a reconnecting browser can catch up via Last-Event-ID.
+    Event ids are "<epoch>-<n>" with a per-boot epoch, so a browser that reconnects
+    across a restart is told to resync instead of trusting a counter that started over.
+    """
+
+    def __init__(self, history=100, max_pending=256):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.history = deque(maxlen=history)
+        self.max_pending = max_pending
+        self.epoch = f"{time.time_ns() // 1000000:x}"
+        self.next_id = 1
+
+    def publish(self, event_type, data):
+        with self.lock:
+            event = (f"{self.epoch}-{self.next_id}", event_type, json.dumps(data))
+            self.next_id += 1
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    @staticmethod
+    def format(event):
+        event_id, event_type, data = event
+        return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+    def _missed(self, last_event_id):
+        """Retained events after last_event_id, None when the client has to reload its state."""
+        epoch, _, number = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not number.isdigit():
+            return None # Another boot, or not an id of ours
+        number = int(number)
+        if number == self.next_id - 1:
+            return []
+        # Part of the gap fell out of the history, or the id was never handed out
+        if number >= self.next_id or not self.history or int(self.history[0][0].partition("-")[2]) > number + 1:
+            return None
+        return [event for event in self.history if int(event[0].partition("-")[2]) > number]
+
+    def _register(self, last_event_id):
+        """Adds a subscriber and returns it with the text that opens its stream."""
+        subscriber = EventSubscriber(self.max_pending)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            missed = [] if last_event_id is None else self._missed(last_event_id)
+        preamble = "retry: 2000\n\n"
+        if missed is None:
+            preamble += "event: resync\ndata: {}\n\n"
+        else:
+            preamble += "".join(self.format(event) for event in missed)
+        return subscriber, preamble
+
+    def _render(self, events, overflowed):
+        if overflowed:
+            return "event: resync\ndata: {}\n\n"
+        if not events:
+            return ": keep-alive\n\n" # Also lets the server notice closed connections
+        return "".join(self.format(event) for event in events)
+
+    def _unregister(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def subscribe(self, last_event_id=None, heartbeat=15.0):
+        """Yields SSE-formatted text for one client until it disconnects."""
+        subscriber, preamble = self._register(last_event_id)
+        try:
+            yield preamble
+            while True:
+                yield self._render(*subscriber.take(heartbeat))
+        finally:
+            self._unregister(subscriber)
+
+    async def subscribe_async(self, send, last_event_id=None, heartbeat=15.0):
+        """Sends SSE-formatted text with await send(text) until the client disconnects (send raises)."""
+        subscriber, preamble = self._register(last_event_id)
+        try:
+            await send(preamble)
+            while True:
+                await send(self._render(*await subscriber.take_async(heartbeat)))
+        finally:
+            self._unregister(subscriber)
+
+    @property
+    def client_count(self):
+        with self.lock:
+            return len(self.subscribers)
@@ -0,0 +1,255 @@
+import multiprocessing
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+MAGIC = 0x53454E544642 # "SENTFB"
+FIELDS = 8 # int64 fields per header, one cache line
+HEADER_BYTES = FIELDS * 8
+LOCK_TIMEOUT = 0.5 # Seconds the writer waits for a lock before it gives up on a frame
+# Bus header fields
+H_MAGIC, H_SLOTS, H_SLOT_BYTES, H_LATEST_SLOT, H_LATEST_SEQ, H_CLOSED = range(6)
+# Slot header fields (S_TIME holds a float64)
+S_WRITES, S_SEQ, S_TIME, S_HEIGHT, S_WIDTH, S_CHANNELS = range(6)
+attach_lock = threading.Lock()
+
+def attach_untracked(name):
+    """Opens an existing segment without registering it with the resource tracker, which would
+    otherwise unlink it when this process exits (or, shared with the creator, drop the creator's
+    entry). Only the creator removes a bus. Python < 3.13 has no track=False."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    with attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+class FrameBusSync:
+    """The cross-process primitives of one camera's frame bus: a lock per slot and a condition
+    that is notified on every new frame. Created before the reader processes start and handed
+    to them, it outlives the bus itself, which is recreated when the frame size grows."""
+
+    def __init__(self, slots=4, context=None):
+        context = context or multiprocessing.get_context()
+        self.slot_locks = [context.Lock() for _ in range(slots)]
+        self.frame_ready = context.Condition()
+
+    @property
+    def slots(self):
+        return len(self.slot_locks)
+
+class FrameBus:
+    """A ring of fixed-size frame slots in shared memory, one writer and any number of reader processes.
+
+    Every slot is written under its own process-shared lock, and readers take the lock to
+    read a slot's header, so they never see a new sequence number with an old payload, on
+    any CPU. Readers get read-only numpy views straight into the shared memory, not copies;
+    with several slots the writer only comes back to a slot after the others, which leaves
+    readers a few frame intervals to use a view. intact(seq) tells whether it survived.
+    New frames are announced on a condition, so waiting readers sleep until one arrives.
+    """
+
+    def __init__(self, name, sync, create=False, shape=None):
+        self.sync = sync
+        if create:
+            slots = sync.slots
+            slot_bytes = -(-int(np.prod(shape)) // 64) * 64 # Keep every slot cache-line aligned
+            size = HEADER_BYTES * (1 + slots) + slot_bytes * slots
+            try:
+                self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a process that died without cleaning up
+                stale = shared_memory.SharedMemory(name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        else:
+            self.shm = attach_untracked(name)
+            header = np.ndarray((FIELDS,), np.int64, buffer=self.shm.buf)
+            if header[H_MAGIC] != MAGIC or header[H_SLOTS] != sync.slots:
+                del header
+                self.shm.close()
+                raise ValueError(f"{name} is not a frame bus of this sync")
+            slots, slot_bytes = int(header[H_SLOTS]), int(header[H_SLOT_BYTES])
+            del header
+        self.name = name
+        self.owner = create
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        headers = np.ndarray((1 + slots, FIELDS), np.int64, buffer=self.shm.buf)
+        self.header = headers[0]
+        self.slot_headers = headers[1:]
+        self.slot_times = self.slot_headers.view(np.float64)[:, S_TIME]
+        self.data = np.ndarray((slots, slot_bytes), np.uint8, buffer=self.shm.buf, offset=HEADER_BYTES * (1 + slots))
+        if create:
+            with sync.frame_ready:
+                self.slot_headers[:] = 0
+                self.header[H_SLOTS] = slots
+                self.header[H_SLOT_BYTES] = slot_bytes
+                self.header[H_LATEST_SLOT] = slots - 1 # The first write goes to slot 0
+                self.header[H_LATEST_SEQ] = 0
+                self.header[H_CLOSED] = 0
+                self.header[H_MAGIC] = MAGIC # Readers refuse to attach before it is set
+
+    def write(self, frame, seq, timestamp):
+        """Copies a frame into the next slot. Single writer only. Returns False if it doesn't fit."""
+        if frame.nbytes > self.slot_bytes:
+            return False
+        index = (int(self.header[H_LATEST_SLOT]) + 1) % self.slots
+        slot = self.slot_headers[index]
+        lock = self.sync.slot_locks[index]
+        # A reader holds a lock only to read a few header fields, one that died holding it must not stall detection
+        if not lock.acquire(timeout=LOCK_TIMEOUT):
+            raise TimeoutError(f"slot {index} of {self.name} stayed locked")
+        try:
+            np.copyto(self.data[index, :frame.nbytes].reshape(frame.shape), frame)
+            slot[S_WRITES] += 1
+            slot[S_SEQ] = seq
+            self.slot_times[index] = timestamp
+            slot[S_HEIGHT] = frame.shape[0]
+            slot[S_WIDTH] = frame.shape[1]
+            slot[S_CHANNELS] = frame.shape[2] if frame.ndim == 3 else 0
+        finally:
+            lock.release()
+        if not self.sync.frame_ready.acquire(timeout=LOCK_TIMEOUT):
+            raise TimeoutError(f"{self.name} stayed locked")
+        try:
+            self.header[H_LATEST_SLOT] = index
+            self.header[H_LATEST_SEQ] = seq
+            self.sync.frame_ready.notify_all()
+        finally:
+            self.sync.frame_ready.release()
+        return True
+
+    @property
+    def latest_seq(self):
+        with self.sync.frame_ready:
+            return int(self.header[H_LATEST_SEQ])
+
+    @property
+    def closed(self):
+        """Set by the writer when it replaced or removed the bus; readers attach again."""
+        return bool(self.header[H_CLOSED])
+
+    def read(self):
+        """Returns (frame view, seq, timestamp) of the newest frame, or (None, 0, 0.0) if there is none yet."""
+        with self.sync.frame_ready:
+            if self.header[H_CLOSED]:
+                return None, 0, 0.0
+            index = int(self.header[H_LATEST_SLOT])
+        slot = self.slot_headers[index]
+        with self.sync.slot_locks[index]:
+            # The writer may have moved on to this slot since, then this is an even newer frame
+            if slot[S_WRITES] == 0:
+                return None, 0, 0.0 # Nothing written yet
+            seq, timestamp = int(slot[S_SEQ]), float(self.slot_times[index])
+            height, width, channels = int(slot[S_HEIGHT]), int(slot[S_WIDTH]), int(slot[S_CHANNELS])
+        shape = (height, width, channels) if channels else (height, width)
+        frame = self.data[index, :int(np.prod(shape))].reshape(shape)
+        frame.flags.writeable = False
+        return frame, seq, timestamp
+
+    def intact(self, seq):
+        """True while the slot holding frame seq has not been rewritten since it was published."""
+        for index in range(self.slots):
+            with self.sync.slot_locks[index]:
+                if self.slot_headers[index][S_SEQ] == seq and self.slot_headers[index][S_WRITES]:
+                    return not self.header[H_CLOSED]
+        return False
+
+    def wait(self, after_seq, timeout=None):
+        """Sleeps until a frame newer than after_seq is announced. Returns read() or (None, after_seq, 0.0)."""
+        with self.sync.frame_ready:
+            if not self.sync.frame_ready.wait_for(
+                    lambda: self.header[H_LATEST_SEQ] != after_seq or self.header[H_CLOSED], timeout):
+                return None, after_seq, 0.0
+            if self.header[H_CLOSED]:
+                return None, after_seq, 0.0
+        return self.read()
+
+    def close(self):
+        """Detaches; the creator also removes the segment and tells the readers. Views handed out must
+        not be used afterwards."""
+        if self.owner:
+            with self.sync.frame_ready:
+                self.header[H_CLOSED] = 1
+                self.sync.frame_ready.notify_all()
+        del self.header, self.slot_headers, self.slot_times, self.data
+        try:
+            self.shm.close()
+        except BufferError:
+            pass # A reader still holds a view, the mapping goes away with the process
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+class BusStream:
+    """A camera's frame bus seen from another process, with the frame side of CameraStream's
+    interface (name, wait_frame, latest, snapshot, frame_intact), so MjpegBroadcaster and
+    ClipRecorder run on it unchanged. Attaches once the writer has published its first frame."""
+
+    def __init__(self, name, bus_name, sync):
+        self.name = name
+        self.bus_name = bus_name
+        self.sync = sync
+        self.bus = None
+        self.torn_frames = 0 # Frames overwritten while a consumer was still using them
+
+    def attach(self):
+        if self.bus is not None and self.bus.closed:
+            # The writer replaced the bus, for a larger frame size
+            self.bus.close()
+            self.bus = None
+        if self.bus is None:
+            try:
+                self.bus = FrameBus(self.bus_name, self.sync)
+            except (FileNotFoundError, ValueError):
+                return None # Not created yet
+        return self.bus
+
+    def wait_frame(self, after_seq, timeout=None):
+        bus = self.attach()
+        if bus is None:
+            time.sleep(min(timeout or 0.5, 0.5))
+            return None, after_seq
+        frame, seq, _ = bus.wait(after_seq, timeout)
+        return frame, seq
+
+    def latest(self):
+        bus = self.attach()
+        if bus is None:
+            return None, 0
+        frame, seq, _ = bus.read()
+        return frame, seq
+
+    def snapshot(self):
+        """A private copy of the newest frame, for consumers that keep it."""
+        bus = self.attach()
+        for _ in range(3):
+            if bus is None:
+                return None
+            frame, seq, _ = bus.read()
+            if frame is None:
+                return None
+            frame = frame.copy()
+            if bus.intact(seq):
+                return frame
+        return None
+
+    def frame_intact(self, seq):
+        if self.bus is not None and self.bus.intact(seq):
+            return True
+        self.torn_frames += 1
+        return False
+
+    def close(self):
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
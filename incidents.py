@@ -0,0 +1,197 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    event TEXT NOT NULL,
+    details TEXT,
+    incident TEXT
+);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_incidents_ts ON incidents (ts);
+CREATE INDEX IF NOT EXISTS idx_incidents_type_ts ON incidents (type, ts);
+CREATE INDEX IF NOT EXISTS idx_incidents_incident_ts ON incidents (incident, ts);
+"""
+MAX_QUERY_ROWS = 1000
+
+def parse_time(value):
+    """Accepts epoch seconds or a "YYYY-mm-dd[ HH:MM:SS]" string, returns epoch seconds."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+class IncidentStore:
+    """Append-only incident log in SQLite (WAL mode), indexed by time, event type and fire incident.
+
+    append() only queues the entry; a background writer commits queued entries in
+    batches, so the detection loop and request threads never wait on the disk. Old
+    entries are pruned by age and by row count.
+    """
+
+    def __init__(self, path="incidents.db", batch_size=200, flush_interval=0.5, sync="NORMAL",
+                 max_age_days=365, max_rows=1000000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval # Longest time an entry waits in the queue
+        self.sync = sync # SQLite synchronous level: OFF, NORMAL (fsync on checkpoint) or FULL (fsync per batch)
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.queue = queue.Queue()
+        self.local = threading.local() # One read connection per thread
+        self.running = True
+        self.written = 0
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        if "incident" not in [row[1] for row in conn.execute("PRAGMA table_info(incidents)")]:
+            # Log from before the incident column: fill it in from the details once
+            conn.execute("ALTER TABLE incidents ADD COLUMN incident TEXT")
+            conn.execute("UPDATE incidents SET incident = json_extract(details, '$.incident') "
+                         "WHERE details LIKE '%\"incident\"%'")
+        conn.executescript(INDEXES)
+        conn.commit()
+        conn.close()
+
+        self.writer = threading.Thread(target=self._writer_loop, name="incident-writer", daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.sync}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn
+
+    def append(self, event, event_type="system", **details):
+        """Queues an entry and returns it as it will be stored (without the id)."""
+        now = time.time()
+        entry = {
+            "ts": now,
+            "timestamp": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+            "type": event_type,
+            "event": event,
+        }
+        if details:
+            entry["details"] = details
+        self.queue.put(entry)
+        return entry
+
+    def import_json(self, path):
+        """One-off import of the legacy logs.json (newest first) into an empty store."""
+        if not os.path.exists(path) or self.query(limit=1):
+            return 0
+        try:
+            with open(path, "r") as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not import {path}: {e}")
+            return 0
+        rows = []
+        for entry in reversed(legacy):
+            try:
+                ts = parse_time(entry["timestamp"])
+            except (KeyError, ValueError):
+                continue
+            rows.append((ts, entry["timestamp"], "legacy", entry.get("event", ""), None))
+        conn = self._reader()
+        conn.executemany("INSERT INTO incidents (ts, timestamp, type, event, details) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        return len(rows)
+
+    def query(self, since=None, until=None, event_type=None, limit=50, before_id=None, incident=None):
+        """Returns up to limit (1-MAX_QUERY_ROWS) entries newest first. before_id pages backwards from a
+        previous result, incident keeps the entries about one fire incident (alerts, clips, opening and closing)."""
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if event_type:
+            clauses.append("type = ?")
+            params.append(event_type)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        if incident:
+            clauses.append("incident = ?")
+            params.append(incident)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(max(1, min(int(limit), MAX_QUERY_ROWS)))
+        rows = self._reader().execute(
+            f"SELECT id, ts, timestamp, type, event, details FROM incidents {where} ORDER BY ts DESC, id DESC LIMIT ?",
+            params).fetchall()
+        entries = []
+        for row in rows:
+            entry = {"id": row["id"], "ts": row["ts"], "timestamp": row["timestamp"],
+                     "type": row["type"], "event": row["event"]}
+            if row["details"]:
+                entry["details"] = json.loads(row["details"])
+            entries.append(entry)
+        return entries
+
+    def _writer_loop(self):
+        conn = self._connect()
+        last_prune = 0.0
+        while self.running or not self.queue.empty():
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Collect whatever else arrived, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn.executemany(
+                    "INSERT INTO incidents (ts, timestamp, type, event, details, incident) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(e["ts"], e["timestamp"], e["type"], e["event"],
+                      json.dumps(e["details"]) if "details" in e else None,
+                      e.get("details", {}).get("incident")) for e in batch])
+                conn.commit()
+                self.written += len(batch)
+            except Exception as e:
+                print(f"Failed to write incident log: {e}")
+            if time.time() - last_prune > 3600:
+                self._prune(conn)
+                last_prune = time.time()
+        conn.close()
+
+    def _prune(self, conn):
+        """Retention: drop entries older than max_age_days, then the oldest beyond max_rows."""
+        try:
+            if self.max_age_days:
+                conn.execute("DELETE FROM incidents WHERE ts < ?", (time.time() - self.max_age_days * 86400,))
+            if self.max_rows:
+                conn.execute("DELETE FROM incidents WHERE id <= (SELECT id FROM incidents ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                             (self.max_rows,))
+            conn.commit()
+        except Exception as e:
+            print(f"Failed to prune incident log: {e}")
+
+    def close(self):
+        """Flushes queued entries and stops the writer."""
+        self.running = False
+        self.writer.join(timeout=5)
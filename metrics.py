@@ -0,0 +1,197 @@
+import bisect
+import threading
+from collections import deque
+
+# Seconds, from sub-millisecond colour passes up to multi-second alert API calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_labels(names, values, extra=""):
+    pairs = ['%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " "))
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """A metric family; labels(...) returns the child for one combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            self.children[()] = self.new_child()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def remove(self, *values):
+        with self.lock:
+            self.children.pop(tuple(str(v) for v in values), None)
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(self.child_lines(values, child))
+        return lines
+
+class Value:
+    """Counter or gauge value. Plain float updates: cheap, and a lost increment under a race only skews a count."""
+
+    def __init__(self):
+        self.value = 0.0
+        self.fn = None
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, fn):
+        """Reads the value from fn() at scrape time instead."""
+        self.fn = fn
+
+    def get(self):
+        if self.fn is None:
+            return self.value
+        try:
+            return float(self.fn() or 0)
+        except Exception:
+            return float("nan")
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return Value()
+
+    def inc(self, amount=1.0):
+        self.children[()].inc(amount)
+
+    def child_lines(self, values, child):
+        return [f"{self.name}{format_labels(self.label_names, values)} {child.get()}"]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value):
+        self.children[()].set(value)
+
+    def set_function(self, fn):
+        self.children[()].set_function(fn)
+
+class HistogramChild:
+    """Cumulative buckets for the exposition plus a short window of recent samples for quantiles."""
+
+    def __init__(self, buckets, window):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self):
+        values = sorted(self.recent)
+        if not values:
+            return None, None
+        return values[len(values) // 2], values[min(len(values) - 1, int(len(values) * 0.99))]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS, window=512):
+        self.buckets = tuple(buckets)
+        self.window = window
+        super().__init__(name, help_text, labels)
+
+    def new_child(self):
+        return HistogramChild(self.buckets, self.window)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def child_lines(self, values, child):
+        with child.lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, values, le)} {cumulative}")
+        inf = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{format_labels(self.label_names, values, inf)} {count}")
+        labels = format_labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    """Holds every metric; renders the Prometheus text format and a compact JSON summary."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            # Modules may ask for the same family more than once, hand back the first one
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def exposition(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.exposition())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """{metric: {"label=value,...": value}}, histograms as count / recent p50 / p99 in milliseconds."""
+        result = {}
+        for name, metric in list(self.metrics.items()):
+            entries = {}
+            for values, child in list(metric.children.items()):
+                key = ",".join(f"{n}={v}" for n, v in zip(metric.label_names, values)) or "value"
+                if isinstance(metric, Histogram):
+                    p50, p99 = child.quantiles()
+                    entries[key] = {"count": child.count,
+                                    "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+                                    "p99_ms": round(p99 * 1000, 2) if p99 is not None else None}
+                else:
+                    entries[key] = round(child.get(), 3)
+            result[name] = entries
+        return result
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("sentinel_stage_seconds", "Time spent per pipeline stage", ("camera", "stage"))
@@ -0,0 +1,142 @@
+import cv2
+import numpy as np
+from vision import merge_tiles
+
+FLICKER_MIN_HZ = 1.5 # Flames flicker roughly between 1.5 and 15 Hz, static lamps and clothing don't
+
+class MotionGate:
+    """Finds the parts of a frame that changed against a slowly adapting background model.
+
+    Works on a small grayscale copy of the frame so idle scenes cost one resize, one
+    difference and a threshold per frame instead of the full fire segmentation. The
+    same copy feeds a per-pixel flicker map: how often each pixel's brightness swings
+    back and forth between frames, which is high inside flames and zero on a lamp.
+    """
+
+    def __init__(self, scale=0.25, threshold=25, learning_rate=0.05, min_area=4, keyframe_interval=50, pad=16,
+                 flicker_hysteresis=6, flicker_rate=0.1, flicker_warmup=10):
+        self.scale = scale
+        self.threshold = threshold # Gray levels a pixel must move away from the background
+        self.learning_rate = learning_rate
+        self.min_area = min_area # Changed area (small-frame pixels) worth segmenting
+        self.keyframe_interval = keyframe_interval # Full scan every N frames so a steady fire is never missed
+        self.pad = pad
+        self.flicker_hysteresis = flicker_hysteresis # Gray levels of frame-to-frame swing that count, ignores sensor noise
+        self.flicker_rate = flicker_rate # Weight of the newest frame in the flicker map (~1/rate frames of memory)
+        self.flicker_warmup = flicker_warmup
+        self.kernel = np.ones((3, 3), np.uint8)
+        self.frame_size = None
+        self.size = None
+        self.frames_since_keyframe = 0
+        self.frames_seen = 0
+        self.frames_gated = 0 # Frames where segmentation was skipped entirely
+        self.changed_fraction = 0.0
+        self.frame_interval = 0.0 # Smoothed seconds between frames, turns flips/frame into Hz
+        self.last_timestamp = None
+        self.flicker_hz = None
+
+    def _allocate(self, frame):
+        height, width = frame.shape[:2]
+        self.frame_size = (width, height)
+        self.size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        shape = (self.size[1], self.size[0])
+        self.small = np.empty(shape + (3,), np.uint8)
+        self.gray = np.empty(shape, np.uint8)
+        self.prev_gray = np.empty(shape, np.uint8)
+        self.background = np.empty(shape, np.float32)
+        self.background_u8 = np.empty(shape, np.uint8)
+        self.diff = np.empty(shape, np.uint8)
+        self.delta = np.empty(shape, np.int16)
+        self.last_sign = np.zeros(shape, np.int8)
+        self.flips = np.zeros(shape, np.float32)
+        self.flip_map = np.zeros(shape, np.float32) # Smoothed brightness reversals per frame
+        self.frames_seen = 0
+
+    def changed_tiles(self, frame, sticky=(), timestamp=None):
+        """Returns full-resolution tiles (x0, y0, x1, y1) that changed, or None when the whole frame must be scanned.
+
+        Boxes in sticky (x, y, w, h) are always included, so a region already flagged as
+        fire keeps being confirmed even when it stops moving.
+        """
+        height, width = frame.shape[:2]
+        first = self.frame_size != (width, height)
+        if first:
+            self._allocate(frame)
+
+        cv2.resize(frame, self.size, dst=self.small, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        self._update_timing(timestamp)
+
+        if first:
+            self.background[...] = self.gray
+            self.prev_gray[...] = self.gray
+            self.frames_since_keyframe = 0
+            return None
+
+        self._update_flicker()
+        cv2.convertScaleAbs(self.background, dst=self.background_u8)
+        cv2.absdiff(self.gray, self.background_u8, dst=self.diff)
+        cv2.threshold(self.diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self.diff)
+        cv2.dilate(self.diff, self.kernel, dst=self.diff)
+        cv2.accumulateWeighted(self.gray, self.background, self.learning_rate)
+        self.changed_fraction = cv2.countNonZero(self.diff) / self.diff.size
+
+        self.frames_since_keyframe += 1
+        if self.frames_since_keyframe >= self.keyframe_interval:
+            self.frames_since_keyframe = 0
+            return None
+
+        fx = width / self.size[0]
+        fy = height / self.size[1]
+        tiles = []
+        contours, _ = cv2.findContours(self.diff, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for cnt in contours:
+            if cv2.contourArea(cnt) < self.min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(cnt)
+            tiles.append((max(0, int(x * fx) - self.pad), max(0, int(y * fy) - self.pad),
+                          min(width, int((x + w) * fx) + self.pad), min(height, int((y + h) * fy) + self.pad)))
+        for x, y, w, h in sticky:
+            tiles.append((max(0, x - self.pad), max(0, y - self.pad),
+                          min(width, x + w + self.pad), min(height, y + h + self.pad)))
+        if not tiles:
+            self.frames_gated += 1
+        return merge_tiles(tiles)
+
+    def _update_timing(self, timestamp):
+        if timestamp is None:
+            return
+        if self.last_timestamp is not None and timestamp > self.last_timestamp:
+            interval = timestamp - self.last_timestamp
+            self.frame_interval = interval if not self.frame_interval else self.frame_interval * 0.9 + interval * 0.1
+        self.last_timestamp = timestamp
+
+    def _update_flicker(self):
+        """Counts, per pixel, brightness swings that reverse the direction of the previous swing."""
+        cv2.subtract(self.gray, self.prev_gray, dst=self.delta, dtype=cv2.CV_16S)
+        sign = (self.delta > self.flicker_hysteresis).view(np.int8) - (self.delta < -self.flicker_hysteresis).view(np.int8)
+        reversed_ = (sign != 0) & (sign != self.last_sign) & (self.last_sign != 0)
+        np.copyto(self.last_sign, sign, where=sign != 0)
+        np.copyto(self.flips, reversed_)
+        cv2.accumulateWeighted(self.flips, self.flip_map, self.flicker_rate)
+        self.prev_gray[...] = self.gray
+        self.frames_seen += 1
+
+    def measure_flicker(self, boxes):
+        """Updates flicker_hz with the strongest flicker inside the fire boxes (full-resolution x, y, w, h).
+
+        Stays None until the map has enough history and the frame rate is known.
+        """
+        self.flicker_hz = None
+        if not boxes or self.frames_seen < self.flicker_warmup or not self.frame_interval:
+            return
+        height, width = self.flip_map.shape
+        fx = width / self.frame_size[0]
+        fy = height / self.frame_size[1]
+        best = 0.0
+        for x, y, w, h in boxes:
+            x0, y0 = int(x * fx), int(y * fy)
+            x1, y1 = min(width, max(x0 + 1, int((x + w) * fx))), min(height, max(y0 + 1, int((y + h) * fy)))
+            best = max(best, cv2.mean(self.flip_map[y0:y1, x0:x1])[0])
+        # Two reversals per oscillation
+        self.flicker_hz = best / self.frame_interval / 2.0
@@ -0,0 +1,131 @@
+"""Telegram Bot API and Twilio REST clients for alert delivery.
+
+Both talk plain HTTPS through one shared aiohttp session, so every send reuses pooled
+keep-alive connections instead of setting up TLS per alert, and calls are coroutines on
+the alert loop rather than blocking SDK calls on a thread pool. The API base URLs are
+settings, which lets a local stand-in server take the place of Telegram or Twilio.
+"""
+import base64
+import json
+import aiohttp
+from alerts import PermanentAlertError
+
+TELEGRAM_API = "https://api.telegram.org"
+TWILIO_API = "https://api.twilio.com"
+TELEGRAM_MAX_ALBUM = 10 # Photos per sendMediaGroup
+TELEGRAM_MAX_CAPTION = 1024
+
+class RetryableAlertError(Exception):
+    """A send that may succeed later; retry_after (seconds) is how long the API asked us to wait."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class HttpPool:
+    """One aiohttp session with a bounded keep-alive connection pool, shared by all alert clients.
+    Created on first use, on the loop that sends the alerts."""
+
+    def __init__(self, limit=20, limit_per_host=8, timeout=30.0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.client = None
+
+    def session(self):
+        if self.client is None or self.client.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, keepalive_timeout=60)
+            self.client = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+def classify(status, description, retry_after=None):
+    """The exception for a failed API call: rate limits and server errors are retried, the rest is permanent."""
+    if status == 429 or status >= 500 or status == 0:
+        return RetryableAlertError(f"HTTP {status}: {description}", retry_after)
+    return PermanentAlertError(f"HTTP {status}: {description}")
+
+class TelegramClient:
+    """The few Bot API methods alerts need."""
+
+    def __init__(self, pool, token, base_url=TELEGRAM_API):
+        self.pool = pool
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+
+    async def call(self, method, fields, files=()):
+        """POSTs a multipart request; files are (field, filename, bytes). Returns the result."""
+        form = aiohttp.FormData()
+        for name, value in fields.items():
+            if value is not None:
+                form.add_field(name, value if isinstance(value, str) else json.dumps(value))
+        for field, filename, data in files:
+            form.add_field(field, data, filename=filename, content_type="application/octet-stream")
+        try:
+            async with self.pool.session().post(f"{self.base_url}/bot{self.token}/{method}", data=form) as response:
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    body = {}
+                status = response.status
+        except aiohttp.ClientError as e:
+            raise RetryableAlertError(f"Telegram unreachable: {e}")
+        if status == 200 and body.get("ok"):
+            return body.get("result")
+        retry_after = (body.get("parameters") or {}).get("retry_after")
+        raise classify(status, body.get("description", "no description"), retry_after)
+
+    async def send_message(self, chat_id, text):
+        return await self.call("sendMessage", {"chat_id": str(chat_id), "text": text[:4096]})
+
+    async def send_photos(self, chat_id, photos, caption=None):
+        """One photo as sendPhoto, several as an album with the caption on the first."""
+        caption = caption[:TELEGRAM_MAX_CAPTION] if caption else None
+        if not photos:
+            return await self.send_message(chat_id, caption or "")
+        if len(photos) == 1:
+            return await self.call("sendPhoto", {"chat_id": str(chat_id), "caption": caption},
+                                   [("photo", "alert.jpg", photos[0])])
+        photos = photos[:TELEGRAM_MAX_ALBUM]
+        media = [{"type": "photo", "media": f"attach://photo{i}"} for i in range(len(photos))]
+        if caption:
+            media[0]["caption"] = caption
+        return await self.call("sendMediaGroup", {"chat_id": str(chat_id), "media": media},
+                               [(f"photo{i}", f"alert{i}.jpg", photo) for i, photo in enumerate(photos)])
+
+    async def send_video(self, chat_id, data, filename, caption=None):
+        return await self.call("sendVideo", {"chat_id": str(chat_id), "caption": caption[:TELEGRAM_MAX_CAPTION] if caption else None},
+                               [("video", filename, data)])
+
+class TwilioClient:
+    """Places voice calls through the Twilio REST API."""
+
+    def __init__(self, pool, account_sid, auth_token, from_number, base_url=TWILIO_API):
+        self.pool = pool
+        self.account_sid = account_sid
+        credentials = base64.b64encode(f"{account_sid}:{auth_token}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {credentials}"} # Built once, aiohttp deprecates BasicAuth and auth=
+        self.from_number = from_number
+        self.base_url = base_url.rstrip("/")
+
+    async def call(self, to, twiml):
+        """Starts a call that speaks the TwiML. Returns the call SID."""
+        url = f"{self.base_url}/2010-04-01/Accounts/{self.account_sid}/Calls.json"
+        try:
+            async with self.pool.session().post(url, data={"To": to, "From": self.from_number, "Twiml": twiml},
+                                                headers=self.headers) as response:
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    body = {}
+                status = response.status
+        except aiohttp.ClientError as e:
+            raise RetryableAlertError(f"Twilio unreachable: {e}")
+        if status in (200, 201):
+            return body.get("sid")
+        retry_after = 60 if status == 429 else None
+        raise classify(status, f"{body.get('code', '')} {body.get('message', 'no message')}".strip(), retry_after)
@@ -0,0 +1,168 @@
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import cv2
+import numpy as np
+from streaming import encode_jpeg
+
+class ClipRecorder(threading.Thread):
+    """Keeps the last seconds of a camera as JPEGs in memory and writes a clip around each incident.
+
+    Like the MJPEG broadcaster it wakes on every published frame, so the detection workers
+    never encode or touch the disk. Frames are downscaled and compressed at a capped rate;
+    the buffer is bounded by duration and by bytes. trigger() marks an incident, and once
+    the post-event seconds are buffered the clip is handed to a writer thread that decodes
+    the JPEGs into a video file. A fire that keeps burning yields one clip after another,
+    each continuing where the previous one ended.
+    """
+
+    def __init__(self, stream, directory="clips", pre_seconds=10.0, post_seconds=10.0, fps=10, quality=70,
+                 width=640, max_bytes=64 * 1024 * 1024, on_clip=None):
+        super().__init__(name=f"recorder-{stream.name}", daemon=True)
+        self.stream = stream
+        self.directory = directory
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.min_interval = 1.0 / fps if fps else 0
+        self.quality = quality
+        self.width = width # Downscale to this width before encoding, 0 keeps the native resolution
+        self.max_bytes = max_bytes
+        self.on_clip = on_clip # on_clip(stream, path, incident_key), called from the writer thread
+        self.lock = threading.Lock()
+        self.buffer = deque() # (timestamp, jpeg)
+        self.buffered_bytes = 0
+        self.pending = None # (start, triggered, end, incident_key) of the clip being collected
+        self.last_clip = None # (incident_key, end) of the last clip handed to the writer
+        self.clips = queue.Queue()
+        self.clips_written = 0
+        self.frames_dropped = 0 # Lost to the byte budget before their clip was written
+        self.running = True
+        self.writer = threading.Thread(target=self._writer_loop, name=f"clip-writer-{stream.name}", daemon=True)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.writer.start()
+        super().start()
+
+    def stop(self):
+        self.running = False
+        self.clips.put(None)
+
+    def trigger(self, incident_key=None):
+        """Starts a clip from pre_seconds ago to post_seconds from now. Triggers while a clip is being
+        collected don't move its end; the first one after it was written for the same incident
+        continues where it ended, so no footage is repeated.
+        Returns True only when the first clip of an incident starts."""
+        now = time.time()
+        with self.lock:
+            if self.pending is not None:
+                return False
+            start = now - self.pre_seconds
+            continued = self.last_clip is not None and incident_key is not None and self.last_clip[0] == incident_key
+            if continued:
+                start = max(start, self.last_clip[1])
+            self.pending = (start, now, now + self.post_seconds, incident_key)
+            return not continued
+
+    def run(self):
+        frame_seq = 0
+        last_encode = 0.0
+        while self.running:
+            frame, frame_seq = self.stream.wait_frame(frame_seq, timeout=1.0)
+            now = time.time()
+            if frame is not None and now - last_encode >= self.min_interval:
+                last_encode = now
+                if self.width and frame.shape[1] > self.width:
+                    height = int(frame.shape[0] * self.width / frame.shape[1])
+                    frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+                jpeg = encode_jpeg(frame, self.quality)
+                if jpeg is not None and self.stream.frame_intact(frame_seq):
+                    self._append(now, jpeg)
+            self._collect(now)
+
+    def _append(self, timestamp, jpeg):
+        with self.lock:
+            self.buffer.append((timestamp, jpeg))
+            self.buffered_bytes += len(jpeg)
+            # Keep the whole pending clip (it starts after its start time), otherwise only the pre-event window
+            horizon = self.pending[0] if self.pending is not None else timestamp - self.pre_seconds
+            while self.buffer and (self.buffer[0][0] <= horizon or
+                                   (self.buffered_bytes > self.max_bytes and self.pending is None)):
+                if self.buffer[0][0] > horizon:
+                    self.frames_dropped += 1
+                self.buffered_bytes -= len(self.buffer.popleft()[1])
+            # Over budget while collecting: the footage before the trigger is what the clip is for,
+            # give up the newest frames instead
+            over_budget = self.buffered_bytes > self.max_bytes
+            if over_budget and self.pending is not None and self.buffer[-1][0] > self.pending[1]:
+                self.frames_dropped += 1
+                self.buffered_bytes -= len(self.buffer.pop()[1])
+
+    def _collect(self, now):
+        with self.lock:
+            if self.pending is None or now < self.pending[2]:
+                return
+            start, _, end, incident_key = self.pending
+            self.pending = None
+            self.last_clip = (incident_key, end)
+            frames = [(ts, jpeg) for ts, jpeg in self.buffer if start < ts <= end]
+        if frames:
+            self.clips.put((frames, incident_key))
+
+    def _writer_loop(self):
+        while True:
+            clip = self.clips.get()
+            if clip is None:
+                break
+            frames, incident_key = clip
+            try:
+                path = self.write_clip(frames)
+            except Exception as e:
+                print(f"Failed to write clip for {self.stream.name}: {e}")
+                continue
+            self.clips_written += 1
+            if self.on_clip and path:
+                try:
+                    self.on_clip(self.stream, path, incident_key)
+                except Exception as e:
+                    print(f"Clip callback failed: {e}")
+
+    def write_clip(self, frames):
+        """Decodes buffered JPEGs into an MP4 and returns its path."""
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        if first is None:
+            return None
+        height, width = first.shape[:2]
+        duration = frames[-1][0] - frames[0][0]
+        # Play back at the rate the frames were actually buffered
+        fps = (len(frames) - 1) / duration if len(frames) > 1 and duration > 0 else 1.0
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", self.stream.name)
+        stamp = datetime.fromtimestamp(frames[0][0]).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.directory, f"{name}_{stamp}.mp4")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        if not writer.isOpened():
+            raise RuntimeError(f"Could not open video writer for {path}")
+        try:
+            writer.write(first)
+            for _, jpeg in frames[1:]:
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if frame is not None and frame.shape[:2] == (height, width):
+                    writer.write(frame)
+        finally:
+            writer.release()
+        return path
+
+    def stats(self):
+        with self.lock:
+            return {
+                "camera": self.stream.name,
+                "buffered_frames": len(self.buffer),
+                "buffered_bytes": self.buffered_bytes,
+                "recording": self.pending is not None,
+                "clips_written": self.clips_written,
+                "frames_dropped": self.frames_dropped,
+            }
@@ -0,0 +1,224 @@
+"""Who gets told about a fire, and when.
+
+The routing file (SENTINEL_ALERT_ROUTES) is JSON:
+
+    {
+      "recipients": {
+        "ops": {"telegram": "-1001234567890", "per_minute": 20, "burst": 5},
+        "alice": {"voice": "+15550001111"},
+        "bob": {"voice": "+15550002222"},
+        "manager": {"telegram": "123456789"}
+      },
+      "rotations": {"on-call": {"members": ["alice", "bob"], "start": "2026-01-05 09:00", "shift_hours": 24}},
+      "sites": {"warehouse": ["CAM-1", "CAM-2"]},
+      "routes": [
+        {"cameras": ["warehouse"], "notify": ["ops", "on-call"], "escalate": [{"after": 300, "notify": ["manager"]}]},
+        {"cameras": "*", "notify": ["ops"]}
+      ],
+      "channels": {"telegram": {"per_minute": 1800, "burst": 30}, "voice": {"per_minute": 10, "burst": 3}}
+    }
+
+Every route whose cameras (names or sites, "*" for all) include the camera applies.
+"notify" is told when an incident opens, each "escalate" tier once the incident has
+been open for "after" seconds. A rotation stands for whichever member's shift it is.
+Without a file, the single Telegram chat and phone number from the environment are used.
+"""
+import json
+import time
+from datetime import datetime
+
+CHANNELS = ("telegram", "voice")
+# Recipient limits when the file doesn't set them: Telegram allows about 20 messages a minute per group
+DEFAULT_LIMITS = {"telegram": (20, 5), "voice": (2, 2)}
+
+class Recipient:
+    def __init__(self, name, channel, address, per_minute, burst):
+        self.name = name
+        self.channel = channel
+        self.address = address
+        self.per_minute = per_minute
+        self.burst = burst
+
+def parse_start(value):
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid start time {value}, use YYYY-mm-dd HH:MM")
+
+def names(value, section):
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise ValueError(f"{section}: expected a list of names")
+    return value
+
+class AlertRouter:
+    """Resolves a camera's incident to the recipients that are due an alert."""
+
+    def __init__(self, data):
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        unknown = set(data) - {"recipients", "rotations", "sites", "routes", "channels"}
+        if unknown:
+            raise ValueError(f"Unknown section(s): {', '.join(sorted(unknown))}")
+        self.recipients = {}
+        for name, spec in (data.get("recipients") or {}).items():
+            channels = [channel for channel in CHANNELS if channel in spec] if isinstance(spec, dict) else []
+            if len(channels) != 1:
+                raise ValueError(f"recipients.{name}: needs exactly one of {', '.join(CHANNELS)}")
+            channel = channels[0]
+            per_minute, burst = DEFAULT_LIMITS[channel]
+            try:
+                per_minute = float(spec.get("per_minute", per_minute))
+                burst = int(spec.get("burst", burst))
+            except (TypeError, ValueError):
+                raise ValueError(f"recipients.{name}: per_minute and burst must be numbers")
+            if per_minute <= 0 or burst < 1:
+                raise ValueError(f"recipients.{name}: per_minute must be positive and burst at least 1")
+            self.recipients[name] = Recipient(name, channel, str(spec[channel]), per_minute, burst)
+
+        self.rotations = {}
+        for name, spec in (data.get("rotations") or {}).items():
+            if name in self.recipients:
+                raise ValueError(f"rotations.{name}: already a recipient")
+            members = names(spec.get("members") if isinstance(spec, dict) else None, f"rotations.{name}.members")
+            self.check(members, f"rotations.{name}", rotations=False)
+            if not members:
+                raise ValueError(f"rotations.{name}: needs members")
+            shift = float(spec.get("shift_hours", 168)) * 3600
+            if shift <= 0:
+                raise ValueError(f"rotations.{name}: shift_hours must be positive")
+            self.rotations[name] = (members, parse_start(spec.get("start", "2026-01-05 00:00")), shift)
+
+        self.sites = {}
+        for name, cameras in (data.get("sites") or {}).items():
+            self.sites[name] = names(cameras, f"sites.{name}")
+
+        self.routes = [] # (camera names or None for all, [(after seconds, [recipient or rotation])])
+        for index, route in enumerate(data.get("routes") or []):
+            section = f"routes[{index}]"
+            if not isinstance(route, dict):
+                raise ValueError(f"{section}: expected an object")
+            cameras = route.get("cameras", "*")
+            if cameras != "*":
+                cameras = {camera for name in names(cameras, f"{section}.cameras") for camera in self.sites.get(name, [name])}
+            else:
+                cameras = None
+            tiers = [(0.0, self.check(names(route.get("notify", []), f"{section}.notify"), section))]
+            for tier in route.get("escalate") or []:
+                try:
+                    after = float(tier["after"])
+                except (KeyError, TypeError, ValueError):
+                    raise ValueError(f"{section}.escalate: every tier needs an 'after' in seconds")
+                tiers.append((after, self.check(names(tier.get("notify", []), f"{section}.escalate"), section)))
+            self.routes.append((cameras, tiers))
+
+        self.channel_limits = {}
+        for channel, spec in (data.get("channels") or {}).items():
+            if channel not in CHANNELS or not isinstance(spec, dict):
+                raise ValueError(f"channels.{channel}: unknown channel, use one of: {', '.join(CHANNELS)}")
+            self.channel_limits[channel] = (float(spec.get("per_minute", 60)), int(spec.get("burst", 1)))
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "r") as f:
+                return cls(json.load(f))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: {e}")
+
+    @classmethod
+    def single(cls, telegram_chat=None, phone_number=None):
+        """The routing of a single site: one chat and one phone number, told about every camera."""
+        recipients = {}
+        if telegram_chat:
+            recipients["telegram"] = {"telegram": telegram_chat}
+        if phone_number:
+            recipients["phone"] = {"voice": phone_number}
+        return cls({"recipients": recipients, "routes": [{"cameras": "*", "notify": list(recipients)}]})
+
+    def check(self, targets, section, rotations=True):
+        for name in targets:
+            if name not in self.recipients and not (rotations and name in self.rotations):
+                raise ValueError(f"{section}: unknown recipient {name}")
+        return targets
+
+    def on_call(self, rotation, now=None):
+        members, start, shift = self.rotations[rotation]
+        now = time.time() if now is None else now
+        return members[int((now - start) // shift) % len(members)]
+
+    def resolve(self, name, now=None):
+        return self.recipients[self.on_call(name, now) if name in self.rotations else name]
+
+    def site(self, camera):
+        return next((name for name, cameras in self.sites.items() if camera in cameras), None)
+
+    def targets(self, camera, elapsed, now=None):
+        """Recipients an incident on the camera reaches after elapsed seconds, in route order."""
+        result = {}
+        for cameras, tiers in self.routes:
+            if cameras is not None and camera not in cameras:
+                continue
+            for after, targets in tiers:
+                if elapsed >= after:
+                    for name in targets:
+                        recipient = self.resolve(name, now)
+                        result.setdefault(recipient.name, recipient)
+        return list(result.values())
+
+    def due(self, camera, incident, cooldowns, now=None):
+        """Recipients to alert about the incident now: ones it just reached, and ones whose channel
+        cooldown has passed since their last alert. Records the alert on the incident. Returns
+        [(recipient, follow_up)] and the channels held back by a cooldown."""
+        now = time.time() if now is None else now
+        due, held = [], set()
+        for recipient in self.targets(camera, now - incident.started, now):
+            last = incident.alerts.get(recipient.name)
+            if last is None or now - last >= cooldowns[recipient.channel]:
+                incident.alerts[recipient.name] = now
+                due.append((recipient, last is not None))
+            else:
+                held.add(recipient.channel)
+        return due, held
+
+    def chats(self):
+        """Telegram chats that may send bot commands."""
+        return {recipient.address for recipient in self.recipients.values() if recipient.channel == "telegram"}
+
+    def describe(self):
+        return {
+            "recipients": {name: recipient.channel for name, recipient in self.recipients.items()},
+            "on_call": {name: self.on_call(name) for name in self.rotations},
+            "routes": len(self.routes),
+        }
+
+def split_photos(payload, attachment):
+    """JPEGs packed back to back in the attachment, sizes in payload["sizes"]. No attachment (photos
+    lost to a restart) gives no photos."""
+    if attachment is None:
+        return []
+    photos, offset = [], 0
+    for size in payload.get("sizes", [len(attachment)] if attachment else []):
+        photos.append(attachment[offset:offset + size])
+        offset += size
+    return photos
+
+def merge_photo_alerts(items, max_photos=10):
+    """Combines Telegram photo alerts to one chat: one caption line per alert, all photos as one album
+    (only each alert's key photo when they don't fit)."""
+    alerts = [(payload, split_photos(payload, attachment)) for payload, attachment in items]
+    photos = [photo for _, alert_photos in alerts for photo in alert_photos]
+    if len(photos) > max_photos:
+        photos = [alert_photos[min(payload.get("primary", 0), len(alert_photos) - 1)]
+                  for payload, alert_photos in alerts if alert_photos][:max_photos]
+    payload = {"chat_id": items[0][0].get("chat_id"), "caption": "\n".join(payload["caption"] for payload, _ in alerts),
+               "sizes": [len(photo) for photo in photos]}
+    return payload, b"".join(photos)
+
+def merge_voice_alerts(items):
+    """One call naming every camera instead of one call per camera."""
+    cameras = []
+    for payload, _ in items:
+        cameras.extend(camera for camera in payload.get("cameras", []) if camera not in cameras)
+    return {"to": items[0][0]["to"], "cameras": cameras}, None
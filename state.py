@@ -0,0 +1,66 @@
+"""System state shared by the camera workers, the web server and the Telegram handlers.
+
+Readers take `core.snapshot`: a single attribute read, no lock, and always one whole
+version of the state that nobody changes underneath them. All writes go through the one
+write path, update() or modify(), which runs under the writer lock, builds the next
+immutable snapshot and swaps it in with one reference assignment. A read-modify-write
+such as toggling the arm state therefore can't lose a concurrent change, and readers
+never wait on a writer. Every change bumps the version and is handed to the subscribers,
+in version order.
+"""
+import threading
+import time
+from collections import namedtuple
+
+FIELDS = ("armed", "telegram_cooldown", "call_cooldown", "alarm_interval")
+State = namedtuple("State", FIELDS + ("version", "updated"))
+
+class StateCore:
+    def __init__(self, **initial):
+        missing = set(FIELDS) - set(initial)
+        if missing:
+            raise ValueError(f"Missing initial state: {', '.join(sorted(missing))}")
+        self.snapshot = State(version=0, updated=time.time(), **initial)
+        self.write_lock = threading.Lock()
+        self.subscribers = [] # callback(old, new), called under the writer lock: must not write
+        self.writes = 0
+        self.write_time = 0.0 # Seconds spent in writes, subscribers included
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def update(self, **changes):
+        """Sets fields. Returns the resulting snapshot."""
+        return self.modify(lambda state: changes)
+
+    def modify(self, change):
+        """Applies change(snapshot) -> {field: value} or None atomically against the latest state.
+        Returns the resulting snapshot; unchanged values don't make a new version."""
+        started = time.perf_counter()
+        with self.write_lock:
+            old = self.snapshot
+            changes = change(old) or {}
+            unknown = set(changes) - set(FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown state field(s): {', '.join(sorted(unknown))}")
+            changes = {key: value for key, value in changes.items() if getattr(old, key) != value}
+            if not changes:
+                return old
+            new = self.snapshot = old._replace(version=old.version + 1, updated=time.time(), **changes)
+            for callback in self.subscribers:
+                try:
+                    callback(old, new)
+                except Exception as e:
+                    print(f"State subscriber error: {e}")
+            self.writes += 1
+            self.write_time += time.perf_counter() - started
+            return new
+
+    def stats(self):
+        state = self.snapshot
+        return {
+            "version": state.version,
+            "updated": round(state.updated, 3),
+            "writes": self.writes,
+            "avg_write_us": round(self.write_time / self.writes * 1e6, 1) if self.writes else None,
+        }
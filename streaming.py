@@ -0,0 +1,277 @@
+import asyncio
+import threading
+import time
+import cv2
+from events import wake_future
+from metrics import REGISTRY, STAGE_SECONDS
+
+STREAM_VIEWERS = REGISTRY.gauge("sentinel_stream_viewers", "Connected /video_feed viewers", ("camera", "variant"))
+STREAM_BYTES = REGISTRY.counter("sentinel_stream_bytes_total", "MJPEG bytes handed to viewers", ("camera", "variant"))
+
+def encode_jpeg(frame, quality=90):
+    """Encodes a frame to JPEG bytes in memory, or returns None."""
+    ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buffer.tobytes() if ret else None
+
+class StreamClient:
+    """Delivery counters for one /video_feed viewer."""
+
+    def __init__(self, address=None):
+        self.address = address
+        self.connected_at = time.time()
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_skipped = 0 # Frames encoded while this client was still busy sending
+        self.variant = None
+        self.variant_changes = 0
+
+    def stats(self):
+        elapsed = max(time.time() - self.connected_at, 1e-6)
+        return {
+            "address": self.address,
+            "connected_s": round(elapsed, 1),
+            "fps": round(self.frames_sent / elapsed, 1),
+            "bytes_per_s": int(self.bytes_sent / elapsed),
+            "frames_skipped": self.frames_skipped,
+            "variant": self.variant,
+            "variant_changes": self.variant_changes,
+        }
+
+class MjpegBroadcaster(threading.Thread):
+    """Encodes each new frame of a camera once and fans the same JPEG bytes out to every viewer.
+
+    The thread sleeps until the camera publishes a frame, and only encodes while someone
+    is watching. Viewers block on a condition instead of polling and always jump to the
+    newest encoded frame, so a slow connection skips frames rather than stalling the others.
+    """
+
+    def __init__(self, stream, quality=95, width=0, max_fps=25, variant="full"):
+        super().__init__(name=f"mjpeg-{stream.name}-{variant}", daemon=True)
+        self.stream = stream
+        self.variant = variant
+        self.quality = quality
+        self.width = width # Downscale to this width before encoding, 0 keeps the native resolution
+        self.min_interval = 1.0 / max_fps if max_fps else 0
+        self.cond = threading.Condition()
+        self.chunk = None # Ready-to-send multipart chunk of the newest frame
+        self.jpeg = None
+        self.encoded_at = 0.0
+        self.seq = 0
+        self.clients = set()
+        self.async_waiters = {} # Event loop -> future resolved on the next chunk, shared by all its viewers
+        self.frames_encoded = 0
+        self.encode_timer = STAGE_SECONDS.labels(stream.name, f"jpeg_{variant}")
+        self.bytes_counter = STREAM_BYTES.labels(stream.name, variant)
+        STREAM_VIEWERS.labels(stream.name, variant).set_function(lambda: len(self.clients))
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+            self._wake_async()
+
+    def _wake_async(self):
+        """Wakes viewers waiting on event loops, one cross-thread call per loop. Call with cond held."""
+        for loop, future in self.async_waiters.items():
+            loop.call_soon_threadsafe(wake_future, future)
+        self.async_waiters.clear()
+
+    def encode(self, frame):
+        if self.width and frame.shape[1] > self.width:
+            height = int(frame.shape[0] * self.width / frame.shape[1])
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        return encode_jpeg(frame, self.quality)
+
+    def run(self):
+        frame_seq = 0
+        last_encode = 0.0
+        while self.running:
+            frame, frame_seq = self.stream.wait_frame(frame_seq, timeout=1.0)
+            if frame is None or not self.clients:
+                continue
+            # Cap the encode rate, the newest frame is picked up after the pause
+            delay = self.min_interval - (time.perf_counter() - last_encode)
+            if delay > 0:
+                time.sleep(delay)
+                frame, frame_seq = self.stream.latest()
+            last_encode = time.perf_counter()
+            jpeg = self.encode(frame)
+            self.encode_timer.observe(time.perf_counter() - last_encode)
+            if jpeg is None or not self.stream.frame_intact(frame_seq):
+                continue # Shared-memory frame rewritten during the encode, take the next one
+            chunk = (b'--frame\r\n'
+                     b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+            with self.cond:
+                self.jpeg = jpeg
+                self.encoded_at = time.time()
+                self.chunk = chunk
+                self.seq += 1
+                self.frames_encoded += 1
+                self.cond.notify_all()
+                self._wake_async()
+
+    def latest_jpeg(self):
+        """Returns (JPEG bytes, time encoded) of the newest frame, bytes are None before the first encode."""
+        with self.cond:
+            return self.jpeg, self.encoded_at
+
+    def add_client(self, client):
+        client.variant = self.variant
+        with self.cond:
+            self.clients.add(client)
+
+    def remove_client(self, client):
+        with self.cond:
+            self.clients.discard(client)
+
+    def next_chunk(self, client, seq, timeout=5.0):
+        """Waits for a chunk newer than seq. Returns (seq, chunk), chunk is None on timeout or shutdown."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq != seq or not self.running, timeout=timeout) or not self.running:
+                return seq, None
+            if seq:
+                client.frames_skipped += self.seq - seq - 1
+            return self.seq, self.chunk
+
+    async def next_chunk_async(self, client, seq, timeout=5.0):
+        """next_chunk() for viewers served from an event loop: waits without holding a thread."""
+        loop = asyncio.get_running_loop()
+        future = None
+        with self.cond:
+            if self.seq == seq and self.running:
+                future = self.async_waiters.get(loop)
+                if future is None:
+                    future = self.async_waiters[loop] = loop.create_future()
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                pass
+        with self.cond:
+            if self.seq == seq or not self.running:
+                return seq, None
+            if seq:
+                client.frames_skipped += self.seq - seq - 1
+            return self.seq, self.chunk
+
+    def subscribe(self, address=None):
+        """Yields multipart chunks for one viewer until the client disconnects."""
+        client = StreamClient(address)
+        self.add_client(client)
+        try:
+            seq = 0
+            while self.running:
+                seq, chunk = self.next_chunk(client, seq)
+                if chunk is None:
+                    continue
+                client.frames_sent += 1
+                client.bytes_sent += len(chunk)
+                self.bytes_counter.inc(len(chunk))
+                yield chunk
+        finally:
+            self.remove_client(client)
+
+    def stats(self):
+        with self.cond:
+            clients = [client.stats() for client in self.clients]
+        return {
+            "camera": self.stream.name,
+            "variant": self.variant,
+            "quality": self.quality,
+            "width": self.width,
+            "frames_encoded": self.frames_encoded,
+            "viewers": clients,
+        }
+
+class VariantLadder:
+    """Steps a viewer between variants (ordered smallest to largest) depending on how long
+    the viewer's socket takes to accept each frame.
+
+    A send slower than stall_factor frame intervals drops one variant; recover_frames
+    fast sends in a row climb back up one.
+    """
+
+    def __init__(self, count, stall_factor=2.0, recover_frames=50):
+        self.count = count
+        self.level = count - 1
+        self.stall_factor = stall_factor
+        self.recover_frames = recover_frames
+        self.fast_sends = 0
+
+    def update(self, send_time, budget):
+        """Records one send. Returns True when the level changed."""
+        target = self.level
+        if send_time > budget * self.stall_factor and self.level > 0:
+            target = self.level - 1
+        elif send_time < budget / 2:
+            self.fast_sends += 1
+            if self.fast_sends >= self.recover_frames and self.level < self.count - 1:
+                target = self.level + 1
+        else:
+            self.fast_sends = 0
+        if target == self.level:
+            return False
+        self.level = target
+        self.fast_sends = 0
+        return True
+
+def adaptive_subscribe(get_broadcaster, variants, address=None, stall_factor=2.0, recover_frames=50):
+    """Yields multipart chunks that step between shared variants (ordered smallest to largest).
+
+    The WSGI server only asks for the next chunk once the previous one was written, so the
+    time spent suspended in yield is the send time.
+    """
+    client = StreamClient(address)
+    ladder = VariantLadder(len(variants), stall_factor, recover_frames)
+    broadcaster = get_broadcaster(variants[ladder.level])
+    broadcaster.add_client(client)
+    try:
+        seq = 0
+        while broadcaster.running:
+            seq, chunk = broadcaster.next_chunk(client, seq)
+            if chunk is None:
+                continue
+            client.frames_sent += 1
+            client.bytes_sent += len(chunk)
+            broadcaster.bytes_counter.inc(len(chunk))
+            started = time.perf_counter()
+            yield chunk
+            if ladder.update(time.perf_counter() - started, broadcaster.min_interval or 0.04):
+                broadcaster.remove_client(client)
+                broadcaster = get_broadcaster(variants[ladder.level])
+                broadcaster.add_client(client)
+                client.variant_changes += 1
+                seq = 0
+    finally:
+        broadcaster.remove_client(client)
+
+async def stream_async(send, get_broadcaster, variants, address=None, adaptive=True):
+    """Sends multipart chunks with await send(chunk) until the viewer disconnects (send raises).
+
+    The event loop counterpart of subscribe()/adaptive_subscribe(): a viewer costs a
+    coroutine instead of a thread. With adaptive=True the await on send is the send time.
+    """
+    client = StreamClient(address)
+    ladder = VariantLadder(len(variants))
+    broadcaster = get_broadcaster(variants[ladder.level])
+    broadcaster.add_client(client)
+    try:
+        seq = 0
+        while broadcaster.running:
+            seq, chunk = await broadcaster.next_chunk_async(client, seq)
+            if chunk is None:
+                continue
+            client.frames_sent += 1
+            client.bytes_sent += len(chunk)
+            broadcaster.bytes_counter.inc(len(chunk))
+            started = time.perf_counter()
+            await send(chunk)
+            if adaptive and ladder.update(time.perf_counter() - started, broadcaster.min_interval or 0.04):
+                broadcaster.remove_client(client)
+                broadcaster = get_broadcaster(variants[ladder.level])
+                broadcaster.add_client(client)
+                client.variant_changes += 1
+                seq = 0
+    finally:
+        broadcaster.remove_client(client)
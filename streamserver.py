@@ -0,0 +1,58 @@
+"""Serves /video_feed from a separate process that reads camera frames from the shared-memory frame bus.
+
+Started by detector.py when SENTINEL_STREAM_PROCESS=1. Resizing, JPEG encoding and the
+fan-out to viewers then run on their own core instead of competing with detection for
+the detector process's interpreter. Viewers are authorized with the dashboard's session
+cookie, which the browser also sends to this port.
+"""
+import os
+import threading
+import time
+from flask import Flask
+from framebus import BusStream
+from streaming import MjpegBroadcaster
+from webserver import WebServer, session_checker
+
+def not_found(environ, start_response):
+    start_response("404 Not Found", [("Content-Type", "text/plain")])
+    return [b"Only /video_feed is served here"]
+
+def serve_streams(cameras, variants, secret_key, host="0.0.0.0", port=5001, max_viewers=50, parent_pid=None):
+    """Process entry point. cameras: [(camera name, frame bus name, FrameBusSync)], variants: {variant: (width, quality)}."""
+    streams = [BusStream(name, bus_name, sync) for name, bus_name, sync in cameras]
+    broadcasters = {}
+    lock = threading.Lock()
+
+    def get_stream(name=None):
+        if name is None:
+            return streams[0] if streams else None
+        return next((stream for stream in streams if stream.name == name), None)
+
+    def get_broadcaster(stream, variant):
+        key = (stream.name, variant)
+        with lock:
+            broadcaster = broadcasters.get(key)
+            if broadcaster is None:
+                width, quality = variants[variant]
+                broadcaster = broadcasters[key] = MjpegBroadcaster(stream, quality=quality, width=width, variant=variant)
+                broadcaster.start()
+            return broadcaster
+
+    auth_app = Flask("sentinel-streams")
+    auth_app.secret_key = secret_key
+    server = WebServer(not_found, host, port, threads=1, max_viewers=max_viewers, is_authorized=session_checker(auth_app),
+                       get_stream=get_stream, get_broadcaster=get_broadcaster, variants=variants)
+    server.start()
+    try:
+        # Exit with the detector, even when it dies without stopping us
+        while server.is_alive() and (parent_pid is None or os.getppid() == parent_pid):
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        for broadcaster in broadcasters.values():
+            broadcaster.stop()
+        torn = sum(stream.torn_frames for stream in streams)
+        if torn:
+            print(f"--- Stream process: {torn} frame(s) overwritten during encoding were skipped ---")
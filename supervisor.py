@@ -0,0 +1,249 @@
+"""Keeps the cameras connected and watches the picture they deliver.
+
+A network or device camera that drops, stops delivering frames or keeps sending the
+same frame is reopened with exponential backoff, while detection on the other cameras,
+alerts, the web server and Telegram carry on. The picture is checked on one sampled
+frame a second: a checksum of a sparse pixel grid catches a frozen feed, the grid's
+mean brightness a black one. A camera that stays unhealthy raises an outage, which
+clears once it has been healthy again for as long.
+"""
+import random
+import threading
+import time
+import zlib
+from collections import deque
+import numpy as np
+
+SAMPLE_INTERVAL = 1.0 # Seconds between picture samples
+SAMPLE_STRIDE = 16 # Every 16th pixel of every 16th row: ~8k pixels of a 1080p frame
+BLACK_LEVEL = 12 # Mean brightness (0-255) below which the picture counts as black
+RECONNECT_WINDOW = 3600 # Reconnects within this many seconds lower the health score
+RESTART_STATUSES = ("offline", "stale", "frozen") # Reopening can fix these, not a covered lens
+
+class CameraHealth:
+    """Connection and picture state of one camera. The detection worker samples frames,
+    the supervisor decides the status."""
+
+    def __init__(self, frozen_after=60.0, black_after=30.0):
+        self.frozen_after = frozen_after # Seconds of identical samples before the feed counts as frozen, 0 disables
+        self.black_after = black_after # Seconds of black samples before the picture counts as black, 0 disables
+        self.status = "starting" # ok, offline, stale, frozen or black
+        self.reason = ""
+        self.since = time.time() # Wall clock time of the last status change
+        self.changed = time.perf_counter()
+        self.bad_since = None # Start of the current unhealthy stretch
+        self.problem = None # Last unhealthy status of the stretch
+        self.opened_at = None # When the capture was last opened
+        self.next_sample = 0.0
+        self.checksum = None
+        self.unchanged_since = None # When the sampled picture last changed
+        self.dark_since = None
+        self.brightness = None
+        self.attempts = 0 # Reopen attempts since the camera was last stable
+        self.next_attempt = 0.0
+        self.reconnects = 0
+        self.reconnect_times = deque(maxlen=32)
+        self.outage = None # Open Outage
+
+    def observe(self, frame, now):
+        """Samples a frame's checksum and brightness, at most once per SAMPLE_INTERVAL."""
+        if now < self.next_sample:
+            return
+        self.next_sample = now + SAMPLE_INTERVAL
+        sample = np.ascontiguousarray(frame[::SAMPLE_STRIDE, ::SAMPLE_STRIDE])
+        checksum = zlib.crc32(sample)
+        if checksum != self.checksum:
+            self.checksum = checksum
+            self.unchanged_since = now
+        self.brightness = float(sample.mean())
+        if self.brightness >= BLACK_LEVEL:
+            self.dark_since = None
+        elif self.dark_since is None:
+            self.dark_since = now
+
+    def opened(self, now):
+        self.opened_at = now
+        self.checksum = self.unchanged_since = self.dark_since = None
+        self.next_sample = 0.0
+
+    def picture_problem(self, now):
+        """(status, reason) when the picture is black or frozen, else None. A black picture doesn't
+        change either, it counts as black."""
+        if self.black_after and self.dark_since is not None and now - self.dark_since >= self.black_after:
+            return "black", f"picture black for {now - self.dark_since:.0f}s"
+        if self.frozen_after and self.unchanged_since is not None and now - self.unchanged_since >= self.frozen_after:
+            return "frozen", f"picture unchanged for {now - self.unchanged_since:.0f}s"
+        return None
+
+    def score(self):
+        """1 healthy, down to 0.5 for recent reconnects, 0.25 frozen or black, 0 offline or stale."""
+        if self.status in ("offline", "stale"):
+            return 0.0
+        if self.status in ("frozen", "black"):
+            return 0.25
+        now = time.time()
+        recent = sum(1 for at in self.reconnect_times if now - at < RECONNECT_WINDOW)
+        return max(0.5, 1.0 - 0.1 * recent)
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "reason": self.reason,
+            "since": round(self.since, 3),
+            "score": round(self.score(), 2),
+            "brightness": round(self.brightness, 1) if self.brightness is not None else None,
+            "reconnects": self.reconnects,
+            "outage": self.outage.to_dict() if self.outage else None,
+        }
+
+class Outage:
+    """A camera that stayed offline, frozen or black, until its picture has been fine for a while."""
+
+    def __init__(self, camera, status, reason):
+        self.camera = camera
+        self.started = time.time()
+        self.ended = None
+        self.id = f"{camera}-offline-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}"
+        self.status = status
+        self.reason = reason
+        self.reconnects = 0 # Reopen attempts that succeeded during the outage
+
+    def close(self):
+        self.ended = time.time()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "camera": self.camera,
+            "status": self.status,
+            "reason": self.reason,
+            "started": round(self.started, 3),
+            "ended": round(self.ended, 3) if self.ended else None,
+            "duration": round((self.ended or time.time()) - self.started, 1),
+            "reconnects": self.reconnects,
+        }
+
+class CaptureSupervisor(threading.Thread):
+    """Checks every camera once per interval and reopens the ones that dropped.
+
+    Reopening runs on a thread of its own per camera, so a camera that takes the whole
+    open timeout to fail never delays the checks of the others.
+    """
+
+    def __init__(self, engine, interval=1.0, stale_after=10.0, base_delay=1.0, max_delay=60.0, alert_after=15.0,
+                 on_outage=None):
+        super().__init__(name="capture-supervisor", daemon=True)
+        self.engine = engine
+        self.interval = interval
+        self.stale_after = stale_after # Seconds without a frame before an open camera counts as stale
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.alert_after = alert_after # Seconds unhealthy before an outage opens, and healthy before it closes
+        self.on_outage = on_outage # on_outage(stream, outage) when an outage opens or closes
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for stream in self.engine.streams:
+                try:
+                    self.check(stream, time.perf_counter())
+                except Exception as e:
+                    print(f"Supervisor error on {stream.name}: {e}")
+
+    def check(self, stream, now):
+        health = stream.health
+        if stream.reopening:
+            return
+        capture = stream.capture
+        if not stream.reconnect:
+            # Files are replays: they end instead of dropping, and a still scene in one is no fault
+            if stream.active and capture is not None and not capture.ended:
+                self.set_status(stream, "ok", "", now)
+            return
+        if not stream.active or capture is None or capture.ended:
+            status, reason = "offline", "connection lost" if health.opened_at is not None else "could not connect"
+        else:
+            last_frame = max(stream.ring.last_captured_at or 0.0, health.opened_at or 0.0)
+            if now - last_frame > self.stale_after:
+                status, reason = "stale", f"no frames for {now - last_frame:.0f}s"
+            else:
+                status, reason = health.picture_problem(now) or ("ok", "")
+        self.set_status(stream, status, reason, now)
+        if status in RESTART_STATUSES and now >= health.next_attempt:
+            self.reopen(stream)
+        elif status == "ok" and self.settled(health, now):
+            # Stable again, the next drop is retried right away
+            health.attempts = 0
+            health.next_attempt = 0.0
+        self.track_outage(stream, status, reason, now)
+
+    def set_status(self, stream, status, reason, now):
+        health = stream.health
+        if status == health.status:
+            health.reason = reason
+            return
+        if status == "ok":
+            print(f"--- {stream.name}: Camera OK ---")
+        else:
+            print(f"Warning: {stream.name} camera {status} ({reason})")
+            health.problem = status
+            if health.bad_since is None:
+                health.bad_since = now
+        health.status, health.reason = status, reason
+        health.since = time.time()
+        health.changed = now
+
+    def settled(self, health, now):
+        """Whether an ok camera has been ok long enough to count as recovered. A reopened frozen
+        feed looks fine until the frozen check has had time to run again."""
+        settle = self.alert_after + (health.frozen_after if health.problem == "frozen" else 0)
+        return now - health.changed >= settle
+
+    def track_outage(self, stream, status, reason, now):
+        health = stream.health
+        if status == "ok":
+            if health.bad_since is not None and self.settled(health, now):
+                health.bad_since = None
+                if health.outage is not None:
+                    outage, health.outage = health.outage, None
+                    outage.close()
+                    if self.on_outage:
+                        self.on_outage(stream, outage)
+        elif health.outage is None and health.bad_since is not None and now - health.bad_since >= self.alert_after:
+            health.outage = Outage(stream.name, status, reason)
+            if self.on_outage:
+                self.on_outage(stream, health.outage)
+
+    def reopen(self, stream):
+        stream.reopening = True
+        stream.health.attempts += 1
+        threading.Thread(target=self._reopen, args=(stream,), name=f"reopen-{stream.name}", daemon=True).start()
+
+    def _reopen(self, stream):
+        health = stream.health
+        try:
+            stream.close_capture()
+            if self.stopped.is_set():
+                return
+            opened = self.engine.open_stream(stream)
+            if opened and self.stopped.is_set():
+                stream.close_capture()
+                return
+            # Exponential backoff with jitter, counted from the end of this attempt
+            delay = min(self.max_delay, self.base_delay * 2 ** (health.attempts - 1)) * random.uniform(0.8, 1.2)
+            health.next_attempt = time.perf_counter() + delay
+            if opened:
+                health.reconnects += 1
+                health.reconnect_times.append(time.time())
+                if health.outage is not None:
+                    health.outage.reconnects += 1
+                print(f"--- {stream.name}: Reconnected ({stream.source}) ---")
+            else:
+                print(f"Warning: {stream.name} reconnect attempt {health.attempts} failed, retrying in {delay:.0f}s")
+        except Exception as e:
+            print(f"Error reopening {stream.name}: {e}")
+        finally:
+            stream.reopening = False
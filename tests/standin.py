@@ -0,0 +1,88 @@
+"""Local stand-ins for the Telegram Bot API and the Twilio REST API.
+
+Serves the few endpoints notifiers.py calls on 127.0.0.1 and records every request, so
+alert routing can be exercised end to end without network access or real accounts:
+
+    server = StandinServer()
+    await server.start()
+    telegram = TelegramClient(pool, "token", server.url)
+    twilio = TwilioClient(pool, "AC123", "secret", "+15550000000", server.url)
+
+fail(service, status, count, retry_after) makes the next count requests to a service
+fail with that status, as Telegram's and Twilio's rate limits and outages do.
+"""
+import json
+import time
+from aiohttp import web
+
+class StandinServer:
+    def __init__(self):
+        self.requests = [] # (service, method, fields, file names), in arrival order
+        self.failures = {} # service -> [status, remaining count, retry_after]
+        self.runner = None
+        self.url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.telegram)
+        app.router.add_post("/2010-04-01/Accounts/{account}/Calls.json", self.twilio)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def fail(self, service, status, count=1, retry_after=None):
+        self.failures[service] = [status, count, retry_after]
+
+    def sent(self, service, method=None):
+        return [request for request in self.requests if request[0] == service and method in (None, request[1])]
+
+    def _failure(self, service):
+        failure = self.failures.get(service)
+        if not failure or failure[1] <= 0:
+            return None
+        failure[1] -= 1
+        return failure[0], failure[2]
+
+    async def telegram(self, request):
+        fields, files = {}, []
+        async for part in await request.multipart():
+            if part.filename:
+                files.append(part.filename)
+                await part.read()
+            else:
+                fields[part.name] = await part.text()
+        self.requests.append(("telegram", request.match_info["method"], fields, files))
+        failure = self._failure("telegram")
+        if failure:
+            status, retry_after = failure
+            body = {"ok": False, "error_code": status, "description": "Too Many Requests" if status == 429 else "Error"}
+            if retry_after is not None:
+                body["parameters"] = {"retry_after": retry_after}
+            return web.json_response(body, status=status)
+        return web.json_response({"ok": True, "result": {"message_id": len(self.requests), "date": int(time.time())}})
+
+    async def twilio(self, request):
+        if not request.headers.get("Authorization", "").startswith("Basic "):
+            return web.json_response({"code": 20003, "message": "Authenticate"}, status=401)
+        fields = dict(await request.post())
+        self.requests.append(("twilio", "Calls", fields, []))
+        failure = self._failure("twilio")
+        if failure:
+            return web.json_response({"code": 20429, "message": "Too Many Requests"}, status=failure[0])
+        return web.json_response({"sid": f"CA{len(self.requests):032d}", "status": "queued"}, status=201)
+
+def caption(request):
+    """The caption of a recorded sendPhoto or sendMediaGroup request."""
+    _, method, fields, _ = request
+    if method == "sendMediaGroup":
+        return json.loads(fields["media"])[0].get("caption")
+    return fields.get("caption")
@@ -0,0 +1,168 @@
+"""Alert routing end to end: AlertRouter picks recipients, AlertDispatcher queues, coalesces and
+rate limits, and the pooled clients deliver to the stand-in Telegram and Twilio servers."""
+import asyncio
+import time
+import pytest
+from alerts import AlertDispatcher
+from notifiers import HttpPool, TelegramClient, TwilioClient
+from router import AlertRouter, merge_photo_alerts, merge_voice_alerts, split_photos
+from standin import StandinServer, caption
+from tracker import Incident
+
+ROUTES = {
+    "recipients": {
+        "ops": {"telegram": "-100111"},
+        "alice": {"voice": "+15550001111"},
+        "bob": {"voice": "+15550002222"},
+        "manager": {"telegram": "999"},
+    },
+    "rotations": {"on-call": {"members": ["alice", "bob"], "start": "2026-01-05 09:00", "shift_hours": 24}},
+    "sites": {"warehouse": ["CAM-1", "CAM-2"]},
+    "routes": [
+        {"cameras": ["warehouse"], "notify": ["ops", "on-call"], "escalate": [{"after": 300, "notify": ["manager"]}]},
+        {"cameras": "*", "notify": ["ops"]},
+    ],
+}
+COOLDOWNS = {"telegram": 60, "voice": 600}
+ALICE_SHIFT = time.mktime((2026, 1, 5, 12, 0, 0, 0, 0, -1)) # First day of the rotation
+BOB_SHIFT = ALICE_SHIFT + 86400
+
+class Pipeline:
+    """The detector's alert path: route an incident, queue per recipient, deliver to the stand-ins."""
+
+    def __init__(self, tmp_path, routes=ROUTES, coalesce=0.0):
+        self.server = StandinServer()
+        self.router = AlertRouter(routes)
+        self.dispatcher = AlertDispatcher(str(tmp_path / "alerts.db"), base_delay=0.1)
+        self.coalesce = coalesce
+        self.pool = HttpPool()
+        self.task = None
+
+    async def __aenter__(self):
+        await self.server.start()
+        telegram = TelegramClient(self.pool, "123:abc", self.server.url)
+        twilio = TwilioClient(self.pool, "AC123", "secret", "+15550000000", self.server.url)
+
+        async def send_photos(payload, attachment):
+            await telegram.send_photos(payload["chat_id"], split_photos(payload, attachment), payload["caption"])
+
+        async def call(payload, attachment):
+            await twilio.call(payload["to"], f"<Response><Say>{' and '.join(payload['cameras'])}</Say></Response>")
+
+        self.dispatcher.add_channel("telegram", send_photos, merge=merge_photo_alerts, coalesce=self.coalesce)
+        self.dispatcher.add_channel("voice", call, merge=merge_voice_alerts, coalesce=self.coalesce)
+        for recipient in self.router.recipients.values():
+            self.dispatcher.limit_recipient(recipient.name, recipient.per_minute, recipient.burst)
+        self.task = asyncio.create_task(self.dispatcher.run())
+        return self
+
+    async def __aexit__(self, *exc):
+        self.dispatcher.stop()
+        await asyncio.wait_for(self.task, 5)
+        await self.pool.close()
+        await self.server.stop()
+
+    def fire(self, camera, incident, now):
+        """What handle_fire() queues for a frame with confirmed fire."""
+        due, _ = self.router.due(camera, incident, COOLDOWNS, now)
+        for recipient, _ in due:
+            if recipient.channel == "telegram":
+                self.dispatcher.submit("telegram", {"chat_id": recipient.address, "caption": f"Fire on {camera}",
+                                                    "sizes": [4]}, attachment=b"jpeg", dedup_key=incident.id,
+                                       recipient=recipient.name)
+            else:
+                self.dispatcher.submit("voice", {"to": recipient.address, "cameras": [camera]},
+                                       dedup_key=incident.id, recipient=recipient.name)
+        return sorted(recipient.name for recipient, _ in due)
+
+    async def settle(self, count, timeout=5.0):
+        """Waits until the stand-ins got count requests and the queue is empty."""
+        deadline = time.monotonic() + timeout
+        while len(self.server.requests) < count or self.dispatcher.pending():
+            if time.monotonic() > deadline:
+                pytest.fail(f"Got {self.server.requests}, {self.dispatcher.pending()} still queued")
+            await asyncio.sleep(0.02)
+        return self.server.requests
+
+def incident(camera, started=ALICE_SHIFT):
+    result = Incident(camera, 0.0)
+    result.started = started
+    return result
+
+def test_routes_sites_and_rotation(tmp_path):
+    async def scenario():
+        async with Pipeline(tmp_path) as pipeline:
+            assert pipeline.fire("CAM-1", incident("CAM-1", BOB_SHIFT), BOB_SHIFT) == ["bob", "ops"]
+            assert pipeline.fire("CAM-7", incident("CAM-7", BOB_SHIFT), BOB_SHIFT) == ["ops"]
+            requests = await pipeline.settle(2)
+            # Both alerts to ops were due together and went out as one album
+            album, = pipeline.server.sent("telegram")
+            assert album[2]["chat_id"] == "-100111" and caption(album) == "Fire on CAM-1\nFire on CAM-7"
+            assert [request[2]["To"] for request in pipeline.server.sent("twilio")] == ["+15550002222"]
+            assert len(requests) == 2
+    asyncio.run(scenario())
+    router = AlertRouter(ROUTES)
+    assert router.on_call("on-call", ALICE_SHIFT) == "alice"
+    assert router.on_call("on-call", BOB_SHIFT + 86400) == "alice"
+
+def test_escalation_and_cooldown(tmp_path):
+    async def scenario():
+        async with Pipeline(tmp_path) as pipeline:
+            fire = incident("CAM-2")
+            assert pipeline.fire("CAM-2", fire, ALICE_SHIFT) == ["alice", "ops"]
+            await pipeline.settle(2)
+            # Inside the cooldown nobody is told again
+            assert pipeline.fire("CAM-2", fire, ALICE_SHIFT + 10) == []
+            # Five minutes in the manager is added and ops is past its Telegram cooldown, the call isn't
+            assert pipeline.fire("CAM-2", fire, ALICE_SHIFT + 300) == ["manager", "ops"]
+            await pipeline.settle(4)
+            chats = sorted(request[2]["chat_id"] for request in pipeline.server.sent("telegram"))
+            assert chats == ["-100111", "-100111", "999"]
+            assert len(pipeline.server.sent("twilio")) == 1
+    asyncio.run(scenario())
+
+def test_coalesces_cameras_into_one_album_and_one_call(tmp_path):
+    async def scenario():
+        async with Pipeline(tmp_path, coalesce=0.3) as pipeline:
+            pipeline.fire("CAM-1", incident("CAM-1"), ALICE_SHIFT)
+            pipeline.fire("CAM-2", incident("CAM-2"), ALICE_SHIFT)
+            requests = await pipeline.settle(2)
+            album, = pipeline.server.sent("telegram")
+            assert album[1] == "sendMediaGroup" and len(album[3]) == 2
+            assert caption(album) == "Fire on CAM-1\nFire on CAM-2"
+            call, = pipeline.server.sent("twilio")
+            assert call[2]["To"] == "+15550001111" and "CAM-1 and CAM-2" in call[2]["Twiml"]
+            assert pipeline.dispatcher.stats["telegram"].coalesced == 1
+            assert pipeline.dispatcher.stats["voice"].coalesced == 1
+            assert len(requests) == 2
+    asyncio.run(scenario())
+
+def test_rate_limit_holds_alerts_and_merges_them(tmp_path):
+    routes = dict(ROUTES, recipients=dict(ROUTES["recipients"], ops={"telegram": "-100111", "per_minute": 60, "burst": 1}))
+
+    async def scenario():
+        async with Pipeline(tmp_path, routes=routes) as pipeline:
+            pipeline.fire("CAM-5", incident("CAM-5"), ALICE_SHIFT)
+            await pipeline.settle(1)
+            # The bucket is empty: both alerts wait for the next token, then go out together
+            started = time.monotonic()
+            pipeline.fire("CAM-6", incident("CAM-6"), ALICE_SHIFT)
+            pipeline.fire("CAM-7", incident("CAM-7"), ALICE_SHIFT)
+            await pipeline.settle(2)
+            assert time.monotonic() - started >= 0.5
+            assert pipeline.server.requests[1][1] == "sendMediaGroup"
+            assert pipeline.dispatcher.stats["telegram"].rate_limited >= 2
+    asyncio.run(scenario())
+
+def test_retries_after_the_api_rate_limit(tmp_path):
+    async def scenario():
+        async with Pipeline(tmp_path) as pipeline:
+            pipeline.server.fail("telegram", 429, count=1, retry_after=1)
+            started = time.monotonic()
+            pipeline.fire("CAM-9", incident("CAM-9"), ALICE_SHIFT)
+            requests = await pipeline.settle(2)
+            assert [request[1] for request in requests] == ["sendPhoto", "sendPhoto"]
+            assert time.monotonic() - started >= 0.9 # The retry_after the API asked for
+            assert pipeline.dispatcher.stats["telegram"].retries == 1
+            assert pipeline.dispatcher.stats["telegram"].sent == 1
+    asyncio.run(scenario())
@@ -0,0 +1,139 @@
+"""AlertDispatcher queueing: dedup, rate limits, retries and the queue surviving a restart."""
+import asyncio
+import time
+import pytest
+from alerts import AlertDispatcher, PermanentAlertError, TokenBucket
+
+class Channel:
+    """Records what a dispatcher channel was asked to send; fails the first `failures` sends."""
+
+    def __init__(self, failures=0, error=RuntimeError):
+        self.sent = []
+        self.failures = failures
+        self.error = error
+
+    async def __call__(self, payload, attachment):
+        if self.failures:
+            self.failures -= 1
+            raise self.error("send failed")
+        self.sent.append((payload, attachment))
+
+async def drain(dispatcher, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while dispatcher.pending():
+        if time.monotonic() > deadline:
+            pytest.fail(f"{dispatcher.pending()} alert(s) still queued")
+        await asyncio.sleep(0.02)
+
+def run(dispatcher, scenario):
+    async def main():
+        task = asyncio.create_task(dispatcher.run())
+        try:
+            await scenario()
+        finally:
+            dispatcher.stop()
+            await asyncio.wait_for(task, 5)
+    asyncio.run(main())
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2.0, burst=2)
+    now = bucket.updated
+    for _ in range(2):
+        assert bucket.wait_time(now) == 0
+        bucket.take()
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0
+    assert bucket.wait_time(now + 10) == 0 and bucket.tokens == 2 # Refills up to the burst only
+
+
+def test_rate_limit_postpones_without_counting_an_attempt(tmp_path):
+    dispatcher = AlertDispatcher(str(tmp_path / "alerts.db"))
+    channel = Channel()
+    dispatcher.add_channel("sms", channel)
+    dispatcher.limit_channel("sms", per_minute=120, burst=1)
+    sent_at = []
+
+    async def scenario():
+        started = time.monotonic()
+        for n in range(3):
+            dispatcher.submit("sms", {"n": n})
+        while len(channel.sent) < 3:
+            count = len(channel.sent)
+            await asyncio.sleep(0.01)
+            if len(channel.sent) > count:
+                sent_at.append(time.monotonic() - started)
+            assert time.monotonic() - started < 5
+        await drain(dispatcher)
+
+    run(dispatcher, scenario)
+    # Without a merge every alert is its own send, one per token: 0s, 0.5s, 1s
+    assert [payload["n"] for payload, _ in channel.sent] == [0, 1, 2]
+    assert sent_at[-1] >= 0.9
+    assert dispatcher.stats["sms"].rate_limited >= 2
+    assert dispatcher.stats["sms"].retries == 0
+
+def test_dedup_per_recipient_until_sent(tmp_path):
+    dispatcher = AlertDispatcher(str(tmp_path / "alerts.db"))
+    channel = Channel()
+    dispatcher.add_channel("telegram", channel)
+    assert dispatcher.submit("telegram", {"text": "fire"}, dedup_key="CAM-1-1", recipient="ops")
+    assert not dispatcher.submit("telegram", {"text": "fire again"}, dedup_key="CAM-1-1", recipient="ops")
+    assert dispatcher.submit("telegram", {"text": "fire"}, dedup_key="CAM-1-1", recipient="manager")
+    assert dispatcher.stats["telegram"].deduplicated == 1
+
+    async def scenario():
+        await drain(dispatcher)
+        # Delivered alerts leave the queue, so the key can be used again
+        assert dispatcher.submit("telegram", {"text": "still burning"}, dedup_key="CAM-1-1", recipient="ops")
+        await drain(dispatcher)
+
+    run(dispatcher, scenario)
+    assert [payload["text"] for payload, _ in channel.sent] == ["fire", "fire", "still burning"]
+
+def test_retries_with_backoff_then_gives_up(tmp_path):
+    dispatcher = AlertDispatcher(str(tmp_path / "alerts.db"), max_attempts=3, base_delay=0.05)
+    flaky, broken, rejected = Channel(failures=1), Channel(failures=10), Channel(failures=1, error=PermanentAlertError)
+    dispatcher.add_channel("flaky", flaky)
+    dispatcher.add_channel("broken", broken)
+    dispatcher.add_channel("rejected", rejected)
+
+    async def scenario():
+        for name in ("flaky", "broken", "rejected"):
+            dispatcher.submit(name, {"channel": name}, attachment=b"jpeg")
+        await drain(dispatcher)
+
+    run(dispatcher, scenario)
+    assert flaky.sent == [({"channel": "flaky"}, b"jpeg")]
+    assert dispatcher.stats["flaky"].retries == 1 and dispatcher.stats["flaky"].sent == 1
+    assert dispatcher.stats["broken"].retries == 2 and dispatcher.stats["broken"].failed == 1
+    assert dispatcher.stats["rejected"].retries == 0 and dispatcher.stats["rejected"].failed == 1
+
+def test_queue_survives_a_restart(tmp_path):
+    path = str(tmp_path / "alerts.db")
+    first = AlertDispatcher(path)
+    first.stop() # Before run() started: it must not send anything
+    first.add_channel("telegram", Channel())
+    first.submit("telegram", {"text": "queued before the restart"}, attachment=b"jpeg", dedup_key="CAM-1-1")
+    asyncio.run(asyncio.wait_for(first.run(), 5))
+    assert first.pending() == 1
+
+    second = AlertDispatcher(path)
+    channel = Channel()
+    second.add_channel("telegram", channel)
+    assert not second.submit("telegram", {"text": "duplicate"}, dedup_key="CAM-1-1")
+    run(second, lambda: drain(second))
+    # Attachments are never written to the database, the alert itself survives
+    assert channel.sent == [({"text": "queued before the restart"}, None)]
+
+def test_submit_does_not_wait_for_the_database(tmp_path):
+    dispatcher = AlertDispatcher(str(tmp_path / "alerts.db"))
+    channel = Channel()
+    dispatcher.add_channel("telegram", channel)
+    with dispatcher.lock: # A slow commit or a long dispatcher query
+        started = time.monotonic()
+        assert dispatcher.submit("telegram", {"text": "fire"}, dedup_key="CAM-1-1")
+        assert not dispatcher.submit("telegram", {"text": "fire"}, dedup_key="CAM-1-1")
+        assert time.monotonic() - started < 0.1
+        assert dispatcher.pending() == 1
+    run(dispatcher, lambda: drain(dispatcher))
+    assert channel.sent == [({"text": "fire"}, None)]
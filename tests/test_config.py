@@ -0,0 +1,90 @@
+"""Config validation and ConfigStore: a rejected document never reaches the file or the running settings."""
+import json
+import pytest
+from config import ConfigStore, hsv_ranges, unknown_cameras, validate_config
+
+CAMERA_DEFAULTS = {"hsv_ranges": [[[0, 110, 200], [35, 255, 255]]], "kernel_size": 5, "min_area": 100,
+                   "persistence": 7}
+ALERT_DEFAULTS = {"telegram_cooldown": 60, "call_cooldown": 300, "alarm_interval": 0.6}
+
+def store(tmp_path, check=None):
+    return ConfigStore(str(tmp_path / "sentinel_config.json"), CAMERA_DEFAULTS, ALERT_DEFAULTS, check=check)
+
+def test_hsv_ranges_are_normalized_and_checked():
+    assert hsv_ranges([[[0, 110, 200], [35, 255, 255]]]) == [((0, 110, 200), (35, 255, 255))]
+    with pytest.raises(ValueError, match="out of range"):
+        hsv_ranges([[[0, 0, 0], [180, 255, 255]]])
+    with pytest.raises(ValueError, match="above upper bound"):
+        hsv_ranges([[[40, 110, 200], [35, 255, 255]]])
+    with pytest.raises(ValueError, match="3 values"):
+        hsv_ranges([[[0, 110], [35, 255]]])
+    with pytest.raises(ValueError, match="At least one"):
+        hsv_ranges([])
+
+@pytest.mark.parametrize("document, message", [
+    ([], "Expected a JSON object"),
+    ({"camera": {}}, "Unknown section"),
+    ({"defaults": {"min_area": -1}}, "defaults.min_area"),
+    ({"defaults": {"persistence": True}}, "defaults.persistence: Expected a number"),
+    ({"cameras": {"CAM-1": {"colour": 1}}}, "CAM-1: unknown setting colour"),
+    ({"cameras": {"CAM-1": {"rois": [[0, 0, 0, 10]]}}}, "CAM-1.rois"),
+    ({"alerts": {"alarm_interval": 0}}, "alerts.alarm_interval"),
+])
+def test_validate_config_names_the_offending_key(document, message):
+    with pytest.raises(ValueError, match=message):
+        validate_config(document)
+
+def test_settings_resolve_defaults_then_camera(tmp_path):
+    config = store(tmp_path)
+    changes = config.update({"defaults": {"min_area": 200}, "cameras": {"CAM-2": {"min_area": 50, "kernel_size": 7}}},
+                            cameras=["CAM-1", "CAM-2"])
+    assert ("CAM-1", "min_area", 100.0, 200.0) in changes
+    assert ("CAM-2", "kernel_size", 5, 7) in changes
+    assert config.camera("CAM-1")["min_area"] == 200
+    assert config.camera("CAM-2")["min_area"] == 50
+    # A null removes the override again
+    config.update({"cameras": {"CAM-2": {"min_area": None, "kernel_size": None}}})
+    assert config.camera("CAM-2")["min_area"] == 200
+    assert json.load(open(config.path))["cameras"] == {}
+
+def test_rejected_update_leaves_file_and_settings_alone(tmp_path):
+    def check(settings):
+        if settings["kernel_size"] > 9:
+            raise RuntimeError("kernel too large for this detector")
+
+    config = store(tmp_path, check=check)
+    config.update({"alerts": {"telegram_cooldown": 30}})
+    written = open(config.path).read()
+    for patch in ({"defaults": {"hsv_ranges": [[[40, 0, 0], [35, 255, 255]]]}},
+                  {"cameras": {"CAM-1": {"kernel_size": 11}}},
+                  {"defaults": {"kernel_size": 11}}):
+        with pytest.raises(ValueError):
+            config.update(patch, cameras=["CAM-1"])
+    with pytest.raises(ValueError, match="CAM-1: kernel too large"):
+        config.update({"cameras": {"CAM-1": {"kernel_size": 11}}})
+    assert open(config.path).read() == written
+    assert config.camera("CAM-1")["kernel_size"] == 5
+    assert config.alerts()["telegram_cooldown"] == 30
+
+def test_unknown_cameras_are_the_same_for_merge_and_replace():
+    running = ["CAM-1", "CAM-2"]
+    assert unknown_cameras({"cameras": {"CAM-1": {"min_area": 50}}}, running) == []
+    assert unknown_cameras({"cameras": {"CAM-9": {"min_area": 50}, "CAM-3": {}}}, running) == ["CAM-3", "CAM-9"]
+    assert unknown_cameras({"cameras": {"CAM-9": None}}, running) == [] # Clears a removed camera's overrides
+    assert unknown_cameras({"defaults": {"min_area": 50}}, running) == []
+    assert unknown_cameras({"cameras": "CAM-9"}, running) == [] # Left to validation
+
+def test_reload_picks_up_edits_and_rejects_broken_files(tmp_path):
+    config = store(tmp_path)
+    assert config.load(["CAM-1"]) == [] # No file yet
+    with open(config.path, "w") as f:
+        json.dump({"defaults": {"persistence": 3}}, f)
+    assert config.reload_if_changed(["CAM-1"]) == [("CAM-1", "persistence", 7, 3)]
+    assert config.reload_if_changed(["CAM-1"]) is None
+    with open(config.path, "w") as f:
+        f.write("{not json")
+    config.mtime = None
+    with pytest.raises(ValueError):
+        config.reload_if_changed(["CAM-1"])
+    assert config.camera("CAM-1")["persistence"] == 3
+    assert config.reload_if_changed(["CAM-1"]) is None # Reported once, not on every check
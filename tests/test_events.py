@@ -0,0 +1,71 @@
+"""EventBus: Last-Event-ID catch-up, resync on gaps, restarts and slow clients."""
+import asyncio
+from events import EventBus, EventSubscriber
+
+def ids(bus, last_event_id):
+    missed = bus._missed(last_event_id)
+    return None if missed is None else [event[0] for event in missed]
+
+def test_catch_up_from_last_event_id():
+    bus = EventBus(history=3)
+    for n in range(5):
+        bus.publish("state", {"n": n})
+    epoch = bus.epoch
+    assert ids(bus, f"{epoch}-5") == []
+    assert ids(bus, f"{epoch}-3") == [f"{epoch}-4", f"{epoch}-5"]
+    assert ids(bus, f"{epoch}-2") == [f"{epoch}-3", f"{epoch}-4", f"{epoch}-5"]
+    # Event 2 fell out of the history
+    assert ids(bus, f"{epoch}-1") is None
+
+def test_resync_on_unknown_ids():
+    bus = EventBus()
+    bus.publish("state", {})
+    assert ids(bus, f"{bus.epoch}-1") == []
+    assert ids(bus, f"{bus.epoch}-2") is None # Never handed out
+    assert ids(bus, "0-1") is None # Another boot
+    for malformed in ("", "1", f"{bus.epoch}-", f"{bus.epoch}-x", f"{bus.epoch}--1"):
+        assert ids(bus, malformed) is None
+    # A fresh bus has handed out nothing, anything but its own epoch-0 is from elsewhere
+    assert ids(EventBus(), f"{bus.epoch}-1") is None
+
+def test_subscribe_preamble():
+    bus = EventBus()
+    bus.publish("state", {"armed": True})
+    stream = bus.subscribe(last_event_id=f"{bus.epoch}-0")
+    preamble = next(stream)
+    assert preamble.startswith("retry: 2000\n\n")
+    assert f"id: {bus.epoch}-1\nevent: state\ndata: {{\"armed\": true}}\n\n" in preamble
+    assert "resync" in next(bus.subscribe(last_event_id="stale-7"))
+    assert "resync" not in next(bus.subscribe())
+    stream.close()
+
+def test_slow_subscriber_is_told_to_resync():
+    subscriber = EventSubscriber(max_pending=2)
+    for n in range(3):
+        subscriber.put(n)
+    events, overflowed = subscriber.take(0)
+    assert events == [2] and overflowed
+    assert subscriber.take(0) == ([], False)
+
+def test_async_subscriber_is_woken_from_another_thread():
+    bus = EventBus()
+    received = []
+
+    async def send(text):
+        received.append(text)
+        if len(received) == 2:
+            raise ConnectionResetError # The client went away
+
+    async def main():
+        client = asyncio.create_task(bus.subscribe_async(send, heartbeat=5))
+        while not bus.client_count:
+            await asyncio.sleep(0.01)
+        await asyncio.to_thread(bus.publish, "state", {"armed": False})
+        try:
+            await asyncio.wait_for(client, 2)
+        except ConnectionResetError:
+            pass
+
+    asyncio.run(main())
+    assert received[1] == f"id: {bus.epoch}-1\nevent: state\ndata: {{\"armed\": false}}\n\n"
+    assert bus.client_count == 0
@@ -0,0 +1,59 @@
+"""ClipRecorder clip boundaries and byte budget, driven with a fake clock and no capture."""
+import types
+import pytest
+import recorder
+from recorder import ClipRecorder
+
+class Stream:
+    name = "CAM-1"
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(recorder, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+def feed(clip_recorder, clock, until, step=0.5, size=100, key="CAM-1-1"):
+    """Buffers a frame every step seconds and triggers on each, as handle_fire does while fire burns."""
+    while clock[0] < until:
+        clock[0] += step
+        clip_recorder._append(clock[0], b"j" * size)
+        clip_recorder.trigger(key)
+        clip_recorder._collect(clock[0])
+
+def clips(clip_recorder):
+    result = []
+    while not clip_recorder.clips.empty():
+        frames, key = clip_recorder.clips.get()
+        result.append(([ts for ts, _ in frames], key))
+    return result
+
+def test_repeated_triggers_do_not_extend_the_clip(clock):
+    clip_recorder = ClipRecorder(Stream(), pre_seconds=2.0, post_seconds=3.0)
+    for _ in range(8): # Four seconds of quiet footage
+        clock[0] += 0.5
+        clip_recorder._append(clock[0], b"j" * 100)
+    triggered = clock[0]
+    assert clip_recorder.trigger("CAM-1-1")
+    feed(clip_recorder, clock, triggered + 3.0)
+    (first, key), = clips(clip_recorder)
+    # Finalized at start + pre + post although every frame triggered again
+    assert key == "CAM-1-1" and first[0] == triggered - 1.5 and first[-1] == triggered + 3.0
+    assert not clip_recorder.trigger("CAM-1-1") # The continuation, not a new incident
+    feed(clip_recorder, clock, triggered + 6.0)
+    (second, _), = clips(clip_recorder)
+    assert second[0] == triggered + 3.5 and second[-1] == triggered + 6.0
+
+def test_budget_keeps_the_footage_before_the_trigger(clock):
+    clip_recorder = ClipRecorder(Stream(), pre_seconds=2.0, post_seconds=3.0, max_bytes=900)
+    for _ in range(20):
+        clock[0] += 0.5
+        clip_recorder._append(clock[0], b"j" * 100)
+    assert clip_recorder.frames_dropped == 0 # Only the pre-event window is kept while idle
+    triggered = clock[0]
+    clip_recorder.trigger("CAM-1-1")
+    feed(clip_recorder, clock, triggered + 3.0)
+    (frames, _), = clips(clip_recorder)
+    assert frames[:4] == [triggered - 1.5, triggered - 1.0, triggered - 0.5, triggered]
+    # The clip needs ten frames, the budget holds nine: the newest one went
+    assert frames[-1] == triggered + 2.5 and clip_recorder.frames_dropped == 1
@@ -0,0 +1,49 @@
+"""StateCore: one write path, versioned immutable snapshots, subscribers in version order."""
+import threading
+import pytest
+from state import StateCore
+
+def core():
+    return StateCore(armed=True, telegram_cooldown=60, call_cooldown=300, alarm_interval=0.6)
+
+def test_updates_bump_the_version_only_on_change():
+    state = core()
+    before = state.snapshot
+    after = state.update(armed=False)
+    assert (before.armed, before.version) == (True, 0) # Snapshots are never changed in place
+    assert (after.armed, after.version) == (False, 1)
+    assert state.update(armed=False) is after
+    assert state.stats()["writes"] == 1
+
+def test_rejects_unknown_and_missing_fields():
+    with pytest.raises(ValueError, match="Missing initial state"):
+        StateCore(armed=True)
+    state = core()
+    with pytest.raises(ValueError, match="Unknown state field"):
+        state.update(armed=False, volume=11)
+    assert state.snapshot.version == 0 and state.snapshot.armed
+
+def test_concurrent_toggles_are_not_lost():
+    state = core()
+
+    def toggle():
+        for _ in range(500):
+            state.modify(lambda current: {"armed": not current.armed})
+
+    threads = [threading.Thread(target=toggle) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state.snapshot.version == 2000
+    assert state.snapshot.armed # An even number of toggles
+
+def test_subscribers_see_every_version_in_order():
+    state = core()
+    seen = []
+    state.subscribe(lambda old, new: seen.append((old.version, new.version)))
+    state.subscribe(lambda old, new: 1 / 0) # A failing subscriber doesn't stop the write
+    for cooldown in (10, 20, 30):
+        state.update(telegram_cooldown=cooldown)
+    assert seen == [(0, 1), (1, 2), (2, 3)]
+    assert state.snapshot.telegram_cooldown == 30
@@ -0,0 +1,56 @@
+"""RegionTracker identity and motion signals, and Incident bookkeeping."""
+import numpy as np
+import pytest
+from tracker import Incident, RegionTracker, iou_matrix
+
+def test_iou_matrix():
+    overlap = iou_matrix([(0, 0, 10, 10)], [(0, 0, 10, 10), (5, 0, 10, 10), (20, 20, 5, 5)])
+    assert overlap.shape == (1, 3)
+    assert overlap[0] == pytest.approx([1.0, 50 / 150, 0.0])
+
+def test_ids_follow_overlapping_boxes():
+    tracker = RegionTracker(max_misses=2)
+    assert tracker.update([(0, 0, 10, 10), (100, 100, 10, 10)], 0.0) == [1, 2]
+    assert tracker.update([(102, 101, 10, 10), (1, 0, 10, 10)], 0.1) == [2, 1]
+    assert tracker.update([(300, 300, 10, 10)], 0.2) == [3]
+    # Tracks 1 and 2 survive max_misses frames without a box, then end
+    assert tracker.update([(1, 0, 10, 10)], 0.3) == [1]
+    for timestamp in (0.4, 0.5, 0.6):
+        tracker.update([], timestamp)
+    assert tracker.tracks() == []
+    assert tracker.update([(1, 0, 10, 10)], 0.7) == [4]
+
+def test_full_tracker_replaces_the_stalest_track():
+    tracker = RegionTracker(capacity=2)
+    tracker.update([(0, 0, 10, 10)], 0.0)
+    tracker.update([(0, 0, 10, 10), (50, 50, 10, 10)], 1.0)
+    # Track 1 goes unseen while a third region appears
+    assert tracker.update([(50, 50, 10, 10), (90, 90, 10, 10)], 2.0) == [2, 3]
+    assert sorted(track["id"] for track in tracker.tracks()) == [2, 3]
+
+def test_growth_and_flicker():
+    tracker = RegionTracker(time_constant=0.2)
+    for frame in range(20):
+        t = frame * 0.1
+        side = 10 + 2 * frame # Spreading fire
+        lamp = 20 + (frame % 2) # A flickering lamp that stays the same size
+        tracker.update([(0, 0, side, side), (200, 200, lamp, lamp)], t)
+    fire, lamp = sorted(tracker.tracks(), key=lambda track: track["id"])
+    assert fire["growth"] > 0.5 and fire["size_ratio"] > 10
+    assert fire["flicker_hz"] == 0
+    assert abs(lamp["growth"]) < 0.5 and lamp["flicker_hz"] > 3
+    summary = tracker.summary()
+    assert summary["regions"] == 2 and summary["growth"] == fire["growth"]
+    assert RegionTracker().summary() == {"regions": 0}
+
+def test_incident_keeps_peaks():
+    incident = Incident("CAM-1", 10.0)
+    assert incident.id.startswith("CAM-1-")
+    incident.update(10.5, [1, 2], {"regions": 2, "area": 400, "growth": 0.3, "speed": 5.0, "flicker_hz": 1.0})
+    incident.update(11.0, [2], {"regions": 1, "area": 100, "growth": 0.1, "speed": 9.0, "flicker_hz": 2.0})
+    incident.update(12.0, [], {"regions": 0})
+    incident.close()
+    report = incident.to_dict()
+    assert report["duration"] == 2.0 and report["frames"] == 3 and report["tracks"] == 2
+    assert (report["peak_regions"], report["peak_area"], report["peak_growth"], report["peak_speed"]) == (2, 400, 0.3, 9.0)
+    assert report["flicker_hz"] == 2.0 and report["ended"] >= report["started"]
@@ -0,0 +1,32 @@
+"""VerifiedDetector fails open when the classifier is unavailable, and says so once per outage."""
+import numpy as np
+from verifier import VerifiedDetector
+
+class ColourDetector:
+    def find_regions(self, frame, tiles=None):
+        return [(0, 0, 10, 10), (20, 20, 10, 10)]
+
+class Classifier:
+    def __init__(self):
+        self.error = None
+
+    def classify(self, crops):
+        if self.error:
+            raise self.error
+        return [0.9, 0.1][:len(crops)]
+
+def test_unavailable_verifier_is_reported_once_per_outage(capsys):
+    classifier = Classifier()
+    detector = VerifiedDetector(ColourDetector(), classifier)
+    frame = np.zeros((40, 40, 3), np.uint8)
+    assert detector.find_regions(frame) == [(0, 0, 10, 10)]
+    classifier.error = TimeoutError("Verifier did not answer within 2s")
+    for _ in range(25): # One second at 25 fps
+        assert len(detector.find_regions(frame)) == 2 # Fails open
+    classifier.error = None
+    assert detector.find_regions(frame) == [(0, 0, 10, 10)]
+    assert capsys.readouterr().out.splitlines() == [
+        "Verifier unavailable, keeping colour detections until it is back: Verifier did not answer within 2s",
+        "Verifier available again.",
+    ]
+    assert detector.unverified == 25 and detector.rejected == 2
@@ -0,0 +1,105 @@
+"""FireSegmenter against the original BGR2HSV, inRange per range, open + dilate pipeline, and the
+cached HUD overlay against drawing the HUD directly.
+
+The mirrored-hue conversion rounds a few colours one hue step differently, so colour
+classification is checked to agree everywhere except on the hue steps next to a band edge.
+"""
+import cv2
+import numpy as np
+import pytest
+from vision import FIRE_HSV_RANGES, FireSegmenter, HudOverlay, draw_hud, draw_status_label
+
+RANGES = [
+    FIRE_HSV_RANGES,
+    [((0, 50, 50), (10, 255, 255))],
+    [((5, 0, 100), (20, 200, 255)), ((150, 100, 0), (179, 255, 255)), ((0, 0, 0), (3, 255, 255))],
+    [((60, 0, 0), (130, 255, 255))], # Crosses green, wraps in mirrored hue space
+    [((170, 0, 0), (179, 255, 255))], # Ends at 179, next to 0 on the circle
+]
+
+def colour_mask(hsv, hsv_ranges, slack=0):
+    """Pixels in any range, with every hue band widened (slack 1) or narrowed (slack -1) by a step."""
+    hue = hsv[..., 0].astype(int)
+    mask = np.zeros(hsv.shape[:2], bool)
+    for lower, upper in hsv_ranges:
+        hues = set(range(lower[0], upper[0] + 1))
+        if slack > 0:
+            hues |= {(h + step) % 180 for h in hues for step in (-1, 1)}
+        elif slack < 0:
+            hues = {h for h in hues if (h - 1) % 180 in hues and (h + 1) % 180 in hues}
+        in_band = np.isin(hue, list(hues)) | ((hsv[..., 1] == 0) & (hue == 0) & (lower[0] == 0))
+        for channel in (1, 2):
+            in_band &= (hsv[..., channel] >= lower[channel]) & (hsv[..., channel] <= upper[channel])
+        mask |= in_band
+    return mask
+
+def all_colours(step=3):
+    values = np.arange(0, 256, step, dtype=np.uint8)
+    b, g, r = np.meshgrid(values, values, values, indexing="ij")
+    return np.stack([b, g, r], axis=-1).reshape(-1, len(values), 3)
+
+@pytest.mark.parametrize("hsv_ranges", RANGES)
+def test_colours_match_bgr2hsv_up_to_band_edges(hsv_ranges):
+    frame = all_colours()
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    mask = FireSegmenter(hsv_ranges, kernel_size=1).segment(frame) > 0
+    assert not (colour_mask(hsv, hsv_ranges, -1) & ~mask).any()
+    assert not (mask & ~colour_mask(hsv, hsv_ranges, 1)).any()
+    greys = hsv[..., 1] == 0
+    assert np.array_equal(mask[greys], colour_mask(hsv, hsv_ranges)[greys])
+
+def test_fire_colours_match_almost_everywhere():
+    frame = all_colours(step=1)
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    mask = FireSegmenter(kernel_size=1).segment(frame) > 0
+    assert np.mean(mask != colour_mask(hsv, FIRE_HSV_RANGES)) < 0.001
+
+def fire_frame(height, width, seed):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), np.uint8)
+    for _ in range(40):
+        y, x = rng.integers(0, height - 8), rng.integers(0, width - 8)
+        h, w = rng.integers(4, 40, 2)
+        frame[y:y + h, x:x + w] = rng.integers(0, 256, 3)
+    return frame
+
+@pytest.mark.parametrize("kernel_size", [1, 3, 5, 7])
+def test_folded_morphology_matches_open_then_dilate(kernel_size):
+    colours = FireSegmenter(kernel_size=1)
+    segmenter = FireSegmenter(kernel_size=kernel_size)
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    # Changing resolutions reuse and regrow the buffers
+    for seed, (height, width) in enumerate([(120, 160), (240, 320), (60, 90), (240, 320)]):
+        frame = fire_frame(height, width, seed)
+        expected = cv2.dilate(cv2.morphologyEx(colours.segment(frame), cv2.MORPH_OPEN, kernel), kernel)
+        assert np.array_equal(segmenter.segment(frame), expected)
+
+def test_find_regions_drops_small_areas():
+    frame = np.zeros((200, 200, 3), np.uint8)
+    frame[20:80, 20:80] = (0, 128, 255) # Orange, BGR
+    frame[150:156, 150:156] = (0, 128, 255)
+    boxes = FireSegmenter(min_area=100).find_regions(frame)
+    assert len(boxes) == 1
+    x, y, w, h = boxes[0]
+    assert abs(x - 20) <= 2 and abs(y - 20) <= 2 and abs(w - 60) <= 4 and abs(h - 60) <= 4
+
+@pytest.mark.parametrize("shape", [(480, 640, 3), (1080, 1920, 3), (40, 120, 3)])
+def test_hud_overlay_matches_drawing_the_hud(shape):
+    hud = HudOverlay(max_layers=2, max_labels=2)
+    rng = np.random.default_rng(0)
+    for fire_detected in (False, True):
+        for armed in (False, True):
+            for camera_name in (None, "CAM-1", "Loading Dock"):
+                frame = rng.integers(0, 256, shape, np.uint8)
+                expected = frame.copy()
+                draw_hud(expected, fire_detected)
+                draw_status_label(expected, armed, camera_name)
+                hud.apply(frame, fire_detected, armed, camera_name)
+                assert np.abs(frame.astype(int) - expected).max() <= 1 # Rounding of the alpha blend
+
+def test_hud_overlay_renders_each_layer_once_for_many_cameras():
+    hud = HudOverlay()
+    frame = np.zeros((240, 320, 3), np.uint8)
+    for n in range(100):
+        hud.apply(frame, n % 2 == 0, True, f"CAM-{n % 40}")
+    assert len(hud.layers) == 2 and len(hud.labels) == 40
@@ -0,0 +1,199 @@
+import time
+import numpy as np
+
+def iou_matrix(a, b):
+    """IoU of every (x, y, w, h) box in a against every box in b, as an (len(a), len(b)) array."""
+    a = np.asarray(a, np.float32).reshape(-1, 4)
+    b = np.asarray(b, np.float32).reshape(-1, 4)
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    inter = (np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None) *
+             np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None))
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return inter / np.maximum(union, 1e-6)
+
+class RegionTracker:
+    """Links one camera's candidate boxes from frame to frame by overlap.
+
+    Track state lives in fixed-size arrays indexed by slot, so an update is a handful of
+    vectorized operations however many regions are burning. Per track it keeps how fast
+    the region grows (smoothed relative area change per second), how fast its centre moves
+    (pixels per second) and how often its area swings between growing and shrinking (Hz):
+    a lamp stays put and swings around a fixed size, a fire spreads.
+    """
+
+    def __init__(self, capacity=32, iou_threshold=0.1, max_misses=15, time_constant=1.0):
+        self.capacity = capacity
+        self.iou_threshold = iou_threshold # Least overlap for a box to continue a track
+        self.max_misses = max_misses # Frames a track survives without a matching box
+        self.time_constant = time_constant # Seconds over which growth and motion are smoothed, evens out flicker
+        self.alive = np.zeros(capacity, bool)
+        self.ids = np.zeros(capacity, np.int64)
+        self.boxes = np.zeros((capacity, 4), np.float32) # x, y, w, h
+        self.first_seen = np.zeros(capacity, np.float64)
+        self.last_seen = np.zeros(capacity, np.float64)
+        self.hits = np.zeros(capacity, np.int32)
+        self.misses = np.zeros(capacity, np.int32)
+        self.first_area = np.zeros(capacity, np.float32)
+        self.peak_area = np.zeros(capacity, np.float32)
+        self.growth = np.zeros(capacity, np.float32) # Smoothed d(ln area)/dt, 1/s
+        self.velocity = np.zeros((capacity, 2), np.float32) # Smoothed centroid motion, px/s
+        self.trend = np.zeros(capacity, np.int8) # Sign of the last area change
+        self.reversals = np.zeros(capacity, np.int32) # Grow/shrink swings
+        self.next_id = 1
+
+    def update(self, boxes, timestamp):
+        """Matches this frame's boxes to the live tracks. Returns the track id of every box."""
+        boxes = np.asarray(boxes, np.float32).reshape(-1, 4)
+        live = np.flatnonzero(self.alive)
+        assigned = np.full(len(boxes), -1, np.int64) # Box -> slot
+        if len(live) and len(boxes):
+            overlap = iou_matrix(self.boxes[live], boxes)
+            # Greedy, best overlap first; a handful of regions makes this as good as Hungarian
+            while True:
+                row, col = np.unravel_index(np.argmax(overlap), overlap.shape)
+                if overlap[row, col] < self.iou_threshold:
+                    break
+                assigned[col] = live[row]
+                overlap[row, :] = -1
+                overlap[:, col] = -1
+
+        matched = assigned[assigned >= 0]
+        if len(matched):
+            self._advance(matched, boxes[assigned >= 0], timestamp)
+        missed = np.setdiff1d(live, matched, assume_unique=True)
+        self.misses[missed] += 1
+        self.alive[missed[self.misses[missed] > self.max_misses]] = False
+
+        for index in np.flatnonzero(assigned < 0):
+            slot = self._free_slot()
+            self._start(slot, boxes[index], timestamp)
+            assigned[index] = slot
+        return self.ids[assigned].tolist()
+
+    def _advance(self, slots, boxes, timestamp):
+        dt = np.maximum(timestamp - self.last_seen[slots], 1e-3).astype(np.float32)
+        old, new = self.boxes[slots], boxes
+        old_area = np.maximum(old[:, 2] * old[:, 3], 1.0)
+        new_area = np.maximum(new[:, 2] * new[:, 3], 1.0)
+        k = 1 - np.exp(-dt / self.time_constant) # Same smoothing whatever the frame rate
+        self.growth[slots] += k * (np.log(new_area / old_area) / dt - self.growth[slots])
+        motion = ((new[:, :2] + new[:, 2:] / 2) - (old[:, :2] + old[:, 2:] / 2)) / dt[:, None]
+        self.velocity[slots] += k[:, None] * (motion - self.velocity[slots])
+        trend = np.sign(new_area - old_area).astype(np.int8)
+        swung = (trend != 0) & (self.trend[slots] != 0) & (trend != self.trend[slots])
+        self.reversals[slots] += swung
+        self.trend[slots] = np.where(trend != 0, trend, self.trend[slots])
+        self.peak_area[slots] = np.maximum(self.peak_area[slots], new_area)
+        self.boxes[slots] = new
+        self.last_seen[slots] = timestamp
+        self.hits[slots] += 1
+        self.misses[slots] = 0
+
+    def _free_slot(self):
+        free = np.flatnonzero(~self.alive)
+        if len(free):
+            return free[0]
+        # Full: replace the track that has gone unseen longest
+        return int(np.argmin(self.last_seen))
+
+    def _start(self, slot, box, timestamp):
+        area = max(float(box[2] * box[3]), 1.0)
+        self.alive[slot] = True
+        self.ids[slot] = self.next_id
+        self.next_id += 1
+        self.boxes[slot] = box
+        self.first_seen[slot] = self.last_seen[slot] = timestamp
+        self.hits[slot] = 1
+        self.misses[slot] = 0
+        self.first_area[slot] = self.peak_area[slot] = area
+        self.growth[slot] = 0.0
+        self.velocity[slot] = 0.0
+        self.trend[slot] = 0
+        self.reversals[slot] = 0
+
+    def tracks(self, min_hits=1, visible=False):
+        """Live tracks seen at least min_hits times (with visible, only those matched on the last
+        frame), as JSON-ready dicts."""
+        selected = self.alive & (self.hits >= min_hits)
+        if visible:
+            selected &= self.misses == 0
+        result = []
+        for slot in np.flatnonzero(selected):
+            age = float(self.last_seen[slot] - self.first_seen[slot])
+            result.append({
+                "id": int(self.ids[slot]),
+                "box": [int(v) for v in self.boxes[slot]],
+                "age": round(age, 2),
+                "hits": int(self.hits[slot]),
+                "misses": int(self.misses[slot]),
+                "growth": round(float(np.expm1(self.growth[slot])), 3), # Relative area change per second
+                "size_ratio": round(float(self.boxes[slot, 2] * self.boxes[slot, 3] / self.first_area[slot]), 2),
+                "speed": round(float(np.hypot(*self.velocity[slot])), 1), # Centroid motion, px/s
+                "flicker_hz": round(float(self.reversals[slot]) / (2 * age), 2) if age > 0 else None,
+            })
+        return result
+
+    def summary(self, min_hits=1):
+        """The strongest signals over the tracks in view, for incidents and alert captions."""
+        tracks = self.tracks(min_hits, visible=True)
+        if not tracks:
+            return {"regions": 0}
+        flicker = [track["flicker_hz"] for track in tracks if track["flicker_hz"] is not None]
+        return {
+            "regions": len(tracks),
+            "area": int(sum(track["box"][2] * track["box"][3] for track in tracks)),
+            "growth": max(track["growth"] for track in tracks),
+            "speed": max(track["speed"] for track in tracks),
+            "flicker_hz": max(flicker) if flicker else None,
+        }
+
+class Incident:
+    """Confirmed fire on one camera, from the first confirmation until it has stayed quiet for a while."""
+
+    def __init__(self, camera, timestamp):
+        self.camera = camera
+        self.started = time.time()
+        self.ended = None
+        self.id = f"{camera}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}"
+        self.first_confirmed = self.last_confirmed = timestamp # Detection clock (capture time or video time)
+        self.frames = 0 # Frames with fire confirmed
+        self.track_ids = set()
+        self.regions = 0 # Peaks over the incident
+        self.area = 0
+        self.growth = 0.0
+        self.speed = 0.0
+        self.flicker_hz = None # Latest
+        self.alerts = {} # Recipient -> time.time() of its last alert about this incident
+
+    def update(self, timestamp, track_ids, summary):
+        self.last_confirmed = timestamp
+        self.frames += 1
+        self.track_ids.update(track_ids)
+        if summary["regions"]:
+            self.regions = max(self.regions, summary["regions"])
+            self.area = max(self.area, summary["area"])
+            self.growth = max(self.growth, summary["growth"])
+            self.speed = max(self.speed, summary["speed"])
+            self.flicker_hz = summary["flicker_hz"]
+
+    def close(self):
+        self.ended = time.time()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "camera": self.camera,
+            "started": round(self.started, 3),
+            "ended": round(self.ended, 3) if self.ended else None,
+            "duration": round(self.last_confirmed - self.first_confirmed, 2),
+            "frames": self.frames,
+            "tracks": len(self.track_ids),
+            "peak_regions": self.regions,
+            "peak_area": self.area,
+            "peak_growth": self.growth,
+            "peak_speed": self.speed,
+            "flicker_hz": self.flicker_hz,
+        }
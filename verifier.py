@@ -0,0 +1,219 @@
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+
+BATCH_RETRY = 300.0 # Seconds a model that rejected a batch runs one crop at a time before batches are tried again
+
+class BatchClassifier(threading.Thread):
+    """Runs a small fire/no-fire CNN on CPU over image crops, batching requests from every camera.
+
+    Callers block in classify() while one thread owns the network. Whatever is queued when
+    the network becomes free goes into the next forward pass, so crops from several boxes,
+    frames and cameras share one batch and no request waits on a timer. Models are loaded
+    with OpenCV DNN (ONNX, TensorFlow and whatever else the OpenCV build reads) or, for
+    .onnx files and when installed, ONNX Runtime.
+    """
+
+    def __init__(self, model_path, runtime="auto", input_size=64, scale=1 / 255.0, mean=(0, 0, 0), swap_rb=True,
+                 fire_class=0, max_batch=32, timeout=2.0):
+        super().__init__(name="verifier", daemon=True)
+        self.model_path = model_path
+        self.input_size = (input_size, input_size)
+        self.scale = scale
+        self.mean = tuple(mean)
+        self.swap_rb = swap_rb # Most trained models expect RGB
+        self.fire_class = fire_class # Index of the fire score in the model's output
+        self.max_batch = max_batch
+        self.timeout = timeout # Seconds classify() waits for its batch before it gives up
+        self.unbatched_until = 0.0 # Monotonic time until which crops run one at a time
+        self.batch_warned = False
+        self.requests = queue.Queue()
+        self.session = None
+        self.net = None
+        if runtime in ("auto", "onnxruntime") and model_path.lower().endswith(".onnx"):
+            try:
+                import onnxruntime
+                self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+                self.input_name = self.session.get_inputs()[0].name
+            except ImportError:
+                if runtime == "onnxruntime":
+                    raise
+        if self.session is None:
+            self.net = cv2.dnn.readNet(model_path) # CPU is OpenCV's default target
+        self.runtime = "onnxruntime" if self.session is not None else "opencv"
+        self.batches = 0
+        self.crops = 0
+        self.failed_batches = 0 # Forward passes that raised, reported once per outage
+        self.unbatched = 0 # Batches run one crop at a time
+        self.failing = False
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        self.requests.put(None)
+
+    def classify(self, crops):
+        """Returns the fire probability of every BGR crop. Blocks until the batch holding them has run,
+        at most timeout seconds; raises when the verifier is stopped, failed or didn't answer in time."""
+        if not crops:
+            return []
+        if not self.running:
+            raise RuntimeError("Verifier stopped")
+        done = threading.Event()
+        request = [crops, None, done] # [crops, probabilities, done]
+        self.requests.put(request)
+        if not done.wait(self.timeout):
+            raise TimeoutError(f"Verifier didn't answer within {self.timeout}s")
+        if request[1] is None:
+            raise RuntimeError("Verifier stopped or failed")
+        return request[1]
+
+    def run(self):
+        while self.running:
+            request = self.requests.get()
+            if request is None:
+                break
+            batch = [request]
+            count = len(request[0])
+            while count < self.max_batch:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.running = False
+                    break
+                batch.append(request)
+                count += len(request[0])
+            crops = [crop for request in batch for crop in request[0]]
+            try:
+                probabilities = self.forward(crops)
+                if self.failing:
+                    print("Verifier recovered.")
+                    self.failing = False
+            except Exception as e:
+                self.failed_batches += 1
+                if not self.failing:
+                    print(f"Verifier error, further failures are only counted until it recovers: {e}")
+                    self.failing = True
+                probabilities = None
+            offset = 0
+            for request in batch:
+                if probabilities is not None:
+                    request[1] = probabilities[offset:offset + len(request[0])]
+                offset += len(request[0])
+                request[2].set()
+        # Release anyone still waiting, classify() raises for them
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request[2].set()
+
+    def forward(self, crops):
+        """One network pass over all crops; falls back to one crop at a time for fixed batch-size models,
+        and tries batches again after BATCH_RETRY seconds."""
+        blob = cv2.dnn.blobFromImages(crops, self.scale, self.input_size, self.mean, swapRB=self.swap_rb, crop=False)
+        scores = None
+        if len(crops) == 1 or time.monotonic() >= self.unbatched_until:
+            try:
+                scores = self._run(blob)
+            except Exception:
+                if len(crops) == 1:
+                    raise
+                if not self.batch_warned:
+                    print(f"Warning: Verifier model rejected a batch, classifying one crop at a time "
+                          f"(batches are retried every {BATCH_RETRY:.0f}s).")
+                    self.batch_warned = True
+                self.unbatched_until = time.monotonic() + BATCH_RETRY
+        if scores is None:
+            scores = np.concatenate([self._run(blob[i:i + 1]) for i in range(len(crops))])
+            self.unbatched += 1
+        self.batches += 1
+        self.crops += len(crops)
+        return fire_probabilities(scores.reshape(len(crops), -1), self.fire_class)
+
+    def _run(self, blob):
+        if self.session is not None:
+            return self.session.run(None, {self.input_name: blob})[0]
+        self.net.setInput(blob)
+        return self.net.forward()
+
+    def stats(self):
+        return {
+            "model": self.model_path,
+            "runtime": self.runtime,
+            "batches": self.batches,
+            "crops": self.crops,
+            "avg_batch": round(self.crops / self.batches, 2) if self.batches else None,
+            "failed_batches": self.failed_batches,
+            "unbatched": self.unbatched,
+        }
+
+def fire_probabilities(scores, fire_class=0):
+    """Turns raw model outputs (N, classes) into fire probabilities, whether they are logits or not."""
+    scores = scores.astype(np.float32)
+    if scores.shape[1] == 1:
+        values = scores[:, 0]
+        if values.min() < 0 or values.max() > 1:
+            values = 1 / (1 + np.exp(-values)) # Single logit
+        return values.tolist()
+    if scores.min() < 0 or not np.allclose(scores.sum(axis=1), 1, atol=1e-3):
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True)) # Softmax over logits
+        scores /= scores.sum(axis=1, keepdims=True)
+    return scores[:, fire_class].tolist()
+
+class VerifiedDetector:
+    """Second stage for any detector backend: keeps only the boxes the classifier calls fire.
+
+    The colour stage stays in charge of finding candidates cheaply, the CNN only ever
+    sees the (slightly padded) candidate crops, and only on frames that have any.
+    """
+
+    def __init__(self, detector, classifier, threshold=0.5, pad=0.15, timer=None):
+        self.detector = detector
+        self.classifier = classifier
+        self.threshold = threshold
+        self.pad = pad # Context around each box, as a fraction of its size
+        self.timer = timer # Optional histogram child for the verify stage
+        self.candidates = 0
+        self.rejected = 0
+        self.unverified = 0 # Frames whose candidates were kept because the verifier was unavailable
+        self.available = True # Reported once when this flips
+        self.scores = [] # Fire probability of each candidate on the last frame
+
+    def find_regions(self, frame, tiles=None):
+        boxes = self.detector.find_regions(frame, tiles)
+        if not boxes:
+            self.scores = []
+            return boxes
+        started = time.perf_counter()
+        height, width = frame.shape[:2]
+        crops = []
+        for x, y, w, h in boxes:
+            px, py = int(w * self.pad), int(h * self.pad)
+            crops.append(frame[max(0, y - py):min(height, y + h + py), max(0, x - px):min(width, x + w + px)])
+        try:
+            self.scores = self.classifier.classify(crops)
+        except Exception as e:
+            self.unverified += 1
+            if self.available:
+                print(f"Verifier unavailable, keeping colour detections until it is back: {e}")
+                self.available = False
+            return boxes
+        if not self.available:
+            print("Verifier available again.")
+            self.available = True
+        if self.timer is not None:
+            self.timer.observe(time.perf_counter() - started)
+        verified = [box for box, score in zip(boxes, self.scores) if score >= self.threshold]
+        self.candidates += len(boxes)
+        self.rejected += len(boxes) - len(verified)
+        return verified
+
+    def pop_timings(self):
+        return self.detector.pop_timings()
@@ -0,0 +1,426 @@
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+MIN_FIRE_AREA = 100 # Minimum contour area (pixels) considered a thermal signature
+
+# Balanced Fire Detection Logic (HSV, OpenCV hue scale 0-179)
+# Primary Range: Vibrant Orange/Yellow, Secondary Range: Deep Red Fire
+FIRE_HSV_RANGES = [
+    ((0, 110, 200), (35, 255, 255)),
+    ((160, 110, 200), (179, 255, 255)),
+]
+KERNEL_SIZE = 5
+
+def mirror_hue(h):
+    """Hue of a colour once its red and blue channels are swapped (OpenCV hue scale)."""
+    return (120 - h) % 180
+
+class FireSegmenter:
+    """Builds the fire mask for a stream of frames in a single colour pass.
+
+    The two hue bands straddle red (0/179), so the frame is converted with RGB2HSV
+    instead of BGR2HSV. Swapping red and blue mirrors the hue circle around green,
+    which turns the wrapping bands into one contiguous range that a single inRange
+    can test. Hue rounding differs by one step on a few colours, so pixels right on a
+    band edge can fall the other way. Bounds and kernels are built once, and every intermediate mask is
+    written into buffers that are reused for as long as the resolution is unchanged.
+    """
+
+    def __init__(self, hsv_ranges=FIRE_HSV_RANGES, kernel_size=KERNEL_SIZE, min_area=MIN_FIRE_AREA):
+        self.min_area = min_area
+        self.bands = self._build_bands(hsv_ranges)
+        # Opening followed by a dilation equals an erosion followed by one larger dilation
+        self.erode_kernel = np.ones((kernel_size, kernel_size), np.uint8)
+        self.dilate_kernel = np.ones((2 * kernel_size - 1, 2 * kernel_size - 1), np.uint8)
+        self.capacity = (0, 0)
+        self.shape = None
+        self.hsv = None
+        self.mask = None
+        self.scratch = None
+        self.band_mask = None
+        # Seconds spent since the last pop_timings(), for the stage metrics
+        self.segment_time = 0.0
+        self.contour_time = 0.0
+
+    @staticmethod
+    def _build_bands(hsv_ranges):
+        """Merges the HSV ranges into as few (lower, upper) bounds in mirrored hue space as possible."""
+        bands = []
+        for lower, upper in hsv_ranges:
+            hues = sorted(mirror_hue(h) for h in range(lower[0], upper[0] + 1))
+            # Split the mirrored hues into contiguous runs (a range that crossed green wraps at 0)
+            runs = [[hues[0], hues[0]]]
+            for h in hues[1:]:
+                if h == runs[-1][1] + 1:
+                    runs[-1][1] = h
+                else:
+                    runs.append([h, h])
+            for lo, hi in runs:
+                bands.append([lo, hi, tuple(lower[1:]), tuple(upper[1:])])
+        # Greys (saturation 0) get hue 0 either way, which isn't mirrored: keep them out of the
+        # mirrored bands and give them their own band when a range takes them in at hue 0
+        for band in bands:
+            band[2] = (max(band[2][0], 1), band[2][1])
+        for lower, upper in hsv_ranges:
+            if lower[0] == 0 and lower[1] == 0:
+                bands.append([0, 0, (0, lower[2]), (0, upper[2])])
+        # Adjacent runs with identical saturation/value bounds collapse into one inRange
+        bands.sort(key=lambda band: band[0])
+        merged = []
+        for band in bands:
+            last = merged[-1] if merged else None
+            if last and band[0] <= last[1] + 1 and band[2] == last[2] and band[3] == last[3]:
+                last[1] = max(last[1], band[1])
+            else:
+                merged.append(band)
+        return [(np.array([lo, *sv_lo], dtype="uint8"), np.array([hi, *sv_hi], dtype="uint8"))
+                for lo, hi, sv_lo, sv_hi in merged]
+
+    def _allocate(self, shape):
+        """Points the working buffers at a shape, growing the backing storage only when needed."""
+        height, width = shape[:2]
+        if height > self.capacity[0] or width > self.capacity[1]:
+            self.capacity = (max(height, self.capacity[0]), max(width, self.capacity[1]))
+            self._hsv = np.empty(self.capacity + (3,), np.uint8)
+            self._mask = np.empty(self.capacity, np.uint8)
+            self._scratch = np.empty(self.capacity, np.uint8)
+            self._band_mask = np.empty(self.capacity, np.uint8)
+        # Views keep tiles of varying size allocation free
+        self.shape = shape
+        self.hsv = self._hsv[:height, :width]
+        self.mask = self._mask[:height, :width]
+        self.scratch = self._scratch[:height, :width]
+        self.band_mask = self._band_mask[:height, :width]
+
+    def segment(self, frame):
+        """Returns the cleaned fire mask. The buffer is reused by the next call."""
+        if frame.shape != self.shape:
+            self._allocate(frame.shape)
+
+        # Convert to (hue mirrored) HSV color space
+        cv2.cvtColor(frame, cv2.COLOR_RGB2HSV, dst=self.hsv)
+
+        # Both fire ranges in one pass
+        lower, upper = self.bands[0]
+        cv2.inRange(self.hsv, lower, upper, dst=self.scratch)
+        for lower, upper in self.bands[1:]:
+            cv2.inRange(self.hsv, lower, upper, dst=self.band_mask)
+            cv2.bitwise_or(self.scratch, self.band_mask, dst=self.scratch)
+
+        # Apply morphological operations
+        cv2.erode(self.scratch, self.erode_kernel, dst=self.mask)
+        cv2.dilate(self.mask, self.dilate_kernel, dst=self.scratch)
+        return self.scratch
+
+    def find_regions(self, frame, tiles=None):
+        """Returns bounding boxes (x, y, w, h) of fire-coloured regions in a BGR frame.
+
+        When tiles (x0, y0, x1, y1) are given only those parts of the frame are segmented.
+        """
+        if tiles is not None:
+            return find_regions_in_tiles(self, frame, tiles)
+        started = time.perf_counter()
+        mask = self.segment(frame)
+        segmented = time.perf_counter()
+        # Only outer contours matter, a hole inside a region never changes the decision
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        for cnt in contours:
+            area = cv2.contourArea(cnt)
+            if area > self.min_area:
+                boxes.append(cv2.boundingRect(cnt))
+        self.segment_time += segmented - started
+        self.contour_time += time.perf_counter() - segmented
+        return boxes
+
+    def pop_timings(self):
+        """Returns (segmentation, contour) seconds spent since the last call."""
+        timings = (self.segment_time, self.contour_time)
+        self.segment_time = self.contour_time = 0.0
+        return timings
+
+SCREEN_AREA_SLACK = 0.5 # The coarse pass keeps regions down to half the scaled area, confirmation decides
+
+class TwoStageSegmenter:
+    """Screens a reduced-resolution copy (or a set of regions of interest) for fire colours,
+    then confirms and boxes candidates with a full-resolution pass over just those tiles.
+
+    Area and kernel thresholds of the screen scale with the downscale factor, so the
+    configured values keep their full-resolution meaning.
+    """
+
+    def __init__(self, scale=0.5, rois=None, pad=None, hsv_ranges=FIRE_HSV_RANGES,
+                 kernel_size=KERNEL_SIZE, min_area=MIN_FIRE_AREA):
+        self.scale = min(1.0, scale)
+        self.rois = rois # (x, y, w, h) in full-resolution pixels, None screens the whole frame
+        screen_kernel = max(1, int(round(kernel_size * self.scale)))
+        self.screen = FireSegmenter(hsv_ranges, screen_kernel, min_area * self.scale * self.scale * SCREEN_AREA_SLACK)
+        self.confirm = FireSegmenter(hsv_ranges, kernel_size, min_area)
+        # Candidate tiles are padded so the full-resolution morphology sees the whole region
+        self.pad = pad if pad is not None else 2 * kernel_size + int(round(1 / self.scale))
+        self.small = {} # Resize targets by size
+        self.tiles = [] # Tiles confirmed on the last frame, for diagnostics
+
+    def _screen(self, frame, rois):
+        """Returns padded full-resolution tiles (x0, y0, x1, y1) that may contain fire."""
+        height, width = frame.shape[:2]
+        tiles = []
+        for rx, ry, rw, rh in rois:
+            region = frame[ry:ry + rh, rx:rx + rw]
+            if region.size == 0:
+                continue
+            if self.scale < 1:
+                size = (max(1, int(region.shape[1] * self.scale)), max(1, int(region.shape[0] * self.scale)))
+                small = self.small.get(size)
+                if small is None:
+                    small = self.small[size] = np.empty((size[1], size[0], 3), np.uint8)
+                cv2.resize(region, size, dst=small, interpolation=cv2.INTER_LINEAR)
+                fx = region.shape[1] / size[0]
+                fy = region.shape[0] / size[1]
+            else:
+                small, fx, fy = region, 1.0, 1.0
+            for x, y, w, h in self.screen.find_regions(small):
+                tiles.append((max(0, rx + int(x * fx) - self.pad),
+                              max(0, ry + int(y * fy) - self.pad),
+                              min(width, rx + int((x + w) * fx) + self.pad),
+                              min(height, ry + int((y + h) * fy) + self.pad)))
+        return merge_tiles(tiles)
+
+    def find_regions(self, frame, tiles=None):
+        """Returns full-resolution bounding boxes (x, y, w, h) confirmed inside the candidate tiles.
+
+        When tiles (x0, y0, x1, y1) are given the screen is limited to them as well.
+        """
+        height, width = frame.shape[:2]
+        rois = self.rois or [(0, 0, width, height)]
+        if tiles is not None:
+            rois = [(x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in intersect_tiles(
+                tiles, [(x, y, x + w, y + h) for x, y, w, h in rois])]
+        self.tiles = self._screen(frame, rois)
+        return find_regions_in_tiles(self.confirm, frame, self.tiles)
+
+    def pop_timings(self):
+        """Returns (segmentation, contour) seconds of both passes since the last call."""
+        screen_segment, screen_contours = self.screen.pop_timings()
+        confirm_segment, confirm_contours = self.confirm.pop_timings()
+        return screen_segment + confirm_segment, screen_contours + confirm_contours
+
+def find_regions_in_tiles(segmenter, frame, tiles):
+    """Segments each (x0, y0, x1, y1) tile and returns boxes in full-frame coordinates."""
+    boxes = []
+    for x0, y0, x1, y1 in tiles:
+        for x, y, w, h in segmenter.find_regions(frame[y0:y1, x0:x1]):
+            boxes.append((x0 + x, y0 + y, w, h))
+    return boxes
+
+def intersect_tiles(tiles, others):
+    """Returns the non-empty pairwise intersections of two lists of (x0, y0, x1, y1) tiles."""
+    result = []
+    for x0, y0, x1, y1 in tiles:
+        for ox0, oy0, ox1, oy1 in others:
+            ix0, iy0, ix1, iy1 = max(x0, ox0), max(y0, oy0), min(x1, ox1), min(y1, oy1)
+            if ix0 < ix1 and iy0 < iy1:
+                result.append((ix0, iy0, ix1, iy1))
+    return result
+
+def merge_tiles(tiles):
+    """Merges overlapping (x0, y0, x1, y1) tiles so no pixel is confirmed twice."""
+    merged = []
+    for tile in sorted(tiles):
+        x0, y0, x1, y1 = tile
+        changed = True
+        while changed:
+            changed = False
+            for other in merged:
+                if x0 < other[2] and other[0] < x1 and y0 < other[3] and other[1] < y1:
+                    merged.remove(other)
+                    x0, y0 = min(x0, other[0]), min(y0, other[1])
+                    x1, y1 = max(x1, other[2]), max(y1, other[3])
+                    changed = True
+                    break
+        merged.append((x0, y0, x1, y1))
+    return merged
+
+def make_segmenter(scale=1.0, rois=None, hsv_ranges=FIRE_HSV_RANGES, min_area=MIN_FIRE_AREA, kernel_size=KERNEL_SIZE):
+    """Returns the plain full-frame segmenter, or the two-stage one when downscaling or ROIs are configured."""
+    if scale >= 1 and not rois:
+        return FireSegmenter(hsv_ranges=hsv_ranges, kernel_size=kernel_size, min_area=min_area)
+    return TwoStageSegmenter(scale=scale, rois=rois, hsv_ranges=hsv_ranges, kernel_size=kernel_size, min_area=min_area)
+
+# Detector backends, selected with SENTINEL_DETECTOR. A backend is a factory taking
+# (scale, rois, hsv_ranges, min_area, kernel_size) that returns an object with
+# find_regions(frame, tiles=None) -> [(x, y, w, h)] and pop_timings() -> (segment, contour seconds).
+# Everything derived from the settings (bounds, kernels) is built in the factory, never per frame.
+DETECTOR_BACKENDS = {
+    "hsv": make_segmenter,
+}
+
+def make_detector(backend="hsv", scale=1.0, rois=None, hsv_ranges=FIRE_HSV_RANGES, min_area=MIN_FIRE_AREA,
+                  kernel_size=KERNEL_SIZE):
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend}, use one of: {', '.join(DETECTOR_BACKENDS)}")
+    return DETECTOR_BACKENDS[backend](scale, rois, hsv_ranges, min_area, kernel_size)
+
+def draw_detections(img, boxes):
+    """Draws a labelled bounding box around every detected fire region."""
+    for x, y, w, h in boxes:
+        cv2.rectangle(img, (x, y), (x + w, y + h), (0, 0, 255), 2)
+        cv2.putText(img, "THERMAL SIGNATURE", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+
+ALARM_TINT = 0.2 # Opacity of the red alarm overlay
+# Blends every pixel with red in one in-place pass: 0.8 * pixel + 0.2 * (0, 0, 255)
+ALARM_MATRIX = np.array([[1 - ALARM_TINT, 0, 0, 0], [0, 1 - ALARM_TINT, 0, 0],
+                         [0, 0, 1 - ALARM_TINT, 255 * ALARM_TINT]], np.float32)
+
+def tint_alarm(img):
+    """Alarm effect: the whole frame tinted red, without the copy and full-frame rectangle it used to take."""
+    cv2.transform(img, ALARM_MATRIX, dst=img)
+
+def draw_hud_elements(img, fire_detected):
+    """Corner brackets and status text."""
+    height, width, _ = img.shape
+    
+    # Corner Brackets
+    length = 50
+    thickness = 2
+    color = (0, 255, 255) # Cyan HUD color
+    
+    # Top Left
+    cv2.line(img, (20, 20), (20 + length, 20), color, thickness)
+    cv2.line(img, (20, 20), (20, 20 + length), color, thickness)
+    # Top Right
+    cv2.line(img, (width - 20, 20), (width - 20 - length, 20), color, thickness)
+    cv2.line(img, (width - 20, 20), (width - 20, 20 + length), color, thickness)
+    # Bottom Left
+    cv2.line(img, (20, height - 20), (20 + length, height - 20), color, thickness)
+    cv2.line(img, (20, height - 20), (20, height - 20 - length), color, thickness)
+    # Bottom Right
+    cv2.line(img, (width - 20, height - 20), (width - 20 - length, height - 20), color, thickness)
+    cv2.line(img, (width - 20, height - 20), (width - 20, height - 20 - length), color, thickness)
+
+    # Status Text
+    status_text = "SCANNING SYSTEM READY"
+    status_color = (0, 255, 255)
+    
+    if fire_detected:
+        status_text = "CRITICAL: FIRE DETECTED"
+        status_color = (0, 0, 255) # Red for danger
+
+    cv2.putText(img, f"STATUS: {status_text}", (40, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.8, status_color, 2)
+    cv2.putText(img, "PROTOCOL: THERMAL/COLOUR FILTRATION", (40, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+def draw_hud(img, fire_detected):
+    """Draws the HUD straight onto a frame. HudOverlay composites the same HUD from cached patches."""
+    if fire_detected:
+        tint_alarm(img)
+    draw_hud_elements(img, fire_detected)
+
+def draw_status_label(img, armed, camera_name=None):
+    """Draws the armed/disarmed web interface label in the bottom right corner."""
+    height, width, _ = img.shape
+    # Status Label for HUD (Bottom Right, Sleeker)
+    hud_status = "ARMED" if armed else "DISARMED"
+    hud_color = (0, 255, 0) if armed else (0, 0, 255)
+    cv2.putText(img, f"WEB INTERFACE: {hud_status}", (width - 220, height - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, hud_color, 1)
+    if camera_name:
+        draw_camera_label(img, camera_name, (CAMERA_LABEL_MARGIN, height - CAMERA_LABEL_MARGIN))
+
+CAMERA_LABEL_MARGIN = 40 # Camera name's baseline distance from the left and bottom edges
+
+def draw_camera_label(img, camera_name, origin):
+    cv2.putText(img, camera_name, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+class HudOverlay:
+    """The HUD as pre-rendered patches, composited onto frames that are shown or streamed.
+
+    For every resolution and state (fire, armed) the brackets and labels are drawn once
+    on a blank canvas and cut into small patches with their masks; camera names are
+    patches of their own, so the number of cameras doesn't multiply the full-frame
+    renders. Applying the layer copies the masked patch pixels, a few percent of the
+    frame, instead of redrawing lines and text every time. Both caches drop their least
+    recently used entry when full.
+    """
+
+    def __init__(self, max_layers=16, max_labels=256):
+        self.layers = OrderedDict() # (shape, fire, armed) -> patches
+        self.labels = OrderedDict() # (camera name, frame size) -> patches
+        self.max_layers = max_layers
+        self.max_labels = max_labels
+
+    @staticmethod
+    def _cached(cache, limit, key, render):
+        patches = cache.get(key)
+        if patches is None:
+            if len(cache) >= limit:
+                cache.popitem(last=False)
+            patches = cache[key] = render()
+        else:
+            cache.move_to_end(key)
+        return patches
+
+    def layer(self, shape, fire_detected, armed):
+        return self._cached(self.layers, self.max_layers, (shape, fire_detected, armed),
+                            lambda: self.render(shape, fire_detected, armed))
+
+    def label(self, camera_name, shape):
+        return self._cached(self.labels, self.max_labels, (camera_name, shape),
+                            lambda: self.render_label(camera_name, shape))
+
+    @staticmethod
+    def _patches(draw, shape, offset=(0, 0)):
+        """[(x0, y0, colour, inverse alpha)] of what draw(canvas) puts on a canvas of the given shape."""
+        # Drawn on black and on white: the difference is how much of the frame shows through
+        # each pixel, which keeps antialiased text edges exact
+        layers = []
+        for background in (0, 255):
+            canvas = np.full(shape, background, np.uint8)
+            draw(canvas)
+            layers.append(canvas)
+        colour, inverse = layers[0], cv2.subtract(layers[1], layers[0]) # colour * alpha, 255 * (1 - alpha)
+        mask = (inverse.min(axis=2) < 255).astype(np.uint8)
+        # One patch per label or bracket: merge the glyphs of a line before boxing them
+        groups = cv2.dilate(mask, np.ones((9, 9), np.uint8))
+        count, labels, boxes, _ = cv2.connectedComponentsWithStats(groups)
+        patches = []
+        for group in range(1, count):
+            x, y, w, h = boxes[group, :4]
+            # Boxes of neighbouring groups can overlap: outside its own group a patch leaves the frame alone
+            own = (labels[y:y + h, x:x + w] == group)[..., None]
+            patches.append((x + offset[0], y + offset[1],
+                            np.where(own, colour[y:y + h, x:x + w], 0).astype(np.uint8),
+                            np.where(own, inverse[y:y + h, x:x + w], 255).astype(np.uint8)))
+        return patches
+
+    @classmethod
+    def render(cls, shape, fire_detected, armed):
+        def draw(canvas):
+            draw_hud_elements(canvas, fire_detected)
+            draw_status_label(canvas, armed)
+        return cls._patches(draw, shape)
+
+    @classmethod
+    def render_label(cls, camera_name, shape):
+        """The camera name where draw_status_label() puts it, rendered on the part of the frame around the text."""
+        height, width = shape[:2]
+        (text_width, ascent), descent = cv2.getTextSize(camera_name, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        origin = (CAMERA_LABEL_MARGIN, height - CAMERA_LABEL_MARGIN)
+        pad = 4
+        x0, y0 = max(0, origin[0] - pad), max(0, origin[1] - ascent - pad)
+        x1, y1 = min(width, origin[0] + text_width + pad), min(height, origin[1] + descent + pad)
+        if x0 >= x1 or y0 >= y1:
+            return []
+        return cls._patches(lambda canvas: draw_camera_label(canvas, camera_name, (origin[0] - x0, origin[1] - y0)),
+                            (y1 - y0, x1 - x0) + shape[2:], (x0, y0))
+
+    def apply(self, img, fire_detected, armed, camera_name=None):
+        if fire_detected:
+            tint_alarm(img)
+        patches = self.layer(img.shape, fire_detected, armed)
+        if camera_name:
+            patches = patches + self.label(camera_name, img.shape)
+        for x, y, colour, inverse in patches:
+            roi = img[y:y + colour.shape[0], x:x + colour.shape[1]]
+            cv2.add(cv2.multiply(roi, inverse, scale=1 / 255.0), colour, dst=roi)
@@ -0,0 +1,180 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+from aiohttp import web
+from multidict import CIMultiDict
+from streaming import stream_async
+
+# Set by aiohttp itself from the body
+HOP_HEADERS = {"content-length", "transfer-encoding", "connection"}
+
+def call_wsgi(app, environ):
+    """Runs a WSGI app to completion and returns (status code, headers, body)."""
+    response = {}
+    body = []
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = headers
+        return body.append
+
+    result = app(environ, start_response)
+    try:
+        for data in result:
+            body.append(data)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return response["status"], response["headers"], b"".join(body)
+
+def session_checker(flask_app):
+    """Returns is_authorized(cookies): checks a Flask session cookie outside of a Flask request."""
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    def is_authorized(cookies):
+        value = cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+        if not value:
+            return False
+        try:
+            return bool(serializer.loads(value, max_age=max_age).get("logged_in"))
+        except Exception:
+            return False
+    return is_authorized
+
+class WebServer(threading.Thread):
+    """Serves the command center from one event loop thread.
+
+    /video_feed and /events, which stay open for as long as a viewer watches, are
+    coroutines: a viewer costs a socket and a few kilobytes instead of an OS thread.
+    Every other request is passed to the Flask app on a small, fixed thread pool. The
+    number of concurrent video viewers is capped.
+    """
+
+    def __init__(self, wsgi_app, host="0.0.0.0", port=5000, threads=8, max_viewers=50, is_authorized=None,
+                 get_stream=None, get_broadcaster=None, variants=(), event_bus=None):
+        super().__init__(name="web-server", daemon=True)
+        self.wsgi_app = wsgi_app
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="web")
+        self.max_viewers = max_viewers
+        self.is_authorized = is_authorized or (lambda cookies: True)
+        self.get_stream = get_stream # get_stream(name or None) -> CameraStream
+        self.get_broadcaster = get_broadcaster # get_broadcaster(stream, variant) -> MjpegBroadcaster
+        self.variants = list(variants)
+        self.event_bus = event_bus
+        self.viewers = 0
+        self.loop = None
+        self.ready = threading.Event()
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get("/video_feed", self.video_feed)
+        if self.event_bus is not None:
+            app.router.add_get("/events", self.events)
+        app.router.add_route("*", "/{tail:.*}", self.wsgi)
+        return app
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        runner = web.AppRunner(self.make_app(), handle_signals=False, access_log=None)
+        self.loop.run_until_complete(runner.setup())
+        self.loop.run_until_complete(web.TCPSite(runner, self.host, self.port).start())
+        print(f"--- Web Server: http://{self.host}:{self.port} ({self.threads} threads, "
+              f"up to {self.max_viewers} viewers) ---")
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(runner.cleanup())
+            self.executor.shutdown(wait=False)
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def video_feed(self, request):
+        if not self.is_authorized(request.cookies):
+            raise web.HTTPFound("/login")
+        stream = self.get_stream(request.query.get("camera"))
+        if stream is None:
+            return web.Response(status=503, text="Video feed unavailable")
+        variant = request.query.get("variant", "full")
+        if variant == "auto":
+            # Adaptive: start at full quality, step down while the viewer's connection stalls
+            variants, adaptive = self.variants, True
+        elif variant in self.variants:
+            variants, adaptive = [variant], False
+        else:
+            return web.Response(status=400, text=f"Unknown variant, use one of: auto, {', '.join(self.variants)}")
+        if self.viewers >= self.max_viewers:
+            return web.Response(status=503, text="Too many viewers", headers={"Retry-After": "10"})
+
+        response = web.StreamResponse(headers={"Content-Type": "multipart/x-mixed-replace; boundary=frame"})
+        await response.prepare(request)
+        self.viewers += 1
+        try:
+            await stream_async(response.write, lambda name: self.get_broadcaster(stream, name), variants,
+                               request.remote, adaptive)
+        except (ConnectionError, asyncio.CancelledError):
+            pass # Viewer went away
+        finally:
+            self.viewers -= 1
+        return response
+
+    async def events(self, request):
+        if not self.is_authorized(request.cookies):
+            raise web.HTTPFound("/login")
+        last_event_id = request.headers.get("Last-Event-ID")
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                               "X-Accel-Buffering": "no"})
+        await response.prepare(request)
+        try:
+            await self.event_bus.subscribe_async(lambda text: response.write(text.encode()), last_event_id)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        return response
+
+    async def wsgi(self, request):
+        body = await request.read()
+        environ = self.environ(request, body)
+        status, headers, data = await self.loop.run_in_executor(self.executor, call_wsgi, self.wsgi_app, environ)
+        response_headers = CIMultiDict()
+        for name, value in headers:
+            if name.lower() not in HOP_HEADERS:
+                response_headers.add(name, value)
+        return web.Response(status=status, body=data, headers=response_headers)
+
+    def environ(self, request, body):
+        path, _, query = request.raw_path.partition("?")
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path, encoding="latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+            "REMOTE_ADDR": request.remote or "",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": request.scheme,
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        if "Content-Type" in request.headers:
+            environ["CONTENT_TYPE"] = request.headers["Content-Type"]
+        for name in set(request.headers.keys()):
+            key = "HTTP_" + name.upper().replace("-", "_")
+            if key not in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+                environ[key] = ("; " if key == "HTTP_COOKIE" else ",").join(request.headers.getall(name))
+        return environ